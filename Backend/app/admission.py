@@ -0,0 +1,220 @@
+"""
+Priority admission control in front of the API routes.
+Swarm strategize calls sit on the real-time gameplay path while food analysis
+is latency-tolerant, so requests are admitted by priority class:
+- per-API-key token buckets cap request rate;
+- a fixed number of concurrent request slots is shared by all classes;
+- each class has its own bounded wait queue and maximum wait time;
+- higher-priority waiters are always granted a free slot first.
+When a request can't be admitted it is shed immediately instead of piling up
+behind upstream timeouts; the route decides how to answer (429 or hold).
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed by admission control."""
+
+    def __init__(self, reason: str, retry_after_s: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = max(0.0, retry_after_s)
+
+
+@dataclass(frozen=True)
+class PriorityClass:
+    name: str
+    priority: int  # lower value is served first
+    max_queue: int
+    max_wait_s: float
+
+
+class TokenBucket:
+    """Classic token bucket; ``try_take`` returns (admitted, seconds until a token is available)."""
+
+    def __init__(self, rate_per_s: float, burst: float):
+        self.rate_per_s = max(0.001, float(rate_per_s))
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def try_take(self, amount: float = 1.0) -> tuple[bool, float]:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_s)
+        self.updated_at = now
+
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True, 0.0
+        return False, (amount - self.tokens) / self.rate_per_s
+
+
+class AdmissionController:
+    """Bounded, priority-ordered admission of requests to a fixed pool of slots."""
+
+    _MAX_BUCKETS = 10_000
+
+    def __init__(
+        self,
+        classes: list[PriorityClass],
+        max_concurrency: int,
+        key_rate_per_s: float,
+        key_burst: float,
+    ):
+        self.classes = {priority_class.name: priority_class for priority_class in classes}
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.key_rate_per_s = float(key_rate_per_s)
+        self.key_burst = float(key_burst)
+
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, str, asyncio.Future]] = []
+        self._queued: dict[str, int] = {name: 0 for name in self.classes}
+        self._sequence = itertools.count()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._counters: dict[str, dict[str, Any]] = {
+            name: {"admitted": 0, "queued": 0, "shed_rate": 0, "shed_queue_full": 0, "shed_timeout": 0, "wait_s": 0.0}
+            for name in self.classes
+        }
+
+    @asynccontextmanager
+    async def admit(self, class_name: str, key_id: str) -> AsyncIterator[float]:
+        """Hold a request slot for the duration of the block; yields the queue wait in seconds."""
+        wait_s = await self._acquire(class_name, key_id)
+        try:
+            yield wait_s
+        finally:
+            self._release()
+
+    async def _acquire(self, class_name: str, key_id: str) -> float:
+        priority_class = self.classes[class_name]
+        counters = self._counters[class_name]
+
+        if self.key_rate_per_s > 0:
+            admitted, retry_after_s = self._bucket_for(key_id).try_take()
+            if not admitted:
+                counters["shed_rate"] += 1
+                raise AdmissionRejected("rate_limited", retry_after_s)
+
+        if self._in_flight < self.max_concurrency and not self._has_waiters_at_or_above(priority_class.priority):
+            self._in_flight += 1
+            counters["admitted"] += 1
+            return 0.0
+
+        if self._queued[class_name] >= priority_class.max_queue:
+            counters["shed_queue_full"] += 1
+            raise AdmissionRejected("queue_full", priority_class.max_wait_s)
+
+        loop = asyncio.get_running_loop()
+        waiter: asyncio.Future = loop.create_future()
+        heapq.heappush(self._waiters, (priority_class.priority, next(self._sequence), class_name, waiter))
+        self._queued[class_name] += 1
+        counters["queued"] += 1
+        started_at = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=priority_class.max_wait_s)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted in the same tick the timer fired; hand the slot back.
+                self._release()
+            waiter.cancel()
+            counters["shed_timeout"] += 1
+            raise AdmissionRejected("queue_timeout", priority_class.max_wait_s) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            waiter.cancel()
+            raise
+        finally:
+            self._queued[class_name] -= 1
+
+        wait_s = time.perf_counter() - started_at
+        counters["admitted"] += 1
+        counters["wait_s"] += wait_s
+        return wait_s
+
+    def _release(self) -> None:
+        # Hand the slot directly to the best waiter so it can't be stolen by a newcomer.
+        while self._waiters:
+            _, _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight = max(0, self._in_flight - 1)
+
+    def _has_waiters_at_or_above(self, priority: int) -> bool:
+        return any(entry[0] <= priority and not entry[3].done() for entry in self._waiters)
+
+    def _bucket_for(self, key_id: str) -> TokenBucket:
+        bucket = self._buckets.get(key_id)
+        if bucket is None:
+            if len(self._buckets) >= self._MAX_BUCKETS:
+                self._buckets.clear()
+            bucket = TokenBucket(self.key_rate_per_s, self.key_burst)
+            self._buckets[key_id] = bucket
+        return bucket
+
+    def stats(self) -> dict[str, Any]:
+        classes: dict[str, Any] = {}
+        for name, counters in self._counters.items():
+            queued_total = max(1, counters["queued"])
+            classes[name] = {
+                "priority": self.classes[name].priority,
+                "queue_depth": self._queued[name],
+                "admitted": counters["admitted"],
+                "queued": counters["queued"],
+                "shed_rate": counters["shed_rate"],
+                "shed_queue_full": counters["shed_queue_full"],
+                "shed_timeout": counters["shed_timeout"],
+                "avg_queue_wait_ms": round(counters["wait_s"] / queued_total * 1000, 3),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "tracked_keys": len(self._buckets),
+            "classes": classes,
+        }
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get or create the admission controller for this worker process."""
+    global _admission
+    if _admission is None:
+        settings = get_settings()
+        # Buckets are per worker; split the configured per-key rate across workers.
+        workers = max(1, settings.workers)
+        _admission = AdmissionController(
+            classes=[
+                PriorityClass(
+                    name="swarm",
+                    priority=0,
+                    max_queue=settings.admission_swarm_queue_size,
+                    max_wait_s=settings.admission_swarm_max_wait_ms / 1000.0,
+                ),
+                PriorityClass(
+                    name="analysis",
+                    priority=1,
+                    max_queue=settings.admission_analysis_queue_size,
+                    max_wait_s=settings.admission_analysis_max_wait_ms / 1000.0,
+                ),
+            ],
+            max_concurrency=settings.admission_max_concurrency,
+            key_rate_per_s=settings.admission_key_rate_per_second / workers,
+            key_burst=max(1.0, settings.admission_key_burst / workers),
+        )
+    return _admission
@@ -0,0 +1,99 @@
+"""
+Two-tier cascade for food analysis.
+Most uploads are obvious (a salad, a donut), so they are first scored by a
+fast, cheap model with a tiny output budget that also reports its confidence.
+Only uncertain answers are escalated to the configured analysis model: parse
+failures, low confidence, scores near a category boundary, or a category that
+disagrees with its own score.
+"""
+
+from typing import Any, Optional
+
+from .config import get_settings
+
+# Lower score bound of each category, matching the scoring guidelines in ANALYSIS_PROMPT.
+CATEGORY_FLOORS = {"excellent": 0.9, "good": 0.7, "moderate": 0.5, "poor": 0.3, "unhealthy": 0.0}
+# Categories that are not score bands; accepted on confidence alone.
+UNBANDED_CATEGORIES = {"invalid"}
+ESCALATION_REASONS = ("failed", "no_confidence", "low_confidence", "unknown_category", "category_mismatch", "boundary")
+
+
+class AnalysisCascade:
+    """Decides whether a fast-tier food analysis is good enough to return."""
+
+    def __init__(self, fast_model: str, fast_max_tokens: int, min_confidence: float, boundary_margin: float):
+        self.fast_model = fast_model.strip()
+        self.fast_max_tokens = max(32, int(fast_max_tokens))
+        self.min_confidence = max(0.0, min(1.0, float(min_confidence)))
+        self.boundary_margin = max(0.0, float(boundary_margin))
+        self._counters = {"accepted": 0, "escalated": 0}
+        self._reasons = dict.fromkeys(ESCALATION_REASONS, 0)
+
+    def escalation_reason(self, result: dict[str, Any], confidence: Optional[float], failed: bool) -> Optional[str]:
+        """Return why the fast result must be escalated, or None to accept it."""
+        reason = self._reason(result, confidence, failed)
+        if reason is None:
+            self._counters["accepted"] += 1
+        else:
+            self._counters["escalated"] += 1
+            self._reasons[reason] += 1
+        return reason
+
+    def stats(self) -> dict[str, Any]:
+        decided = self._counters["accepted"] + self._counters["escalated"]
+        return {
+            "fast_model": self.fast_model,
+            "min_confidence": self.min_confidence,
+            "boundary_margin": self.boundary_margin,
+            **self._counters,
+            "escalation_rate": round(self._counters["escalated"] / decided, 4) if decided else 0.0,
+            "escalation_reasons": dict(self._reasons),
+        }
+
+    def _reason(self, result: dict[str, Any], confidence: Optional[float], failed: bool) -> Optional[str]:
+        if failed:
+            return "failed"
+        if confidence is None:
+            return "no_confidence"
+        if confidence < self.min_confidence:
+            return "low_confidence"
+
+        category = str(result["category"]).lower()
+        if category in UNBANDED_CATEGORIES:
+            return None
+        if category not in CATEGORY_FLOORS:
+            return "unknown_category"
+
+        score = float(result["score"])
+        if _category_for_score(score) != category:
+            return "category_mismatch"
+        if any(0.0 < floor and abs(score - floor) < self.boundary_margin for floor in CATEGORY_FLOORS.values()):
+            return "boundary"
+        return None
+
+
+def _category_for_score(score: float) -> str:
+    for category, floor in CATEGORY_FLOORS.items():
+        if score >= floor:
+            return category
+    return "unhealthy"
+
+
+_cascade: Optional[AnalysisCascade] = None
+
+
+def get_analysis_cascade() -> Optional[AnalysisCascade]:
+    """Get or create the analysis cascade; None when cascade mode is off."""
+    global _cascade
+    settings = get_settings()
+    if not settings.analysis_cascade_enabled:
+        return None
+
+    if _cascade is None:
+        _cascade = AnalysisCascade(
+            fast_model=settings.analysis_cascade_fast_model,
+            fast_max_tokens=settings.analysis_cascade_fast_max_tokens,
+            min_confidence=settings.analysis_cascade_min_confidence,
+            boundary_margin=settings.analysis_cascade_boundary_margin,
+        )
+    return _cascade
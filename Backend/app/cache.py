@@ -0,0 +1,412 @@
+"""
+Two-level result cache shared across instances.
+L1 is the instance-local shared state (in-process, or the SQLite file shared by
+this instance's workers). L2 is an optional Redis-protocol server shared by all
+Cloud Run instances, so a result computed on one instance is served by every
+other one and survives scale-in. Keys are fingerprints of request content
+only, so every instance derives the same key for the same request.
+
+Concurrent misses for one key are collapsed: within a worker they await one
+in-flight computation, and across workers and instances the first caller takes
+a short lock while the others poll for its result. When L2 is unreachable it
+is marked down for a while and the cache keeps serving from L1 alone.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from urllib.parse import unquote, urlsplit
+
+from .config import get_settings
+from .server_timing import phase
+from .shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+L2_KEY_PREFIX = "arete:"
+LOCK_PREFIX = "lock:"
+# Compare-and-delete, so a lock that expired and was re-taken is not released by its old holder.
+RELEASE_LOCK_SCRIPT = 'if redis.call("GET", KEYS[1]) == ARGV[1] then return redis.call("DEL", KEYS[1]) end return 0'
+
+
+class CacheUnavailable(RuntimeError):
+    """Raised when the shared cache tier cannot be reached or answers with an error."""
+
+
+class LocalCacheBackend:
+    """L1: the instance-local shared state, behind the same async interface as L2."""
+
+    backend_name = "local"
+
+    def __init__(self, store: SharedState):
+        self.store = store
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.store.get("cache", key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        await self.store.set_async("cache", key, value, ttl_seconds=ttl_seconds)
+
+    async def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        """Set ``key`` only if it is absent; True when this call stored it."""
+        stored = await self.store.update_async("cache", key, lambda current: current or value, ttl_seconds=ttl_seconds)
+        return stored == value
+
+    async def delete(self, key: str) -> None:
+        await self.store.delete_async("cache", key)
+
+    async def delete_if_equal(self, key: str, value: str) -> bool:
+        return await self.store.delete_if_equal_async("cache", key, value)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisCacheBackend:
+    """L2: a minimal RESP client (Redis, Valkey, KeyDB, ...) over pooled asyncio connections."""
+
+    backend_name = "redis"
+
+    def __init__(self, url: str, timeout_s: float, pool_size: int):
+        parts = urlsplit(url)
+        if parts.scheme not in {"redis", ""}:
+            raise ValueError(f"Unsupported cache URL scheme: {parts.scheme!r}")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout_s = max(0.01, float(timeout_s))
+        self._slots = asyncio.Semaphore(max(1, int(pool_size)))
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def get(self, key: str) -> Optional[str]:
+        reply = await self.execute("GET", key)
+        return reply.decode("utf-8") if reply is not None else None
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        await self.execute("SET", key, value, "PX", str(max(1, int(ttl_seconds * 1000))))
+
+    async def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        reply = await self.execute("SET", key, value, "NX", "PX", str(max(1, int(ttl_seconds * 1000))))
+        return reply == "OK"
+
+    async def delete(self, key: str) -> None:
+        await self.execute("DEL", key)
+
+    async def delete_if_equal(self, key: str, value: str) -> bool:
+        return await self.execute("EVAL", RELEASE_LOCK_SCRIPT, "1", key, value) == 1
+
+    async def execute(self, *args: str) -> Any:
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._connect(), self.timeout_s)
+                reply = await asyncio.wait_for(_roundtrip(conn, args), self.timeout_s)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, CacheUnavailable) as exc:
+                if conn is not None:
+                    conn[1].close()
+                raise CacheUnavailable(f"{args[0]} to {self.host}:{self.port} failed: {exc!r}") from exc
+            self._idle.append(conn)
+
+        if isinstance(reply, _RespError):
+            raise CacheUnavailable(f"{args[0]} rejected by {self.host}:{self.port}: {reply}")
+        return reply
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _reader, writer in idle:
+            writer.close()
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        conn = await asyncio.open_connection(self.host, self.port)
+        for command in (("AUTH", self.password) if self.password else None, ("SELECT", str(self.db)) if self.db else None):
+            if command is not None and isinstance(await _roundtrip(conn, command), _RespError):
+                conn[1].close()
+                raise CacheUnavailable(f"{command[0]} failed on {self.host}:{self.port}")
+        return conn
+
+
+CacheBackend = LocalCacheBackend | RedisCacheBackend
+
+
+class TwoLevelCache:
+    """Read-through L1/L2 cache with per-key single-flight computation."""
+
+    def __init__(
+        self,
+        l1: LocalCacheBackend,
+        l2: Optional[CacheBackend],
+        l1_ttl_s: float,
+        l2_retry_s: float,
+        lock_ttl_s: float,
+        lock_wait_s: float,
+        poll_interval_s: float = 0.1,
+    ):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl_s = max(1.0, float(l1_ttl_s))
+        self.l2_retry_s = max(1.0, float(l2_retry_s))
+        self.lock_ttl_s = max(1.0, float(lock_ttl_s))
+        self.lock_wait_s = max(0.0, float(lock_wait_s))
+        self.poll_interval_s = max(0.01, float(poll_interval_s))
+        self._l2_down_until = 0.0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "computed": 0,
+            "coalesced": 0,
+            "lock_waits": 0,
+            "lock_wait_hits": 0,
+            "lock_timeouts": 0,
+            "leader_cancellations": 0,
+            "l2_errors": 0,
+        }
+
+    @property
+    def l2_available(self) -> bool:
+        return self.l2 is not None and time.monotonic() >= self._l2_down_until
+
+    async def get(self, namespace: str, key: str) -> Optional[str]:
+        with phase("cache"):
+            return await self._lookup(namespace, key)
+
+    async def _lookup(self, namespace: str, key: str) -> Optional[str]:
+        full_key = f"{namespace}:{key}"
+        raw = await self.l1.get(full_key)
+        if raw is not None:
+            self._counters["l1_hits"] += 1
+            return raw
+
+        if self.l2_available:
+            try:
+                raw = await self.l2.get(L2_KEY_PREFIX + full_key)
+            except CacheUnavailable as exc:
+                self._mark_l2_down(exc)
+            if raw is not None:
+                self._counters["l2_hits"] += 1
+                # Keep a short-lived local copy so hot keys stop costing a network round trip.
+                await self.l1.set(full_key, raw, self.l1_ttl_s)
+                return raw
+
+        self._counters["misses"] += 1
+        return None
+
+    async def set(self, namespace: str, key: str, value: str, ttl_seconds: float) -> None:
+        full_key = f"{namespace}:{key}"
+        shared = self.l2_available
+        await self.l1.set(full_key, value, min(ttl_seconds, self.l1_ttl_s) if shared else ttl_seconds)
+        if shared:
+            try:
+                await self.l2.set(L2_KEY_PREFIX + full_key, value, ttl_seconds)
+            except CacheUnavailable as exc:
+                self._mark_l2_down(exc)
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        key: str,
+        compute: Callable[[], Awaitable[T]],
+        encode: Callable[[T], Optional[str]],
+        decode: Callable[[str], Optional[T]],
+        ttl_seconds: float,
+    ) -> T:
+        """Return the cached value, or compute it once per key across concurrent callers.
+
+        ``encode`` returns None for results that must not be cached (e.g. errors).
+        """
+        raw = await self.get(namespace, key)
+        if raw is not None and (value := decode(raw)) is not None:
+            return value
+
+        full_key = f"{namespace}:{key}"
+        while (inflight := self._inflight.get(full_key)) is not None:
+            self._counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the leader's request was cancelled: take over instead of failing with it.
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                self._counters["leader_cancellations"] += 1
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._compute_locked(namespace, key, compute, encode, decode, ttl_seconds)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Waiters re-raise it; mark it retrieved so a lone leader does not log it twice.
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(full_key, None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._counters,
+            "l1_backend": self.l1.store.backend_name,
+            "l2_backend": self.l2.backend_name if self.l2 is not None else None,
+            "l2_available": self.l2_available,
+            "inflight": len(self._inflight),
+        }
+
+    async def close(self) -> None:
+        if self.l2 is not None:
+            await self.l2.close()
+
+    async def _compute_locked(
+        self,
+        namespace: str,
+        key: str,
+        compute: Callable[[], Awaitable[T]],
+        encode: Callable[[T], Optional[str]],
+        decode: Callable[[str], Optional[T]],
+        ttl_seconds: float,
+    ) -> T:
+        lock_key = f"{LOCK_PREFIX}{namespace}:{key}"
+        token = await self._acquire_lock(lock_key)
+        if token is None:
+            # Another worker or instance is computing this key; wait for its result.
+            self._counters["lock_waits"] += 1
+            deadline = time.monotonic() + self.lock_wait_s
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval_s)
+                raw = await self._lookup(namespace, key)
+                if raw is not None and (value := decode(raw)) is not None:
+                    self._counters["lock_wait_hits"] += 1
+                    return value
+            self._counters["lock_timeouts"] += 1
+
+        try:
+            self._counters["computed"] += 1
+            value = await compute()
+            payload = encode(value)
+            if payload is not None:
+                await self.set(namespace, key, payload, ttl_seconds)
+            return value
+        finally:
+            if token is not None:
+                await self._release_lock(lock_key, token)
+
+    async def _acquire_lock(self, lock_key: str) -> Optional[str]:
+        """Take the compute lock; returns its token, or None when someone else holds it."""
+        token = uuid.uuid4().hex
+        if self.l2_available:
+            try:
+                return token if await self.l2.add(L2_KEY_PREFIX + lock_key, token, self.lock_ttl_s) else None
+            except CacheUnavailable as exc:
+                self._mark_l2_down(exc)
+        return token if await self.l1.add(lock_key, token, self.lock_ttl_s) else None
+
+    async def _release_lock(self, lock_key: str, token: str) -> None:
+        # Release both tiers: L2 may have gone down (or come back) while computing.
+        # Only our own token is deleted; past lock_ttl_s the lock may belong to someone else.
+        await self.l1.delete_if_equal(lock_key, token)
+        if self.l2_available:
+            try:
+                await self.l2.delete_if_equal(L2_KEY_PREFIX + lock_key, token)
+            except CacheUnavailable as exc:
+                self._mark_l2_down(exc)
+
+    def _mark_l2_down(self, exc: Exception) -> None:
+        self._counters["l2_errors"] += 1
+        if self.l2_available:
+            logger.warning("Shared cache unreachable, serving from L1 only for %.0fs: %s", self.l2_retry_s, exc)
+        self._l2_down_until = time.monotonic() + self.l2_retry_s
+
+
+def cache_fingerprint(*parts: object) -> str:
+    """Stable key for a request: the same parts give the same key on every instance."""
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = str(part).encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ.
+        digest.update(len(encoded).to_bytes(4, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class _RespError(str):
+    """An error reply from the server."""
+
+
+def _encode_command(args: tuple[str, ...]) -> bytes:
+    chunks = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode("utf-8")
+        chunks.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(chunks)
+
+
+async def _roundtrip(conn: tuple[asyncio.StreamReader, asyncio.StreamWriter], args: tuple[str, ...]) -> Any:
+    reader, writer = conn
+    writer.write(_encode_command(args))
+    await writer.drain()
+    return await _read_reply(reader)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode("utf-8")
+    if prefix == b"-":
+        return _RespError(body.decode("utf-8", "replace"))
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise ValueError(f"Unexpected RESP reply prefix {prefix!r}")
+
+
+_cache: Optional[TwoLevelCache] = None
+
+
+def get_cache() -> TwoLevelCache:
+    """Get or create the result cache; L1-only unless CACHE_L2_URL is set."""
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        l2 = None
+        if settings.cache_l2_url.strip():
+            l2 = RedisCacheBackend(
+                url=settings.cache_l2_url.strip(),
+                timeout_s=settings.cache_l2_timeout_ms / 1000,
+                pool_size=settings.cache_l2_pool_size,
+            )
+        _cache = TwoLevelCache(
+            l1=LocalCacheBackend(get_shared_state()),
+            l2=l2,
+            l1_ttl_s=settings.cache_l1_ttl_seconds,
+            l2_retry_s=settings.cache_l2_retry_seconds,
+            lock_ttl_s=settings.cache_lock_ttl_seconds,
+            lock_wait_s=settings.cache_lock_wait_seconds,
+        )
+        logger.info(
+            "Result cache initialized (l1=%s, l2=%s)",
+            _cache.l1.store.backend_name,
+            f"{l2.host}:{l2.port}/{l2.db}" if l2 is not None else "disabled",
+        )
+    return _cache
@@ -18,11 +18,21 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
-    # API Security
+    # API Security (comma-separated to accept several client keys)
     api_key: str = Field(
         default="",
         validation_alias=AliasChoices("ARETE_API_KEY", "SACRIFICE_API_KEY"),
     )
+    # Separate key for /admin endpoints; they are hidden (404) when unset.
+    admin_api_key: str = Field(
+        default="",
+        validation_alias=AliasChoices("ARETE_ADMIN_API_KEY", "SACRIFICE_ADMIN_API_KEY"),
+    )
+    # Initial state of the runtime profiling switch (toggle via PUT /admin/profiling).
+    admin_profiling_enabled: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("ARETE_ADMIN_PROFILING_ENABLED", "SACRIFICE_ADMIN_PROFILING_ENABLED"),
+    )
 
     # GCP / Vertex AI Configuration
     gcp_project_id: str = Field(
@@ -57,6 +67,18 @@ class Settings(BaseSettings):
         default=0.7,
         validation_alias=AliasChoices("ARETE_SWARM_TEMPERATURE", "SACRIFICE_SWARM_TEMPERATURE"),
     )
+    analysis_structured_output: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_STRUCTURED_OUTPUT", "SACRIFICE_ANALYSIS_STRUCTURED_OUTPUT"),
+    )
+    analysis_max_output_tokens: int = Field(
+        default=256,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_MAX_OUTPUT_TOKENS", "SACRIFICE_ANALYSIS_MAX_OUTPUT_TOKENS"),
+    )
+    analysis_reasoning_max_chars: int = Field(
+        default=240,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_REASONING_MAX_CHARS", "SACRIFICE_ANALYSIS_REASONING_MAX_CHARS"),
+    )
 
     # Server Configuration
     host: str = Field(
@@ -72,6 +94,436 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("ARETE_DEBUG", "SACRIFICE_DEBUG"),
     )
 
+    # Multi-worker serving / shared state
+    workers: int = Field(
+        default=1,
+        validation_alias=AliasChoices("ARETE_WORKERS", "SACRIFICE_WORKERS", "WEB_CONCURRENCY"),
+    )
+    shared_state_backend: str = Field(
+        default="auto",
+        validation_alias=AliasChoices("ARETE_SHARED_STATE_BACKEND", "SACRIFICE_SHARED_STATE_BACKEND"),
+    )
+    shared_state_path: str = Field(
+        default="/tmp/arete-shared-state.sqlite3",
+        validation_alias=AliasChoices("ARETE_SHARED_STATE_PATH", "SACRIFICE_SHARED_STATE_PATH"),
+    )
+    analysis_cache_ttl_seconds: int = Field(
+        default=86400,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_CACHE_TTL_SECONDS", "SACRIFICE_ANALYSIS_CACHE_TTL_SECONDS"),
+    )
+    # Two-level result cache: L1 is the shared state above, L2 an optional
+    # Redis-protocol server shared by every instance (redis://[:password@]host:port/db)
+    cache_l2_url: str = Field(
+        default="",
+        validation_alias=AliasChoices("ARETE_CACHE_L2_URL", "SACRIFICE_CACHE_L2_URL"),
+    )
+    cache_l2_timeout_ms: int = Field(
+        default=200,
+        validation_alias=AliasChoices("ARETE_CACHE_L2_TIMEOUT_MS", "SACRIFICE_CACHE_L2_TIMEOUT_MS"),
+    )
+    cache_l2_pool_size: int = Field(
+        default=8,
+        validation_alias=AliasChoices("ARETE_CACHE_L2_POOL_SIZE", "SACRIFICE_CACHE_L2_POOL_SIZE"),
+    )
+    cache_l2_retry_seconds: float = Field(
+        default=15.0,
+        validation_alias=AliasChoices("ARETE_CACHE_L2_RETRY_SECONDS", "SACRIFICE_CACHE_L2_RETRY_SECONDS"),
+    )
+    cache_l1_ttl_seconds: float = Field(
+        default=300.0,
+        validation_alias=AliasChoices("ARETE_CACHE_L1_TTL_SECONDS", "SACRIFICE_CACHE_L1_TTL_SECONDS"),
+    )
+    cache_lock_ttl_seconds: float = Field(
+        default=30.0,
+        validation_alias=AliasChoices("ARETE_CACHE_LOCK_TTL_SECONDS", "SACRIFICE_CACHE_LOCK_TTL_SECONDS"),
+    )
+    cache_lock_wait_seconds: float = Field(
+        default=8.0,
+        validation_alias=AliasChoices("ARETE_CACHE_LOCK_WAIT_SECONDS", "SACRIFICE_CACHE_LOCK_WAIT_SECONDS"),
+    )
+    circuit_breaker_failure_threshold: int = Field(
+        default=5,
+        validation_alias=AliasChoices(
+            "ARETE_CIRCUIT_BREAKER_FAILURE_THRESHOLD",
+            "SACRIFICE_CIRCUIT_BREAKER_FAILURE_THRESHOLD",
+        ),
+    )
+    circuit_breaker_reset_seconds: float = Field(
+        default=30.0,
+        validation_alias=AliasChoices("ARETE_CIRCUIT_BREAKER_RESET_SECONDS", "SACRIFICE_CIRCUIT_BREAKER_RESET_SECONDS"),
+    )
+    upstream_budget_per_minute: int = Field(
+        default=0,
+        validation_alias=AliasChoices("ARETE_UPSTREAM_BUDGET_PER_MINUTE", "SACRIFICE_UPSTREAM_BUDGET_PER_MINUTE"),
+    )
+
+    # CPU-bound work executors
+    executor_thread_workers: int = Field(
+        default=4,
+        validation_alias=AliasChoices("ARETE_EXECUTOR_THREAD_WORKERS", "SACRIFICE_EXECUTOR_THREAD_WORKERS"),
+    )
+    executor_process_workers: int = Field(
+        default=0,
+        validation_alias=AliasChoices("ARETE_EXECUTOR_PROCESS_WORKERS", "SACRIFICE_EXECUTOR_PROCESS_WORKERS"),
+    )
+    executor_offload_min_bytes: int = Field(
+        default=64 * 1024,
+        validation_alias=AliasChoices("ARETE_EXECUTOR_OFFLOAD_MIN_BYTES", "SACRIFICE_EXECUTOR_OFFLOAD_MIN_BYTES"),
+    )
+
+    # Admission control
+    admission_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("ARETE_ADMISSION_ENABLED", "SACRIFICE_ADMISSION_ENABLED"),
+    )
+    admission_max_concurrency: int = Field(
+        default=32,
+        validation_alias=AliasChoices("ARETE_ADMISSION_MAX_CONCURRENCY", "SACRIFICE_ADMISSION_MAX_CONCURRENCY"),
+    )
+    admission_key_rate_per_second: float = Field(
+        default=10.0,
+        validation_alias=AliasChoices("ARETE_ADMISSION_KEY_RATE_PER_SECOND", "SACRIFICE_ADMISSION_KEY_RATE_PER_SECOND"),
+    )
+    admission_key_burst: float = Field(
+        default=20.0,
+        validation_alias=AliasChoices("ARETE_ADMISSION_KEY_BURST", "SACRIFICE_ADMISSION_KEY_BURST"),
+    )
+    admission_swarm_queue_size: int = Field(
+        default=64,
+        validation_alias=AliasChoices("ARETE_ADMISSION_SWARM_QUEUE_SIZE", "SACRIFICE_ADMISSION_SWARM_QUEUE_SIZE"),
+    )
+    admission_swarm_max_wait_ms: int = Field(
+        default=500,
+        validation_alias=AliasChoices("ARETE_ADMISSION_SWARM_MAX_WAIT_MS", "SACRIFICE_ADMISSION_SWARM_MAX_WAIT_MS"),
+    )
+    admission_analysis_queue_size: int = Field(
+        default=16,
+        validation_alias=AliasChoices("ARETE_ADMISSION_ANALYSIS_QUEUE_SIZE", "SACRIFICE_ADMISSION_ANALYSIS_QUEUE_SIZE"),
+    )
+    admission_analysis_max_wait_ms: int = Field(
+        default=5000,
+        validation_alias=AliasChoices(
+            "ARETE_ADMISSION_ANALYSIS_MAX_WAIT_MS",
+            "SACRIFICE_ADMISSION_ANALYSIS_MAX_WAIT_MS",
+        ),
+    )
+
+    # Retry policies for upstream calls. A ladder is comma-separated model@temperature
+    # rungs for retries 1..N (the last repeats; an empty model keeps the request's).
+    swarm_retry_ladder: str = Field(
+        default="",
+        validation_alias=AliasChoices("ARETE_SWARM_RETRY_LADDER", "SACRIFICE_SWARM_RETRY_LADDER"),
+    )
+    analysis_retry_ladder: str = Field(
+        default="",
+        validation_alias=AliasChoices("ARETE_ANALYSIS_RETRY_LADDER", "SACRIFICE_ANALYSIS_RETRY_LADDER"),
+    )
+    analysis_retry_count: int = Field(
+        default=1,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_RETRY_COUNT", "SACRIFICE_ANALYSIS_RETRY_COUNT"),
+    )
+    retry_base_delay_ms: int = Field(
+        default=200,
+        validation_alias=AliasChoices("ARETE_RETRY_BASE_DELAY_MS", "SACRIFICE_RETRY_BASE_DELAY_MS"),
+    )
+    retry_max_delay_ms: int = Field(
+        default=2000,
+        validation_alias=AliasChoices("ARETE_RETRY_MAX_DELAY_MS", "SACRIFICE_RETRY_MAX_DELAY_MS"),
+    )
+    retry_on_quota: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("ARETE_RETRY_ON_QUOTA", "SACRIFICE_RETRY_ON_QUOTA"),
+    )
+    retry_budget_ratio: float = Field(
+        default=0.2,
+        validation_alias=AliasChoices("ARETE_RETRY_BUDGET_RATIO", "SACRIFICE_RETRY_BUDGET_RATIO"),
+    )
+    retry_budget_min_per_minute: int = Field(
+        default=10,
+        validation_alias=AliasChoices("ARETE_RETRY_BUDGET_MIN_PER_MINUTE", "SACRIFICE_RETRY_BUDGET_MIN_PER_MINUTE"),
+    )
+
+    # Adaptive (AIMD) upstream concurrency
+    upstream_initial_concurrency: int = Field(
+        default=8,
+        validation_alias=AliasChoices("ARETE_UPSTREAM_INITIAL_CONCURRENCY", "SACRIFICE_UPSTREAM_INITIAL_CONCURRENCY"),
+    )
+    upstream_min_concurrency: int = Field(
+        default=1,
+        validation_alias=AliasChoices("ARETE_UPSTREAM_MIN_CONCURRENCY", "SACRIFICE_UPSTREAM_MIN_CONCURRENCY"),
+    )
+    upstream_max_concurrency: int = Field(
+        default=64,
+        validation_alias=AliasChoices("ARETE_UPSTREAM_MAX_CONCURRENCY", "SACRIFICE_UPSTREAM_MAX_CONCURRENCY"),
+    )
+    upstream_backoff_factor: float = Field(
+        default=0.5,
+        validation_alias=AliasChoices("ARETE_UPSTREAM_BACKOFF_FACTOR", "SACRIFICE_UPSTREAM_BACKOFF_FACTOR"),
+    )
+    upstream_latency_spike_factor: float = Field(
+        default=2.5,
+        validation_alias=AliasChoices("ARETE_UPSTREAM_LATENCY_SPIKE_FACTOR", "SACRIFICE_UPSTREAM_LATENCY_SPIKE_FACTOR"),
+    )
+
+    # Analysis result store
+    result_store_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("ARETE_RESULT_STORE_ENABLED", "SACRIFICE_RESULT_STORE_ENABLED"),
+    )
+    result_store_path: str = Field(
+        default="/tmp/arete-results.sqlite3",
+        validation_alias=AliasChoices("ARETE_RESULT_STORE_PATH", "SACRIFICE_RESULT_STORE_PATH"),
+    )
+    result_store_batch_size: int = Field(
+        default=50,
+        validation_alias=AliasChoices("ARETE_RESULT_STORE_BATCH_SIZE", "SACRIFICE_RESULT_STORE_BATCH_SIZE"),
+    )
+    result_store_flush_interval_ms: int = Field(
+        default=500,
+        validation_alias=AliasChoices(
+            "ARETE_RESULT_STORE_FLUSH_INTERVAL_MS",
+            "SACRIFICE_RESULT_STORE_FLUSH_INTERVAL_MS",
+        ),
+    )
+    result_store_queue_size: int = Field(
+        default=10000,
+        validation_alias=AliasChoices("ARETE_RESULT_STORE_QUEUE_SIZE", "SACRIFICE_RESULT_STORE_QUEUE_SIZE"),
+    )
+
+    # Hash-first uploads: answer from a stored analysis before the photo is sent
+    analysis_hash_precheck_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_HASH_PRECHECK_ENABLED",
+            "SACRIFICE_ANALYSIS_HASH_PRECHECK_ENABLED",
+        ),
+    )
+
+    # Deferred analysis jobs (submit/poll) on a per-instance SQLite queue
+    analysis_jobs_enabled: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_JOBS_ENABLED", "SACRIFICE_ANALYSIS_JOBS_ENABLED"),
+    )
+    analysis_jobs_path: str = Field(
+        default="/tmp/arete-jobs.sqlite3",
+        validation_alias=AliasChoices("ARETE_ANALYSIS_JOBS_PATH", "SACRIFICE_ANALYSIS_JOBS_PATH"),
+    )
+    analysis_jobs_workers: int = Field(
+        default=2,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_JOBS_WORKERS", "SACRIFICE_ANALYSIS_JOBS_WORKERS"),
+    )
+    analysis_jobs_max_attempts: int = Field(
+        default=5,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_JOBS_MAX_ATTEMPTS", "SACRIFICE_ANALYSIS_JOBS_MAX_ATTEMPTS"),
+    )
+    analysis_jobs_retry_base_seconds: float = Field(
+        default=30.0,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_JOBS_RETRY_BASE_SECONDS",
+            "SACRIFICE_ANALYSIS_JOBS_RETRY_BASE_SECONDS",
+        ),
+    )
+    analysis_jobs_lease_seconds: float = Field(
+        default=120.0,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_JOBS_LEASE_SECONDS", "SACRIFICE_ANALYSIS_JOBS_LEASE_SECONDS"),
+    )
+    analysis_jobs_poll_interval_ms: int = Field(
+        default=500,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_JOBS_POLL_INTERVAL_MS",
+            "SACRIFICE_ANALYSIS_JOBS_POLL_INTERVAL_MS",
+        ),
+    )
+    analysis_jobs_max_queued_mb: int = Field(
+        default=64,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_JOBS_MAX_QUEUED_MB", "SACRIFICE_ANALYSIS_JOBS_MAX_QUEUED_MB"),
+    )
+    analysis_jobs_retention_hours: float = Field(
+        default=24.0,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_JOBS_RETENTION_HOURS",
+            "SACRIFICE_ANALYSIS_JOBS_RETENTION_HOURS",
+        ),
+    )
+    analysis_jobs_dead_retention_hours: float = Field(
+        default=72.0,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_JOBS_DEAD_RETENTION_HOURS",
+            "SACRIFICE_ANALYSIS_JOBS_DEAD_RETENTION_HOURS",
+        ),
+    )
+
+    # Server-Timing response header with per-phase latency
+    server_timing_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("ARETE_SERVER_TIMING_ENABLED", "SACRIFICE_SERVER_TIMING_ENABLED"),
+    )
+
+    # Swarm model routing by snapshot complexity
+    swarm_router_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("ARETE_SWARM_ROUTER_ENABLED", "SACRIFICE_SWARM_ROUTER_ENABLED"),
+    )
+    swarm_fast_model: str = Field(
+        default="gemini-2.0-flash",
+        validation_alias=AliasChoices("ARETE_SWARM_FAST_MODEL", "SACRIFICE_SWARM_FAST_MODEL"),
+    )
+    swarm_router_threshold: float = Field(
+        default=0.35,
+        validation_alias=AliasChoices("ARETE_SWARM_ROUTER_THRESHOLD", "SACRIFICE_SWARM_ROUTER_THRESHOLD"),
+    )
+    swarm_router_contested_progress: float = Field(
+        default=0.05,
+        validation_alias=AliasChoices(
+            "ARETE_SWARM_ROUTER_CONTESTED_PROGRESS",
+            "SACRIFICE_SWARM_ROUTER_CONTESTED_PROGRESS",
+        ),
+    )
+    swarm_router_default_models: str = Field(
+        default="gemini-3-flash",
+        validation_alias=AliasChoices(
+            "ARETE_SWARM_ROUTER_DEFAULT_MODELS",
+            "SACRIFICE_SWARM_ROUTER_DEFAULT_MODELS",
+        ),
+    )
+
+    # Swarm micro-batching: concurrent requests sharing a system prompt become one call
+    swarm_batching_enabled: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("ARETE_SWARM_BATCHING_ENABLED", "SACRIFICE_SWARM_BATCHING_ENABLED"),
+    )
+    swarm_batch_window_ms: int = Field(
+        default=80,
+        validation_alias=AliasChoices("ARETE_SWARM_BATCH_WINDOW_MS", "SACRIFICE_SWARM_BATCH_WINDOW_MS"),
+    )
+    swarm_batch_max_size: int = Field(
+        default=8,
+        validation_alias=AliasChoices("ARETE_SWARM_BATCH_MAX_SIZE", "SACRIFICE_SWARM_BATCH_MAX_SIZE"),
+    )
+
+    # Swarm directive feasibility checks against the request snapshot
+    swarm_directive_validation_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices(
+            "ARETE_SWARM_DIRECTIVE_VALIDATION_ENABLED",
+            "SACRIFICE_SWARM_DIRECTIVE_VALIDATION_ENABLED",
+        ),
+    )
+
+    # Food analysis cascade: fast model first, escalate uncertain results
+    analysis_cascade_enabled: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("ARETE_ANALYSIS_CASCADE_ENABLED", "SACRIFICE_ANALYSIS_CASCADE_ENABLED"),
+    )
+    analysis_cascade_fast_model: str = Field(
+        default="gemini-2.0-flash-lite",
+        validation_alias=AliasChoices("ARETE_ANALYSIS_CASCADE_FAST_MODEL", "SACRIFICE_ANALYSIS_CASCADE_FAST_MODEL"),
+    )
+    analysis_cascade_fast_max_tokens: int = Field(
+        default=128,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_CASCADE_FAST_MAX_TOKENS",
+            "SACRIFICE_ANALYSIS_CASCADE_FAST_MAX_TOKENS",
+        ),
+    )
+    analysis_cascade_min_confidence: float = Field(
+        default=0.8,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_CASCADE_MIN_CONFIDENCE",
+            "SACRIFICE_ANALYSIS_CASCADE_MIN_CONFIDENCE",
+        ),
+    )
+    analysis_cascade_boundary_margin: float = Field(
+        default=0.03,
+        validation_alias=AliasChoices(
+            "ARETE_ANALYSIS_CASCADE_BOUNDARY_MARGIN",
+            "SACRIFICE_ANALYSIS_CASCADE_BOUNDARY_MARGIN",
+        ),
+    )
+
+    # Per-key token usage ledger and budgets (0 = unlimited)
+    usage_ledger_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("ARETE_USAGE_LEDGER_ENABLED", "SACRIFICE_USAGE_LEDGER_ENABLED"),
+    )
+    usage_ledger_path: str = Field(
+        default="/tmp/arete-usage.sqlite3",
+        validation_alias=AliasChoices("ARETE_USAGE_LEDGER_PATH", "SACRIFICE_USAGE_LEDGER_PATH"),
+    )
+    usage_flush_interval_seconds: float = Field(
+        default=10.0,
+        validation_alias=AliasChoices("ARETE_USAGE_FLUSH_INTERVAL_SECONDS", "SACRIFICE_USAGE_FLUSH_INTERVAL_SECONDS"),
+    )
+    usage_minute_token_budget: int = Field(
+        default=0,
+        validation_alias=AliasChoices("ARETE_USAGE_MINUTE_TOKEN_BUDGET", "SACRIFICE_USAGE_MINUTE_TOKEN_BUDGET"),
+    )
+    usage_daily_token_budget: int = Field(
+        default=0,
+        validation_alias=AliasChoices("ARETE_USAGE_DAILY_TOKEN_BUDGET", "SACRIFICE_USAGE_DAILY_TOKEN_BUDGET"),
+    )
+    usage_budget_hold_multiplier: float = Field(
+        default=1.5,
+        validation_alias=AliasChoices("ARETE_USAGE_BUDGET_HOLD_MULTIPLIER", "SACRIFICE_USAGE_BUDGET_HOLD_MULTIPLIER"),
+    )
+    usage_degraded_swarm_model: str = Field(
+        default="gemini-2.0-flash-lite",
+        validation_alias=AliasChoices("ARETE_USAGE_DEGRADED_SWARM_MODEL", "SACRIFICE_USAGE_DEGRADED_SWARM_MODEL"),
+    )
+    usage_degraded_analysis_model: str = Field(
+        default="gemini-2.0-flash-lite",
+        validation_alias=AliasChoices(
+            "ARETE_USAGE_DEGRADED_ANALYSIS_MODEL",
+            "SACRIFICE_USAGE_DEGRADED_ANALYSIS_MODEL",
+        ),
+    )
+
+    # Shadow evaluation of candidate models
+    shadow_enabled: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("ARETE_SHADOW_ENABLED", "SACRIFICE_SHADOW_ENABLED"),
+    )
+    shadow_swarm_model: str = Field(
+        default="",
+        validation_alias=AliasChoices("ARETE_SHADOW_SWARM_MODEL", "SACRIFICE_SHADOW_SWARM_MODEL"),
+    )
+    shadow_analysis_model: str = Field(
+        default="",
+        validation_alias=AliasChoices("ARETE_SHADOW_ANALYSIS_MODEL", "SACRIFICE_SHADOW_ANALYSIS_MODEL"),
+    )
+    shadow_sample_rate: float = Field(
+        default=0.05,
+        validation_alias=AliasChoices("ARETE_SHADOW_SAMPLE_RATE", "SACRIFICE_SHADOW_SAMPLE_RATE"),
+    )
+    shadow_max_concurrency: int = Field(
+        default=2,
+        validation_alias=AliasChoices("ARETE_SHADOW_MAX_CONCURRENCY", "SACRIFICE_SHADOW_MAX_CONCURRENCY"),
+    )
+
+    # Upstream record/replay (passthrough | record | replay)
+    upstream_recording_mode: str = Field(
+        default="passthrough",
+        validation_alias=AliasChoices("ARETE_UPSTREAM_RECORDING_MODE", "SACRIFICE_UPSTREAM_RECORDING_MODE"),
+    )
+    upstream_recording_dir: str = Field(
+        default="/tmp/arete-recordings",
+        validation_alias=AliasChoices("ARETE_UPSTREAM_RECORDING_DIR", "SACRIFICE_UPSTREAM_RECORDING_DIR"),
+    )
+    upstream_replay_simulate_latency: bool = Field(
+        default=False,
+        validation_alias=AliasChoices(
+            "ARETE_UPSTREAM_REPLAY_SIMULATE_LATENCY",
+            "SACRIFICE_UPSTREAM_REPLAY_SIMULATE_LATENCY",
+        ),
+    )
+    upstream_replay_latency_scale: float = Field(
+        default=1.0,
+        validation_alias=AliasChoices(
+            "ARETE_UPSTREAM_REPLAY_LATENCY_SCALE",
+            "SACRIFICE_UPSTREAM_REPLAY_LATENCY_SCALE",
+        ),
+    )
+
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,150 @@
+"""
+Typed swarm directive model.
+Directives are immutable, slot-based values: the order is validated through
+an enum, zone ids are normalized on construction, and the compact JSON form is
+computed once and reused. The canonical hold is a module-level singleton, so
+failure paths never rebuild or re-serialize it.
+"""
+
+import json
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Any, Optional
+
+DEFAULT_HOLD_REASONING = "Comms degraded. Holding sectors and observing target movement."
+
+ZONE_ALIASES = {
+    "zone_alpha": "alpha",
+    "zone_bravo": "bravo",
+    "zone_charlie": "charlie",
+}
+
+DIRECTIVE_FIELDS = (
+    "order",
+    "target_zone",
+    "squad_size",
+    "priority",
+    "from_zone",
+    "to_zone",
+    "count",
+    "decoy_zone",
+    "decoy_size",
+    "real_target_zone",
+    "real_size",
+    "reasoning",
+)
+
+
+class DirectiveOrder(str, Enum):
+    REINFORCE = "reinforce"
+    REDISTRIBUTE = "redistribute"
+    RECAPTURE = "recapture"
+    HOLD = "hold"
+    FEINT = "feint"
+
+    @classmethod
+    def parse(cls, value: object) -> Optional["DirectiveOrder"]:
+        """Return the order for a loosely formatted token, or None if unknown."""
+        try:
+            return cls(safe_str(value).lower())
+        except ValueError:
+            return None
+
+
+@dataclass(frozen=True, slots=True)
+class SwarmDirective:
+    order: DirectiveOrder = DirectiveOrder.HOLD
+    target_zone: str = ""
+    squad_size: int = 0
+    priority: str = ""
+    from_zone: str = ""
+    to_zone: str = ""
+    count: int = 0
+    decoy_zone: str = ""
+    decoy_size: int = 0
+    real_target_zone: str = ""
+    real_size: int = 0
+    reasoning: str = DEFAULT_HOLD_REASONING
+    _json: str = field(init=False, repr=False, compare=False, default="")
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_json", json.dumps(self.to_dict(), separators=(",", ":")))
+
+    @classmethod
+    def from_fields(cls, order: DirectiveOrder, **raw: object) -> "SwarmDirective":
+        """Build a directive from untrusted values, normalizing zones, counts and text."""
+        return cls(
+            order=order,
+            target_zone=normalize_zone(raw.get("target_zone")),
+            squad_size=to_non_negative_int(raw.get("squad_size")),
+            priority=safe_str(raw.get("priority")),
+            from_zone=normalize_zone(raw.get("from_zone")),
+            to_zone=normalize_zone(raw.get("to_zone")),
+            count=to_non_negative_int(raw.get("count")),
+            decoy_zone=normalize_zone(raw.get("decoy_zone")),
+            decoy_size=to_non_negative_int(raw.get("decoy_size")),
+            real_target_zone=normalize_zone(raw.get("real_target_zone")),
+            real_size=to_non_negative_int(raw.get("real_size")),
+            reasoning=safe_str(raw.get("reasoning")) or DEFAULT_HOLD_REASONING,
+        )
+
+    @property
+    def is_actionable(self) -> bool:
+        """True when the order carries every field the game needs to execute it."""
+        if self.order is DirectiveOrder.HOLD:
+            return True
+
+        if self.order in (DirectiveOrder.REINFORCE, DirectiveOrder.RECAPTURE):
+            return bool(self.target_zone) and self.squad_size > 0
+
+        if self.order is DirectiveOrder.REDISTRIBUTE:
+            return (
+                bool(self.from_zone)
+                and bool(self.to_zone)
+                and self.from_zone != self.to_zone
+                and self.count > 0
+            )
+
+        if self.order is DirectiveOrder.FEINT:
+            return (
+                bool(self.decoy_zone)
+                and bool(self.real_target_zone)
+                and self.decoy_zone != self.real_target_zone
+                and self.decoy_size > 0
+                and self.real_size > 0
+            )
+
+        return False
+
+    def to_dict(self) -> dict[str, Any]:
+        data = {name: getattr(self, name) for name in DIRECTIVE_FIELDS}
+        data["order"] = self.order.value
+        return data
+
+    def to_json(self) -> str:
+        return self._json
+
+    def with_changes(self, **changes: Any) -> "SwarmDirective":
+        return replace(self, **changes)
+
+
+HOLD_DIRECTIVE = SwarmDirective()
+
+
+def normalize_zone(value: object) -> str:
+    token = safe_str(value).lower()
+    return ZONE_ALIASES.get(token, token)
+
+
+def to_non_negative_int(value: object) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def safe_str(value: object) -> str:
+    if value is None:
+        return ""
+    return str(value).strip()
+
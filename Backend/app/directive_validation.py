@@ -0,0 +1,200 @@
+"""
+Feasibility checks for swarm directives against the snapshot they answer.
+A directive can be well-formed and still be rejected by the game: a zone that
+is not on the map, more drones than are alive, a reinforce with no squads left
+or while the reinforcement cooldown runs. These mirror the game's own checks
+(StrategicDirectiveParser) so infeasible orders are caught server-side, while
+another candidate or attempt can still be tried.
+
+Oversized counts are clamped to what the snapshot allows; everything else is
+rejected with a reason, and the reasons are counted for /metrics.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from .config import get_settings
+from .directive import DirectiveOrder, SwarmDirective, normalize_zone, to_non_negative_int
+
+logger = logging.getLogger(__name__)
+
+REJECTION_REASONS = ("not_actionable", "unknown_zone", "no_defenders", "no_squads", "cooldown_active", "no_drones")
+REPAIRABLE_FIELDS = ("squad_size", "count", "decoy_size", "real_size")
+# The game treats a cooldown at or below this as elapsed.
+COOLDOWN_EPSILON_S = 0.05
+
+ORDER_ZONE_FIELDS = {
+    DirectiveOrder.REINFORCE: ("target_zone",),
+    DirectiveOrder.RECAPTURE: ("target_zone",),
+    DirectiveOrder.REDISTRIBUTE: ("from_zone", "to_zone"),
+    DirectiveOrder.FEINT: ("decoy_zone", "real_target_zone"),
+    DirectiveOrder.HOLD: (),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotLimits:
+    """What a snapshot allows; None (or no zones) means the snapshot did not say."""
+
+    zone_ids: frozenset[str] = frozenset()
+    defenders: dict[str, int] = field(default_factory=dict, hash=False)
+    squads_available: Optional[int] = None
+    drones_alive: Optional[int] = None
+    cooldown_s: float = 0.0
+
+    @classmethod
+    def from_snapshot(cls, snapshot: object) -> Optional["SnapshotLimits"]:
+        if isinstance(snapshot, str):
+            try:
+                snapshot = json.loads(snapshot)
+            except json.JSONDecodeError:
+                return None
+        if not isinstance(snapshot, dict):
+            return None
+
+        zones = [zone for zone in snapshot.get("zones") or [] if isinstance(zone, dict)]
+        defenders = {
+            normalize_zone(zone.get("id")): to_non_negative_int(zone.get("defenders_count"))
+            for zone in zones
+            if "defenders_count" in zone
+        }
+        resources = snapshot.get("ai_resources") if isinstance(snapshot.get("ai_resources"), dict) else {}
+        return cls(
+            zone_ids=frozenset(normalize_zone(zone.get("id")) for zone in zones if zone.get("id")),
+            defenders=defenders,
+            squads_available=_optional_count(resources, "reinforcement_squads_available"),
+            drones_alive=_optional_count(resources, "total_drones_alive"),
+            cooldown_s=_number(resources.get("reinforcement_cooldown_seconds")),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class DirectiveCheck:
+    directive: SwarmDirective
+    repairs: tuple[str, ...] = ()
+    rejection: str = ""
+
+    @property
+    def feasible(self) -> bool:
+        return not self.rejection
+
+
+def check_directive(directive: SwarmDirective, limits: SnapshotLimits) -> DirectiveCheck:
+    """Check a directive against the snapshot, clamping counts that merely overshoot."""
+    if directive.order is DirectiveOrder.HOLD:
+        return DirectiveCheck(directive)
+    if not directive.is_actionable:
+        return DirectiveCheck(directive, rejection="not_actionable")
+
+    zones = [getattr(directive, name) for name in ORDER_ZONE_FIELDS[directive.order]]
+    if limits.zone_ids and any(zone not in limits.zone_ids for zone in zones):
+        return DirectiveCheck(directive, rejection="unknown_zone")
+
+    if directive.order is DirectiveOrder.REDISTRIBUTE:
+        available = limits.defenders.get(directive.from_zone)
+        if available is None or directive.count <= available:
+            return DirectiveCheck(directive)
+        if available <= 0:
+            return DirectiveCheck(directive, rejection="no_defenders")
+        return DirectiveCheck(directive.with_changes(count=available), repairs=("count",))
+
+    squads_needed = 2 if directive.order is DirectiveOrder.FEINT else 1
+    if limits.squads_available is not None and limits.squads_available < squads_needed:
+        return DirectiveCheck(directive, rejection="no_squads")
+    if limits.cooldown_s > COOLDOWN_EPSILON_S:
+        return DirectiveCheck(directive, rejection="cooldown_active")
+    if limits.drones_alive is None:
+        return DirectiveCheck(directive)
+
+    # Like the game, a dead-empty swarm still counts as one drone for sizing.
+    drones = max(1, limits.drones_alive)
+    if directive.order is not DirectiveOrder.FEINT:
+        if directive.squad_size <= drones:
+            return DirectiveCheck(directive)
+        return DirectiveCheck(directive.with_changes(squad_size=drones), repairs=("squad_size",))
+
+    if directive.decoy_size + directive.real_size <= drones:
+        return DirectiveCheck(directive)
+    if drones < 2:
+        return DirectiveCheck(directive, rejection="no_drones")
+    # Keep as much of the real strike as possible; the decoy gets what is left.
+    real_size = min(directive.real_size, drones - 1)
+    decoy_size = min(directive.decoy_size, drones - real_size)
+    repairs = tuple(
+        name
+        for name, before, after in (
+            ("decoy_size", directive.decoy_size, decoy_size),
+            ("real_size", directive.real_size, real_size),
+        )
+        if before != after
+    )
+    return DirectiveCheck(directive.with_changes(decoy_size=decoy_size, real_size=real_size), repairs=repairs)
+
+
+class DirectiveValidator:
+    """Builds snapshot limits per request and counts how directives fared against them."""
+
+    def __init__(self):
+        self._counters = {"checked": 0, "accepted": 0, "repaired": 0, "rejected": 0, "unparsed_snapshots": 0}
+        self._reasons = dict.fromkeys(REJECTION_REASONS, 0)
+        self._repairs = dict.fromkeys(REPAIRABLE_FIELDS, 0)
+
+    def limits_for(self, snapshot_json: str) -> Optional[SnapshotLimits]:
+        limits = SnapshotLimits.from_snapshot(snapshot_json)
+        if limits is None:
+            self._counters["unparsed_snapshots"] += 1
+            logger.warning("Swarm snapshot is not a JSON object; skipping directive validation")
+        return limits
+
+    def record(self, outcome: dict[str, Any]) -> None:
+        """Count the rejections and repairs reported by one candidate selection."""
+        for reason in outcome.get("rejections", ()):
+            self._counters["checked"] += 1
+            self._counters["rejected"] += 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        if not outcome.get("model_valid") or "repairs" not in outcome:
+            return
+
+        self._counters["checked"] += 1
+        if outcome["repairs"]:
+            self._counters["repaired"] += 1
+            for name in outcome["repairs"]:
+                self._repairs[name] += 1
+        else:
+            self._counters["accepted"] += 1
+
+    def stats(self) -> dict[str, Any]:
+        checked = self._counters["checked"]
+        return {
+            **self._counters,
+            "rejection_rate": round(self._counters["rejected"] / checked, 4) if checked else 0.0,
+            "rejection_reasons": dict(self._reasons),
+            "repaired_fields": dict(self._repairs),
+        }
+
+
+def _optional_count(values: dict[str, Any], name: str) -> Optional[int]:
+    return to_non_negative_int(values[name]) if name in values else None
+
+
+def _number(value: object) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+_validator: Optional[DirectiveValidator] = None
+
+
+def get_directive_validator() -> Optional[DirectiveValidator]:
+    """Get or create the directive validator; None when validation is off."""
+    global _validator
+    if not get_settings().swarm_directive_validation_enabled:
+        return None
+
+    if _validator is None:
+        _validator = DirectiveValidator()
+    return _validator
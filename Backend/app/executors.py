@@ -0,0 +1,179 @@
+"""
+Executor pools for CPU-bound request work.
+Keeps base64 decoding, large-body validation, hashing and directive
+normalization off the event loop so one heavy request does not add latency to
+every other in-flight request.
+
+Two pools are available:
+- a thread pool for work that releases the GIL (hashlib, large C-level copies);
+- an optional process pool for pure-Python heavy work (regex/JSON scanning).
+When the process pool is disabled, ``run_cpu`` falls back to the thread pool.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolStats:
+    """Queue-depth and wait-time counters for one pool."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.total_wait_s = 0.0
+        self.total_run_s = 0.0
+
+    def on_submit(self) -> None:
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def on_done(self, wait_s: float, run_s: float, failed: bool, cancelled: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            if cancelled:
+                self.cancelled += 1
+            elif failed:
+                self.failed += 1
+            self.total_wait_s += wait_s
+            self.total_run_s += run_s
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            completed = max(1, self.completed)
+            return {
+                "max_workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.max_workers),
+                "peak_in_flight": self.peak_in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "avg_wait_ms": round(self.total_wait_s / completed * 1000, 3),
+                "avg_run_ms": round(self.total_run_s / completed * 1000, 3),
+            }
+
+
+class ExecutorPools:
+    """Thread pool plus optional process pool with queue-depth metrics."""
+
+    def __init__(self, thread_workers: int, process_workers: int, offload_min_bytes: int):
+        self.offload_min_bytes = max(0, int(offload_min_bytes))
+
+        thread_workers = max(1, int(thread_workers))
+        self._thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="arete-cpu")
+        self._thread_stats = _PoolStats("thread", thread_workers)
+
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_stats: Optional[_PoolStats] = None
+        if int(process_workers) > 0:
+            self._process_pool = ProcessPoolExecutor(max_workers=int(process_workers))
+            self._process_stats = _PoolStats("process", int(process_workers))
+
+        logger.info(
+            "Executor pools initialized (threads=%s, processes=%s, offload_min_bytes=%s)",
+            thread_workers,
+            int(process_workers),
+            self.offload_min_bytes,
+        )
+
+    def should_offload(self, payload_size: int) -> bool:
+        """Small payloads are cheaper to handle inline than to hand to a pool."""
+        return payload_size >= self.offload_min_bytes
+
+    async def run_thread(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run GIL-releasing work on the thread pool."""
+        return await self._submit(self._thread_pool, self._thread_stats, fn, args)
+
+    async def run_cpu(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run pure-Python heavy work on the process pool (or the thread pool if disabled).
+
+        ``fn`` and ``args`` must be picklable when the process pool is enabled.
+        """
+        if self._process_pool is not None and self._process_stats is not None:
+            return await self._submit(self._process_pool, self._process_stats, fn, args)
+        return await self._submit(self._thread_pool, self._thread_stats, fn, args)
+
+    async def _submit(self, pool: Executor, stats: _PoolStats, fn: Callable[..., Any], args: tuple) -> Any:
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        stats.on_submit()
+
+        try:
+            result, started_at = await loop.run_in_executor(pool, _timed_call, fn, args)
+        except BaseException as exc:
+            # Includes CancelledError (client disconnect, wait_for timeout) so in_flight always comes back down.
+            stats.on_done(
+                wait_s=0.0,
+                run_s=time.time() - submitted_at,
+                failed=True,
+                cancelled=isinstance(exc, asyncio.CancelledError),
+            )
+            raise
+
+        finished_at = time.time()
+        stats.on_done(
+            wait_s=max(0.0, started_at - submitted_at),
+            run_s=max(0.0, finished_at - started_at),
+            failed=False,
+        )
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        result = {"thread": self._thread_stats.snapshot()}
+        if self._process_stats is not None:
+            result["process"] = self._process_stats.snapshot()
+        return result
+
+    def shutdown(self) -> None:
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _timed_call(fn: Callable[..., Any], args: tuple) -> tuple[Any, float]:
+    # Module-level so it pickles for the process pool; wall clock is comparable across processes.
+    started_at = time.time()
+    return fn(*args), started_at
+
+
+_executors: Optional[ExecutorPools] = None
+
+
+def get_executors() -> ExecutorPools:
+    """Get or create the executor pools for this worker process."""
+    global _executors
+    if _executors is None:
+        settings = get_settings()
+        _executors = ExecutorPools(
+            thread_workers=settings.executor_thread_workers,
+            process_workers=settings.executor_process_workers,
+            offload_min_bytes=settings.executor_offload_min_bytes,
+        )
+    return _executors
+
+
+def shutdown_executors() -> None:
+    """Release pool threads/processes at application shutdown."""
+    global _executors
+    if _executors is not None:
+        _executors.shutdown()
+        _executors = None
@@ -4,15 +4,33 @@ Uses GCP Vertex AI with project-based authentication (Application Default Creden
 Returns a health score from 0.0 (unhealthy) to 1.0 (healthy).
 """
 
+import hashlib
 import json
 import logging
 import re
+import time
 from typing import Any, Optional
 
 from google import genai
 from google.genai import types
 
+from .analysis_cascade import get_analysis_cascade
+from .cache import cache_fingerprint, get_cache
 from .config import get_settings
+from .directive import (
+    HOLD_DIRECTIVE,
+    DirectiveOrder,
+    SwarmDirective,
+    safe_str,
+)
+from .directive_validation import SnapshotLimits, check_directive, get_directive_validator
+from .executors import get_executors
+from .recorder import ReplayMissError, build_transport
+from .retry_policy import UpstreamUnavailableError, get_retry_controller
+from .server_timing import phase, record
+from .usage_ledger import TokenUsage, get_usage_ledger, tally_usage
+from .shared_state import CircuitBreaker, get_shared_state, window_key
+from .upstream_limiter import get_upstream_limiter, is_quota_error
 
 logger = logging.getLogger(__name__)
 
@@ -44,8 +62,21 @@ If no food is visible in the image, return:
 
 Remember: Return ONLY the JSON object, no additional text."""
 
-DEFAULT_HOLD_REASONING = "Comms degraded. Holding sectors and observing target movement."
+# The cascade's fast tier also reports how sure it is, and keeps the reasoning
+# short so the whole answer fits its small output budget.
+ANALYSIS_CASCADE_PROMPT = ANALYSIS_PROMPT.replace(
+    '"reasoning": "<brief 1-2 sentence explanation>"',
+    '"confidence": <float between 0.0 and 1.0, how certain you are of the category>,\n'
+    '    "reasoning": "<one short sentence>"',
+)
+
 NON_THINKING_RESCUE_MODEL = "gemini-2.0-flash"
+UNCACHEABLE_CATEGORIES = {"error", "parse_error"}
+FORCED_HOLD_STATUS = "forced_hold"
+INTERNAL_KEY_ID = "internal"
+ANALYSIS_TEMPERATURE = 0.1
+ANALYSIS_CATEGORIES = ["excellent", "good", "moderate", "poor", "unhealthy", "invalid"]
+ANALYSIS_PROMPT_DIGEST = hashlib.sha256(ANALYSIS_PROMPT.encode("utf-8")).hexdigest()[:12]
 
 SWARM_DIRECTIVE_SCHEMA = types.Schema(
     type=types.Type.OBJECT,
@@ -84,6 +115,43 @@ SWARM_DIRECTIVE_SCHEMA = types.Schema(
 )
 
 
+# One directive per snapshot of a micro-batch, keyed by the request id it answers.
+SWARM_BATCH_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        required=["request_id", "directive"],
+        property_ordering=["request_id", "directive"],
+        properties={
+            "request_id": types.Schema(type=types.Type.STRING),
+            "directive": SWARM_DIRECTIVE_SCHEMA,
+        },
+    ),
+)
+
+FOOD_ANALYSIS_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    required=["score", "category", "reasoning"],
+    property_ordering=["score", "category", "reasoning"],
+    properties={
+        "score": types.Schema(type=types.Type.NUMBER, minimum=0.0, maximum=1.0),
+        "category": types.Schema(type=types.Type.STRING, enum=ANALYSIS_CATEGORIES),
+        "reasoning": types.Schema(type=types.Type.STRING, description="One or two short sentences."),
+    },
+)
+
+# The cascade's fast tier adds its confidence ahead of the reasoning.
+FOOD_CASCADE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    required=["score", "category", "confidence", "reasoning"],
+    property_ordering=["score", "category", "confidence", "reasoning"],
+    properties={
+        **FOOD_ANALYSIS_SCHEMA.properties,
+        "confidence": types.Schema(type=types.Type.NUMBER, minimum=0.0, maximum=1.0),
+    },
+)
+
+
 class FoodAnalyzer:
     """Analyzes food images using Google Gemini via Vertex AI."""
 
@@ -95,7 +163,16 @@ class FoodAnalyzer:
             project=settings.gcp_project_id,
             location=settings.gcp_location,
         )
+        self.transport = build_transport(self.client.aio.models)
         self.model_name = settings.gemini_model
+        self.shared_state = get_shared_state()
+        self.cache = get_cache()
+        self.executors = get_executors()
+        self.limiter = get_upstream_limiter()
+        self.usage_ledger = get_usage_ledger()
+        self.cascade = get_analysis_cascade()
+        self.retries = get_retry_controller()
+        self._breakers: dict[str, CircuitBreaker] = {}
 
         logger.info(
             "FoodAnalyzer initialized (project=%s, location=%s, model=%s)",
@@ -104,29 +181,232 @@ class FoodAnalyzer:
             self.model_name,
         )
 
-    async def analyze_image(self, image_bytes: bytes, mime_type: str = "image/jpeg") -> dict:
+    async def analyze_image(
+        self,
+        image_bytes: bytes,
+        mime_type: str = "image/jpeg",
+        image_digest: Optional[str] = None,
+        use_cache: bool = True,
+        model_name: Optional[str] = None,
+        key_id: str = INTERNAL_KEY_ID,
+        cascade: bool = True,
+    ) -> dict:
+        """Score a food photo; ``cascade=False`` asks ``model_name`` directly even when it is the default model."""
         if not image_bytes:
             return _error_result("No image data received")
 
+        model = model_name or self.model_name
+        cascade = cascade and self.cascade is not None and model == self.model_name
+        # Results are shared across workers and (with an L2 cache) instances, so a
+        # photo re-submitted anywhere skips the Vertex round trip, and concurrent
+        # uploads of the same photo share a single call.
+        image_digest = image_digest or await self.image_digest(image_bytes)
+        cache_key = self._analysis_cache_key(model, mime_type, image_digest, cascade)
+
+        async def _compute() -> dict:
+            if cascade:
+                return await self._analyze_cascade(image_bytes, mime_type, model, key_id)
+            return await self._analyze_uncached(image_bytes, mime_type, model, key_id)
+
+        ttl_seconds = self.settings.analysis_cache_ttl_seconds
+        if not use_cache:
+            result = await _compute()
+            if (payload := _encode_cacheable_result(result)) is not None:
+                await self.cache.set("analysis", cache_key, payload, ttl_seconds)
+            return result
+        return await self.cache.get_or_compute(
+            "analysis",
+            cache_key,
+            _compute,
+            encode=_encode_cacheable_result,
+            decode=_load_cached_result,
+            ttl_seconds=ttl_seconds,
+        )
+
+    async def image_digest(self, image_bytes: bytes) -> str:
+        """SHA-256 hex digest of an image, used as its identity in caches and the result store."""
+        # hashlib releases the GIL for large buffers, so multi-MB photos hash on the thread pool.
+        if self.executors.should_offload(len(image_bytes)):
+            return await self.executors.run_thread(_sha256_hex, image_bytes)
+        return _sha256_hex(image_bytes)
+
+    async def cached_result(
+        self,
+        mime_type: str,
+        image_digest: str,
+        model_name: Optional[str] = None,
+    ) -> Optional[dict]:
+        """Return a cached analysis for this image without calling the model."""
+        cache_key = self._analysis_cache_key(model_name or self.model_name, mime_type, image_digest)
+        return _load_cached_result(await self.cache.get("analysis", cache_key))
+
+    def _analysis_cache_key(self, model: str, mime_type: str, image_digest: str, cascade: bool = True) -> str:
+        # Everything that shapes the answer is part of the key, so instances running
+        # different output modes or cascade models never serve each other's results.
+        cascade = cascade and self.cascade is not None and model == self.model_name
+        cascade_model = self.cascade.fast_model if cascade else ""
+        return cache_fingerprint(
+            model,
+            ANALYSIS_PROMPT_DIGEST,
+            "schema" if self.settings.analysis_structured_output else "text",
+            cascade_model,
+            mime_type,
+            image_digest,
+        )
+
+    async def _analyze_cascade(self, image_bytes: bytes, mime_type: str, model: str, key_id: str) -> dict:
+        """Answer from the fast tier when it is confident, otherwise escalate to ``model``."""
+        fast_result = await self._analyze_uncached(
+            image_bytes,
+            mime_type,
+            self.cascade.fast_model,
+            key_id,
+            prompt=ANALYSIS_CASCADE_PROMPT,
+            max_output_tokens=self.cascade.fast_max_tokens,
+            schema=FOOD_CASCADE_SCHEMA,
+            # A failed fast answer escalates anyway; retrying it would only add latency.
+            retry=False,
+        )
+        confidence = fast_result.pop("confidence", None)
+        failed = fast_result["category"] in UNCACHEABLE_CATEGORIES
+        reason = self.cascade.escalation_reason(fast_result, confidence, failed)
+        if reason is None:
+            return fast_result
+
+        logger.debug(
+            "Analysis cascade escalating to %s (reason=%s, fast category=%s score=%.2f confidence=%s)",
+            model,
+            reason,
+            fast_result["category"],
+            fast_result["score"],
+            confidence,
+        )
+        return await self._analyze_uncached(image_bytes, mime_type, model, key_id)
+
+    async def _analyze_uncached(
+        self,
+        image_bytes: bytes,
+        mime_type: str,
+        model: str,
+        key_id: str,
+        prompt: str = ANALYSIS_PROMPT,
+        max_output_tokens: Optional[int] = None,
+        schema: types.Schema = FOOD_ANALYSIS_SCHEMA,
+        retry: bool = True,
+    ) -> dict:
+        structured = self.settings.analysis_structured_output
+        if max_output_tokens is None:
+            max_output_tokens = self.settings.analysis_max_output_tokens if structured else 1024
         try:
             image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=[ANALYSIS_PROMPT, image_part],
-                config=types.GenerateContentConfig(
-                    temperature=0.1,
-                    max_output_tokens=1024,
-                ),
+        except Exception as exc:
+            logger.exception("Food analysis failed")
+            return _error_result(f"Analysis failed: {exc}")
+
+        plan = await self.retries.plan("analyze", model, ANALYSIS_TEMPERATURE, max_retries=None if retry else 0)
+        for attempt_index, attempt in enumerate(plan.attempts, start=1):
+            try:
+                result = await self._analyze_attempt(
+                    image_part,
+                    prompt,
+                    attempt["model"],
+                    attempt["temperature"],
+                    max_output_tokens,
+                    structured,
+                    schema,
+                    key_id,
+                )
+            except Exception as exc:
+                logger.exception(
+                    "Food analysis attempt %s/%s failed (model=%s)", attempt_index, len(plan.attempts), attempt["model"]
+                )
+                result = _error_result(f"Analysis failed: {exc}")
+                if await plan.before_retry(attempt_index, exc):
+                    continue
+                return result
+
+            # The model that answered, which a retry rung or the cascade may have changed.
+            result["model"] = attempt["model"]
+            # An empty or unparseable answer gets the next rung too, without backoff.
+            if result["category"] not in UNCACHEABLE_CATEGORIES or not await plan.before_retry(attempt_index):
+                return result
+            logger.warning("Food analysis attempt %s returned %s; retrying", attempt_index, result["category"])
+        return result
+
+    async def _analyze_attempt(
+        self,
+        image_part: types.Part,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_output_tokens: int,
+        structured: bool,
+        schema: types.Schema,
+        key_id: str,
+    ) -> dict:
+        try:
+            response = await self._generate(
+                call_site="analyze",
+                model=model,
+                contents=[prompt, image_part],
+                config=self._build_analysis_generate_config(model, max_output_tokens, structured, schema, temperature),
+                key_id=key_id,
+            )
+        except TypeError as exc:
+            if not (structured and _is_schema_parse_none_text_error(exc)):
+                raise
+            logger.warning("Food analysis hit SDK schema parse bug (model=%s); retrying without schema.", model)
+            structured = False
+            response = await self._generate(
+                call_site="analyze",
+                model=model,
+                contents=[prompt, image_part],
+                config=self._build_analysis_generate_config(model, max_output_tokens, True, None, temperature),
+                key_id=key_id,
             )
 
+        # With a response schema the SDK has already decoded the JSON.
+        parsed = getattr(response, "parsed", None) if structured else None
+        if isinstance(parsed, dict):
+            with phase("normalize"):
+                return self._normalize_analysis(parsed)
+
+        with phase("extract"):
             response_text = self._extract_response_text(response)
-            if not response_text:
-                return _error_result("Empty response from Gemini API")
+        if not response_text:
+            return _error_result("Empty response from Gemini API")
 
+        with phase("normalize"):
             return self._parse_response(response_text)
-        except Exception as exc:
-            logger.exception("Food analysis failed")
-            return _error_result(f"Analysis failed: {exc}")
+
+    def _build_analysis_generate_config(
+        self,
+        model: str,
+        max_output_tokens: int,
+        structured: bool,
+        schema: Optional[types.Schema],
+        temperature: float = ANALYSIS_TEMPERATURE,
+    ) -> types.GenerateContentConfig:
+        if not structured:
+            return types.GenerateContentConfig(temperature=temperature, max_output_tokens=max_output_tokens)
+
+        generate_config_fields = getattr(types.GenerateContentConfig, "model_fields", {}) or {}
+        config_kwargs: dict[str, Any] = {
+            "temperature": temperature,
+            "response_mime_type": "application/json",
+        }
+        # A score and a sentence need no thinking; it would only eat the small output budget.
+        thinking_config = _build_compat_thinking_config()
+        if thinking_config is not None and "thinking_config" in generate_config_fields:
+            config_kwargs["thinking_config"] = thinking_config
+        if getattr(thinking_config, "thinking_budget", None) == 0 and not model.strip().lower().startswith("gemini-3"):
+            config_kwargs["max_output_tokens"] = max(32, int(max_output_tokens))
+        else:
+            # Thinking could not be switched off, so leave room for it before the JSON.
+            config_kwargs["max_output_tokens"] = _effective_max_tokens_for_model(model, max_output_tokens)
+        if schema is not None:
+            config_kwargs["response_schema"] = schema
+        return types.GenerateContentConfig(**config_kwargs)
 
     def _extract_response_text(self, response) -> Optional[str]:
         if response is None:
@@ -183,7 +463,11 @@ class FoodAnalyzer:
         except json.JSONDecodeError:
             logger.warning("Invalid JSON payload from LLM: %s", response_text[:240])
             return _error_result("Could not parse LLM response", category="parse_error")
+        if not isinstance(parsed, dict):
+            return _error_result("Could not parse LLM response", category="parse_error")
+        return self._normalize_analysis(parsed)
 
+    def _normalize_analysis(self, parsed: dict) -> dict:
         try:
             score = float(parsed.get("score", 0.5))
         except (TypeError, ValueError):
@@ -191,13 +475,23 @@ class FoodAnalyzer:
 
         score = max(0.0, min(1.0, score))
         category = str(parsed.get("category", "unknown"))
-        reasoning = str(parsed.get("reasoning", ""))
+        reasoning = str(parsed.get("reasoning", "")).strip()
+        max_chars = self.settings.analysis_reasoning_max_chars
+        if max_chars > 0 and len(reasoning) > max_chars:
+            reasoning = reasoning[: max_chars - 1].rstrip() + "\u2026"
 
-        return {
+        result = {
             "score": score,
             "category": category,
             "reasoning": reasoning,
         }
+        # Only the cascade prompt asks for a confidence; the cascade pops it off again.
+        if "confidence" in parsed:
+            try:
+                result["confidence"] = max(0.0, min(1.0, float(parsed["confidence"])))
+            except (TypeError, ValueError):
+                pass
+        return result
 
     async def strategize_swarm(
         self,
@@ -206,58 +500,45 @@ class FoodAnalyzer:
         model_name: Optional[str] = None,
         max_tokens: int = 16000,
         temperature: float = 0.7,
+        retries: Optional[int] = None,
+        key_id: str = INTERNAL_KEY_ID,
+        use_schema: bool = True,
     ) -> dict:
         selected_model = model_name or self.settings.swarm_model or self.model_name
-        retry_model = self.settings.swarm_retry_model or NON_THINKING_RESCUE_MODEL
-        retry_count = max(0, min(1, int(self.settings.swarm_retry_count)))
         base_temperature = max(0.0, min(2.0, float(temperature)))
 
-        user_prompt = (
-            "Battlefield snapshot (JSON):\n"
-            f"{snapshot_json}\n\n"
-            "Return exactly one minified JSON directive object.\n"
-            "Output must start with '{' and end with '}'.\n"
-            "Do not use markdown/code fences or preamble text.\n"
-            "Keep reasoning concise (<= 140 chars)."
-        )
-
-        attempts: list[dict[str, Any]] = [
-            {
-                "name": "primary",
-                "model": selected_model,
-                "temperature": base_temperature,
-            }
-        ]
-
-        if retry_count > 0:
-            attempts.append(
-                {
-                    "name": "retry",
-                    "model": retry_model,
-                    "temperature": 0.0,
-                }
-            )
+        user_prompt = _swarm_user_prompt(snapshot_json)
+        plan = await self.retries.plan("swarm", selected_model, base_temperature, max_retries=retries)
+        attempts = plan.attempts
 
         last_outcome: Optional[dict[str, Any]] = None
         last_exception: Optional[Exception] = None
+        # Reported to callers (benchmarks, shadow mode) alongside the directive.
+        attempt_stats = {"attempt_count": 0, "max_tokens_hits": 0, "rescued": False, "rejected_directives": 0}
+        validator = get_directive_validator()
+        limits = validator.limits_for(snapshot_json) if validator is not None else None
 
         for attempt_index, attempt in enumerate(attempts, start=1):
             attempt_model = str(attempt["model"]).strip() or selected_model
             attempt_temperature = max(0.0, min(2.0, float(attempt["temperature"])))
             response = None
-            schema_mode = "schema"
+            schema_mode = "schema" if use_schema else "json_mime_no_schema"
+            attempt_stats["attempt_count"] = attempt_index
             schema_max_tokens = _effective_max_tokens_for_model(attempt_model, max_tokens)
+            attempt_prompt = user_prompt + attempt.get("prompt_note", "")
 
             try:
-                response = self.client.models.generate_content(
+                response = await self._generate(
+                    call_site="swarm",
                     model=attempt_model,
-                    contents=[user_prompt],
+                    contents=[attempt_prompt],
                     config=self._build_swarm_generate_config(
                         system_prompt=system_prompt,
                         temperature=attempt_temperature,
                         max_tokens=schema_max_tokens,
-                        use_schema=True,
+                        use_schema=use_schema,
                     ),
+                    key_id=key_id,
                 )
                 print("--------------------------------")
                 print("response")
@@ -279,15 +560,17 @@ class FoodAnalyzer:
                         attempt_temperature,
                     )
                     try:
-                        response = self.client.models.generate_content(
+                        response = await self._generate(
+                            call_site="swarm",
                             model=attempt_model,
-                            contents=[user_prompt],
+                            contents=[attempt_prompt],
                             config=self._build_swarm_generate_config(
                                 system_prompt=system_prompt,
                                 temperature=attempt_temperature,
                                 max_tokens=_effective_max_tokens_for_model(attempt_model, max_tokens),
                                 use_schema=False,
                             ),
+                            key_id=key_id,
                         )
                         schema_mode = "json_mime_no_schema"
                     except Exception as no_schema_exc:
@@ -299,6 +582,8 @@ class FoodAnalyzer:
                             attempt_model,
                             attempt_temperature,
                         )
+                        if not await plan.before_retry(attempt_index, no_schema_exc):
+                            break
                         continue
                 else:
                     last_exception = exc
@@ -309,10 +594,14 @@ class FoodAnalyzer:
                         attempt_model,
                         attempt_temperature,
                     )
+                    # The policy stops on quota and fatal errors and backs off on transient ones.
+                    if not await plan.before_retry(attempt_index, exc):
+                        break
                     continue
 
-            candidates = self._extract_response_candidates(response)
-            diagnostics = _extract_response_diagnostics(response)
+            with phase("extract", attempt["name"]):
+                candidates = self._extract_response_candidates(response)
+                diagnostics = _extract_response_diagnostics(response)
 
             # --- diagnostic: log every candidate source (helpful when no_json_object) ---
             if logger.isEnabledFor(logging.DEBUG):
@@ -323,8 +612,17 @@ class FoodAnalyzer:
                         c.get("text", ""),
                     )
 
-            outcome = _select_candidate_outcome(candidates)
+            with phase("normalize", attempt["name"]):
+                if self.executors.should_offload(_candidate_payload_size(candidates)):
+                    outcome = await self.executors.run_cpu(_select_candidate_outcome, candidates, limits)
+                else:
+                    outcome = _select_candidate_outcome(candidates, limits)
             last_outcome = outcome
+            if validator is not None:
+                validator.record(outcome)
+            attempt_stats["rejected_directives"] += len(outcome["rejections"])
+            if "MAX_TOKENS" in diagnostics.get("finish_reasons", "").upper():
+                attempt_stats["max_tokens_hits"] += 1
 
             logger.info(
                 "Swarm strategize attempt %s/%s name=%s model=%s temp=%.2f candidate_count=%s "
@@ -362,34 +660,41 @@ class FoodAnalyzer:
             if outcome["model_valid"]:
                 return {
                     "raw_text": outcome["normalized_json"],
+                    "directive": outcome["directive"],
+                    "normalize_status": outcome["status"],
                     "model": attempt_model,
                     "provider": "vertex_gemini",
+                    **attempt_stats,
                 }
 
-            if attempt_index < len(attempts):
-                next_attempt = attempts[attempt_index]
-                if _should_force_non_thinking_rescue(outcome, diagnostics):
-                    if _is_likely_thinking_model(str(next_attempt.get("model", ""))):
-                        next_attempt["model"] = NON_THINKING_RESCUE_MODEL
-                        next_attempt["temperature"] = 0.0
-                        logger.warning(
-                            "Swarm strategize forcing non-thinking rescue model=%s due to MAX_TOKENS/no_json on prior attempt.",
-                            NON_THINKING_RESCUE_MODEL,
-                        )
+            if not await plan.before_retry(attempt_index):
+                break
+            next_attempt = attempts[attempt_index]
+            if outcome["rejections"]:
+                next_attempt["prompt_note"] = _swarm_rejection_note(outcome["rejections"])
+            if _should_force_non_thinking_rescue(outcome, diagnostics):
+                if _is_likely_thinking_model(str(next_attempt.get("model", ""))):
+                    next_attempt["model"] = NON_THINKING_RESCUE_MODEL
+                    next_attempt["temperature"] = 0.0
+                    attempt_stats["rescued"] = True
+                    logger.warning(
+                        "Swarm strategize forcing non-thinking rescue model=%s due to MAX_TOKENS/no_json on prior attempt.",
+                        NON_THINKING_RESCUE_MODEL,
+                    )
 
-                logger.warning(
-                    "Swarm strategize attempt %s produced non-valid directive (status=%s, prompt_block=%s, finish_reasons=%s). "
-                    "Retrying with model=%s temp=%.2f. Raw prefix=%r",
-                    attempt_index,
-                    outcome["status"],
-                    diagnostics.get("prompt_block_reason", ""),
-                    diagnostics.get("finish_reasons", ""),
-                    next_attempt["model"],
-                    float(next_attempt["temperature"]),
-                    (outcome["raw"] or "")[:200],
-                )
+            logger.warning(
+                "Swarm strategize attempt %s produced non-valid directive (status=%s, prompt_block=%s, finish_reasons=%s). "
+                "Retrying with model=%s temp=%.2f. Raw prefix=%r",
+                attempt_index,
+                outcome["status"],
+                diagnostics.get("prompt_block_reason", ""),
+                diagnostics.get("finish_reasons", ""),
+                next_attempt["model"],
+                float(next_attempt["temperature"]),
+                (outcome["raw"] or "")[:200],
+            )
 
-        hold_json = _to_json(_build_hold_directive(DEFAULT_HOLD_REASONING))
+        hold_json = HOLD_DIRECTIVE.to_json()
         if last_outcome is None and last_exception is not None:
             logger.error(
                 "Swarm strategize all attempts failed with exceptions. Emitting canonical hold. "
@@ -407,16 +712,166 @@ class FoodAnalyzer:
 
         return {
             "raw_text": hold_json,
+            "directive": HOLD_DIRECTIVE,
+            "normalize_status": FORCED_HOLD_STATUS,
             "model": str(attempts[-1]["model"]).strip() or selected_model,
             "provider": "vertex_gemini",
+            **attempt_stats,
         }
 
+    async def measure_swarm_ttft(
+        self,
+        model: str,
+        system_prompt: str,
+        snapshot_json: str,
+        temperature: float,
+        max_tokens: int,
+        use_schema: bool = True,
+    ) -> float:
+        """Seconds until the first streamed chunk of a swarm call; a live-only benchmark probe."""
+        config = self._build_swarm_generate_config(
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=_effective_max_tokens_for_model(model, max_tokens),
+            use_schema=use_schema,
+        )
+        started_at = time.perf_counter()
+        first_chunk_s = 0.0
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model,
+            contents=[_swarm_user_prompt(snapshot_json)],
+            config=config,
+        )
+        async for _chunk in stream:
+            if not first_chunk_s:
+                first_chunk_s = time.perf_counter() - started_at
+        return first_chunk_s
+
+    async def strategize_swarm_batch(
+        self,
+        system_prompt: str,
+        snapshots: list[tuple[str, str]],
+        model_name: str,
+        max_tokens: int,
+        temperature: float,
+        key_id: str = INTERNAL_KEY_ID,
+    ) -> dict[str, str]:
+        """One call for several (request_id, snapshot_json) pairs; returns raw directive JSON per request id.
+
+        Ids the model left out or answered with something other than an object are
+        missing from the result, so the caller can fall back to a single call for them.
+        """
+        response = await self._generate(
+            call_site="swarm_batch",
+            model=model_name,
+            contents=[_swarm_batch_user_prompt(snapshots)],
+            config=self._build_swarm_generate_config(
+                system_prompt=system_prompt,
+                temperature=temperature,
+                # Each directive gets the single-request budget; the thinking floor applies once.
+                max_tokens=_effective_max_tokens_for_model(model_name, max_tokens * len(snapshots)),
+                use_schema=True,
+                response_schema=SWARM_BATCH_SCHEMA,
+            ),
+            key_id=key_id,
+        )
+
+        items = getattr(response, "parsed", None)
+        if not isinstance(items, list):
+            items = _parse_swarm_batch(getattr(response, "text", None) or "")
+
+        wanted = {request_id for request_id, _snapshot in snapshots}
+        directives: dict[str, str] = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get("directive"), dict):
+                continue
+            request_id = safe_str(item.get("request_id"))
+            if request_id in wanted and request_id not in directives:
+                directives[request_id] = json.dumps(item["directive"], separators=(",", ":"))
+        return directives
+
+    def swarm_batch_result(self, raw_text: str, snapshot_json: str, model_name: str) -> Optional[dict]:
+        """Normalize and validate one batch item like a single call would; None if it is not usable."""
+        validator = get_directive_validator()
+        limits = validator.limits_for(snapshot_json) if validator is not None else None
+        outcome = _select_candidate_outcome([{"source": "batch", "text": raw_text}], limits)
+        if validator is not None:
+            validator.record(outcome)
+        if not outcome["model_valid"]:
+            logger.info("Swarm batch item not usable (status=%s); falling back to a single call", outcome["status"])
+            return None
+        return {
+            "raw_text": outcome["normalized_json"],
+            "directive": outcome["directive"],
+            "normalize_status": outcome["status"],
+            "model": model_name,
+            "provider": "vertex_gemini",
+            "attempt_count": 1,
+            "max_tokens_hits": 0,
+            "rescued": False,
+            "rejected_directives": len(outcome["rejections"]),
+        }
+
+    async def _generate(
+        self,
+        call_site: str,
+        model: str,
+        contents: list,
+        config: types.GenerateContentConfig,
+        key_id: str = INTERNAL_KEY_ID,
+    ):
+        """Single choke point for Vertex calls: shared breaker, budget, AIMD limiter, then the transport."""
+        breaker = self._breaker_for(model)
+        if not breaker.allow():
+            raise UpstreamUnavailableError(f"Circuit breaker open for model {model}")
+
+        budget = int(self.settings.upstream_budget_per_minute)
+        if budget > 0:
+            used = await self.shared_state.incr_async("budget", window_key("upstream_calls", 60), ttl_seconds=120)
+            if used > budget:
+                raise UpstreamUnavailableError(f"Upstream call budget exhausted ({budget}/min)")
+
+        async with self.limiter.slot(call_site) as ticket:
+            record("upstream_queue", ticket.queue_wait_s, call_site)
+            try:
+                with phase("upstream", f"{call_site} {model}"):
+                    response = await self.transport.generate_content(model=model, contents=contents, config=config)
+            except Exception as exc:
+                if is_quota_error(exc):
+                    # Quota pressure is the limiter's job; it is not a sign the model is down.
+                    ticket.mark_overloaded()
+                elif not (isinstance(exc, ReplayMissError) or _is_schema_parse_none_text_error(exc)):
+                    # A missing recording or the SDK schema-parse bug is a client-side
+                    # condition, not an upstream failure.
+                    await breaker.record_failure()
+                raise
+
+        await breaker.record_success()
+        usage = TokenUsage.from_response(response)
+        tally_usage(usage)
+        if self.usage_ledger is not None:
+            await self.usage_ledger.record(key_id, call_site, model, usage)
+        return response
+
+    def _breaker_for(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                self.shared_state,
+                name=f"vertex:{model}",
+                failure_threshold=self.settings.circuit_breaker_failure_threshold,
+                reset_seconds=self.settings.circuit_breaker_reset_seconds,
+            )
+            self._breakers[model] = breaker
+        return breaker
+
     def _build_swarm_generate_config(
         self,
         system_prompt: str,
         temperature: float,
         max_tokens: int,
         use_schema: bool,
+        response_schema: types.Schema = SWARM_DIRECTIVE_SCHEMA,
     ) -> types.GenerateContentConfig:
         generate_config_fields = getattr(types.GenerateContentConfig, "model_fields", {}) or {}
         config_kwargs: dict[str, Any] = {
@@ -436,7 +891,7 @@ class FoodAnalyzer:
             config_kwargs["safety_settings"] = safety_settings
 
         if use_schema:
-            config_kwargs["response_schema"] = SWARM_DIRECTIVE_SCHEMA
+            config_kwargs["response_schema"] = response_schema
         return types.GenerateContentConfig(**config_kwargs)
 
     def _extract_response_candidates(self, response) -> list[dict[str, str]]:
@@ -549,6 +1004,48 @@ class FoodAnalyzer:
         return candidates
 
 
+def _swarm_user_prompt(snapshot_json: str) -> str:
+    return (
+        "Battlefield snapshot (JSON):\n"
+        f"{snapshot_json}\n\n"
+        "Return exactly one minified JSON directive object.\n"
+        "Output must start with '{' and end with '}'.\n"
+        "Do not use markdown/code fences or preamble text.\n"
+        "Keep reasoning concise (<= 140 chars)."
+    )
+
+
+def _swarm_rejection_note(rejections: list[str]) -> str:
+    return (
+        "\n\nYour previous directive could not be executed against this snapshot "
+        f"({', '.join(sorted(set(rejections)))}). Only use zone ids from the snapshot, stay within "
+        "the available squads, drones and source-zone defenders, and hold if nothing is feasible."
+    )
+
+
+def _swarm_batch_user_prompt(snapshots: list[tuple[str, str]]) -> str:
+    lines = [f"Battlefield snapshots (JSON), one per request; decide each independently ({len(snapshots)} total):"]
+    lines.extend(f"request_id={request_id}\n{snapshot_json}" for request_id, snapshot_json in snapshots)
+    lines.append(
+        "\nReturn one minified JSON array with exactly one element per request, in the same order:\n"
+        '[{"request_id":"<id>","directive":{<directive object>}}]\n'
+        "Do not use markdown/code fences or preamble text.\n"
+        "Keep each reasoning concise (<= 140 chars)."
+    )
+    return "\n\n".join(lines)
+
+
+def _parse_swarm_batch(raw_text: str) -> list:
+    start, end = raw_text.find("["), raw_text.rfind("]")
+    if start < 0 or end <= start:
+        return []
+    try:
+        items = json.loads(raw_text[start : end + 1])
+    except json.JSONDecodeError:
+        return []
+    return items if isinstance(items, list) else []
+
+
 def _extract_json_payload(raw_text: str) -> Optional[str]:
     if not raw_text:
         return None
@@ -706,33 +1203,6 @@ def _extract_response_diagnostics(response) -> dict[str, str]:
     return diagnostics
 
 
-def _is_actionable_directive(directive: dict) -> bool:
-    order = _safe_str(directive.get("order")).lower()
-    if order == "hold":
-        return True
-
-    if order in {"reinforce", "recapture"}:
-        return bool(_safe_str(directive.get("target_zone"))) and _to_non_negative_int(directive.get("squad_size")) > 0
-
-    if order == "redistribute":
-        from_zone = _safe_str(directive.get("from_zone"))
-        to_zone = _safe_str(directive.get("to_zone"))
-        return bool(from_zone) and bool(to_zone) and from_zone != to_zone and _to_non_negative_int(directive.get("count")) > 0
-
-    if order == "feint":
-        decoy_zone = _safe_str(directive.get("decoy_zone"))
-        real_target = _safe_str(directive.get("real_target_zone"))
-        return (
-            bool(decoy_zone)
-            and bool(real_target)
-            and decoy_zone != real_target
-            and _to_non_negative_int(directive.get("decoy_size")) > 0
-            and _to_non_negative_int(directive.get("real_size")) > 0
-        )
-
-    return False
-
-
 def _append_candidate(
     candidates: list[dict[str, str]],
     seen_texts: set[str],
@@ -753,22 +1223,54 @@ def _append_candidate(
     candidates.append({"source": source, "text": trimmed})
 
 
-def _select_candidate_outcome(candidates: list[dict[str, str]]) -> dict[str, Any]:
+def _candidate_payload_size(candidates: list[dict[str, str]]) -> int:
+    return sum(len(candidate.get("text", "")) for candidate in candidates)
+
+
+def _select_candidate_outcome(
+    candidates: list[dict[str, str]],
+    limits: Optional[SnapshotLimits] = None,
+) -> dict[str, Any]:
     best_recoverable: Optional[dict[str, Any]] = None
     first_invalid: Optional[dict[str, Any]] = None
+    first_infeasible: Optional[dict[str, Any]] = None
+    rejections: list[str] = []
+    # The same answer often shows up in several sources (text, parsed, parts); count it once.
+    rejected_directives: set[str] = set()
 
     for candidate in candidates:
         raw_text = candidate.get("text", "")
-        normalized_json, is_model_valid, normalize_status = _normalize_swarm_directive(raw_text)
+        directive, is_model_valid, normalize_status = _normalize_swarm_directive(raw_text)
         outcome = {
             "source": candidate.get("source", "unknown"),
             "raw": raw_text,
             "status": normalize_status,
             "model_valid": is_model_valid,
-            "normalized_json": normalized_json,
+            "directive": directive,
+            "normalized_json": directive.to_json(),
+            "rejections": rejections,
         }
 
-        if is_model_valid:
+        if is_model_valid and limits is not None:
+            # Well-formed is not enough: the game must be able to execute it against this snapshot.
+            check = check_directive(directive, limits)
+            if not check.feasible:
+                if outcome["normalized_json"] not in rejected_directives:
+                    rejected_directives.add(outcome["normalized_json"])
+                    rejections.append(check.rejection)
+                outcome.update(status=f"infeasible_{check.rejection}", model_valid=False)
+                if first_infeasible is None:
+                    first_infeasible = outcome
+                continue
+            outcome["repairs"] = check.repairs
+            if check.repairs:
+                outcome.update(
+                    status="repaired",
+                    directive=check.directive,
+                    normalized_json=check.directive.to_json(),
+                )
+
+        if outcome["model_valid"]:
             return outcome
 
         if normalize_status in {"loose_tokens", "json_decode_loose_tokens"} and best_recoverable is None:
@@ -777,47 +1279,45 @@ def _select_candidate_outcome(candidates: list[dict[str, str]]) -> dict[str, Any
         if first_invalid is None:
             first_invalid = outcome
 
-    if best_recoverable is not None:
-        return best_recoverable
-
-    if first_invalid is not None:
-        return first_invalid
+    for fallback in (first_infeasible, best_recoverable, first_invalid):
+        if fallback is not None:
+            return fallback
 
     return {
         "source": "<none>",
         "raw": "",
         "status": "no_candidates",
         "model_valid": False,
-        "normalized_json": _to_json(_build_hold_directive(DEFAULT_HOLD_REASONING)),
+        "directive": HOLD_DIRECTIVE,
+        "normalized_json": HOLD_DIRECTIVE.to_json(),
+        "rejections": rejections,
     }
 
 
-def _normalize_swarm_directive(raw_text: str) -> tuple[str, bool, str]:
+def _normalize_swarm_directive(raw_text: str) -> tuple[SwarmDirective, bool, str]:
     payload = _extract_json_payload(raw_text)
     if payload is None:
         loose = _extract_from_loose_text(raw_text)
         if loose is not None:
-            is_actionable = _is_actionable_directive(loose)
-            return _to_json(loose), is_actionable, "loose_tokens"
-        return _to_json(_build_hold_directive(DEFAULT_HOLD_REASONING)), False, "no_json_object"
+            return loose, loose.is_actionable, "loose_tokens"
+        return HOLD_DIRECTIVE, False, "no_json_object"
 
     try:
         parsed = json.loads(payload)
     except json.JSONDecodeError:
         loose = _extract_from_loose_text(raw_text)
         if loose is not None:
-            is_actionable = _is_actionable_directive(loose)
-            return _to_json(loose), is_actionable, "json_decode_loose_tokens"
-        return _to_json(_build_hold_directive(DEFAULT_HOLD_REASONING)), False, "json_decode_failed"
+            return loose, loose.is_actionable, "json_decode_loose_tokens"
+        return HOLD_DIRECTIVE, False, "json_decode_failed"
 
     directive = _coerce_directive(parsed)
     if directive is None:
-        return _to_json(_build_hold_directive(DEFAULT_HOLD_REASONING)), False, "directive_shape_invalid"
+        return HOLD_DIRECTIVE, False, "directive_shape_invalid"
 
-    return _to_json(directive), True, "model_valid"
+    return directive, True, "model_valid"
 
 
-def _coerce_directive(parsed: object) -> Optional[dict]:
+def _coerce_directive(parsed: object) -> Optional[SwarmDirective]:
     if not isinstance(parsed, dict):
         return None
 
@@ -839,7 +1339,7 @@ def _coerce_directive(parsed: object) -> Optional[dict]:
     if not any(key in parsed for key in known_keys):
         return None
 
-    envelope_reasoning = _safe_str(parsed.get("reasoning", ""))
+    envelope_reasoning = safe_str(parsed.get("reasoning", ""))
     source = parsed
 
     nested = parsed.get("directive")
@@ -852,122 +1352,81 @@ def _coerce_directive(parsed: object) -> Optional[dict]:
         source["order"] = nested
         order_token_source = source.get("order")
 
-    order = _normalize_order(order_token_source)
-    if order == "invalid":
+    order = DirectiveOrder.parse(order_token_source)
+    if order is None:
         return None
 
-    result = _build_hold_directive("")
-    result["order"] = order
-    result["priority"] = _safe_str(source.get("priority"))
-    result["target_zone"] = _normalize_zone(source.get("target_zone"))
-    result["from_zone"] = _normalize_zone(source.get("from_zone"))
-    result["to_zone"] = _normalize_zone(source.get("to_zone"))
-    result["decoy_zone"] = _normalize_zone(source.get("decoy_zone"))
-    result["real_target_zone"] = _normalize_zone(source.get("real_target_zone"))
-    result["squad_size"] = _to_non_negative_int(source.get("squad_size"))
-    result["count"] = _to_non_negative_int(source.get("count"))
-    result["decoy_size"] = _to_non_negative_int(source.get("decoy_size"))
-    result["real_size"] = _to_non_negative_int(source.get("real_size"))
-
-    reasoning = _safe_str(source.get("reasoning"))
-    if not reasoning and envelope_reasoning:
-        reasoning = envelope_reasoning
-    result["reasoning"] = reasoning or DEFAULT_HOLD_REASONING
-
-    return result
-
-
-def _extract_from_loose_text(raw_text: str) -> Optional[dict]:
-    order_match = re.search(r'"(?:order|directive)"\s*:\s*"?([A-Za-z_]+)"?', raw_text, flags=re.IGNORECASE)
+    fields = dict(source)
+    if not safe_str(fields.get("reasoning")) and envelope_reasoning:
+        fields["reasoning"] = envelope_reasoning
+    fields.pop("order", None)
+    return SwarmDirective.from_fields(order, **fields)
+
+
+LOOSE_ZONE_PATTERNS = {
+    "target_zone": re.compile(r'"(?:target_zone|targetZone|target)"\s*:\s*"?([A-Za-z_]+)"?', re.IGNORECASE),
+    "from_zone": re.compile(r'"(?:from_zone|fromZone|from)"\s*:\s*"?([A-Za-z_]+)"?', re.IGNORECASE),
+    "to_zone": re.compile(r'"(?:to_zone|toZone|to)"\s*:\s*"?([A-Za-z_]+)"?', re.IGNORECASE),
+    "decoy_zone": re.compile(r'"(?:decoy_zone|decoyZone)"\s*:\s*"?([A-Za-z_]+)"?', re.IGNORECASE),
+    "real_target_zone": re.compile(r'"(?:real_target_zone|realTargetZone)"\s*:\s*"?([A-Za-z_]+)"?', re.IGNORECASE),
+}
+LOOSE_INT_PATTERNS = {
+    "squad_size": re.compile(r'"(?:squad_size|squadSize)"\s*:\s*(\d+)', re.IGNORECASE),
+    "count": re.compile(r'"count"\s*:\s*(\d+)', re.IGNORECASE),
+    "decoy_size": re.compile(r'"(?:decoy_size|decoySize)"\s*:\s*(\d+)', re.IGNORECASE),
+    "real_size": re.compile(r'"(?:real_size|realSize)"\s*:\s*(\d+)', re.IGNORECASE),
+}
+LOOSE_ORDER_PATTERN = re.compile(r'"(?:order|directive)"\s*:\s*"?([A-Za-z_]+)"?', re.IGNORECASE)
+LOOSE_REASONING_PATTERN = re.compile(r'"reasoning"\s*:\s*"([^"]*)"', re.IGNORECASE)
+
+
+def _extract_from_loose_text(raw_text: str) -> Optional[SwarmDirective]:
+    order_match = LOOSE_ORDER_PATTERN.search(raw_text)
     if not order_match:
         return None
 
-    result = _build_hold_directive(DEFAULT_HOLD_REASONING)
-    result["order"] = _normalize_order(order_match.group(1))
-    if result["order"] == "invalid":
-        result["order"] = "hold"
-
-    zone_patterns = {
-        "target_zone": r'"(?:target_zone|targetZone|target)"\s*:\s*"?([A-Za-z_]+)"?',
-        "from_zone": r'"(?:from_zone|fromZone|from)"\s*:\s*"?([A-Za-z_]+)"?',
-        "to_zone": r'"(?:to_zone|toZone|to)"\s*:\s*"?([A-Za-z_]+)"?',
-        "decoy_zone": r'"(?:decoy_zone|decoyZone)"\s*:\s*"?([A-Za-z_]+)"?',
-        "real_target_zone": r'"(?:real_target_zone|realTargetZone)"\s*:\s*"?([A-Za-z_]+)"?',
-    }
-    for key, pattern in zone_patterns.items():
-        match = re.search(pattern, raw_text, flags=re.IGNORECASE)
+    order = DirectiveOrder.parse(order_match.group(1)) or DirectiveOrder.HOLD
+    fields: dict[str, object] = {}
+
+    for key, pattern in LOOSE_ZONE_PATTERNS.items():
+        match = pattern.search(raw_text)
         if match:
-            result[key] = _normalize_zone(match.group(1))
+            fields[key] = match.group(1)
 
-    int_patterns = {
-        "squad_size": r'"(?:squad_size|squadSize)"\s*:\s*(\d+)',
-        "count": r'"count"\s*:\s*(\d+)',
-        "decoy_size": r'"(?:decoy_size|decoySize)"\s*:\s*(\d+)',
-        "real_size": r'"(?:real_size|realSize)"\s*:\s*(\d+)',
-    }
-    for key, pattern in int_patterns.items():
-        match = re.search(pattern, raw_text, flags=re.IGNORECASE)
+    for key, pattern in LOOSE_INT_PATTERNS.items():
+        match = pattern.search(raw_text)
         if match:
-            result[key] = _to_non_negative_int(match.group(1))
+            fields[key] = match.group(1)
 
-    reasoning_match = re.search(r'"reasoning"\s*:\s*"([^"]*)"', raw_text, flags=re.IGNORECASE)
+    reasoning_match = LOOSE_REASONING_PATTERN.search(raw_text)
     if reasoning_match:
-        reasoning = _safe_str(reasoning_match.group(1))
-        if reasoning:
-            result["reasoning"] = reasoning
+        fields["reasoning"] = reasoning_match.group(1)
 
-    return result
+    return SwarmDirective.from_fields(order, **fields)
 
 
-def _build_hold_directive(reasoning: str) -> dict:
-    return {
-        "order": "hold",
-        "target_zone": "",
-        "squad_size": 0,
-        "priority": "",
-        "from_zone": "",
-        "to_zone": "",
-        "count": 0,
-        "decoy_zone": "",
-        "decoy_size": 0,
-        "real_target_zone": "",
-        "real_size": 0,
-        "reasoning": reasoning or DEFAULT_HOLD_REASONING,
-    }
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
 
 
-def _normalize_order(value: object) -> str:
-    token = _safe_str(value).lower()
-    if token in {"reinforce", "redistribute", "recapture", "hold", "feint"}:
-        return token
-    return "invalid"
+def _encode_cacheable_result(result: dict) -> Optional[str]:
+    if result["category"] in UNCACHEABLE_CATEGORIES:
+        return None
+    return json.dumps(result, separators=(",", ":"))
 
 
-def _normalize_zone(value: object) -> str:
-    token = _safe_str(value).lower()
-    mapping = {
-        "zone_alpha": "alpha",
-        "zone_bravo": "bravo",
-        "zone_charlie": "charlie",
-    }
-    return mapping.get(token, token)
-
+def _load_cached_result(raw: Optional[str]) -> Optional[dict]:
+    if not raw:
+        return None
 
-def _to_non_negative_int(value: object) -> int:
     try:
-        return max(0, int(value))
-    except (TypeError, ValueError):
-        return 0
-
-
-def _safe_str(value: object) -> str:
-    if value is None:
-        return ""
-    return str(value).strip()
-
+        cached = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
 
-def _to_json(data: dict) -> str:
-    return json.dumps(data, separators=(",", ":"))
+    if not isinstance(cached, dict) or not {"score", "category", "reasoning"} <= cached.keys():
+        return None
+    return cached
 
 
 def _error_result(reasoning: str, category: str = "error") -> dict:
@@ -0,0 +1,463 @@
+"""
+Durable queue for deferred food analysis.
+Most photo submissions do not need their score within the request, so clients
+can submit a job and poll for it instead of holding a connection open for the
+whole Gemini Vision call. Jobs live in a SQLite file (WAL, shared by all
+workers on an instance).
+
+The queue is local to one instance: a poll routed to another instance does not
+find the job, and the file only survives a restart if it is on a persistent
+disk (on Cloud Run /tmp is in-memory and counts against the instance's memory).
+It is off by default; enable it only for a single instance or with session
+affinity, and keep the queued image bytes capped well below the memory limit.
+
+Each worker process runs a small pool that claims jobs with a lease and only
+starts a job while the upstream limiter has spare capacity, so deferred work
+fills the gaps left by interactive requests instead of competing with them.
+Failed attempts are retried with exponential backoff; after the last attempt a
+job moves to the dead-letter state. A job is identified by (key, player, image
+hash), so re-submitting the same photo returns the existing job. Finished and
+dead jobs are purged after their retention period.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import get_settings
+from .executors import get_executors
+from .upstream_limiter import get_upstream_limiter
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+    " job_id TEXT PRIMARY KEY,"
+    " idempotency_key TEXT NOT NULL UNIQUE,"
+    " key_id TEXT NOT NULL,"
+    " player_id TEXT NOT NULL,"
+    " image_sha256 TEXT NOT NULL,"
+    " mime_type TEXT NOT NULL,"
+    " image BLOB,"
+    " status TEXT NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " next_attempt_at REAL NOT NULL,"
+    " lease_until REAL NOT NULL DEFAULT 0,"
+    " created_at REAL NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " model TEXT NOT NULL DEFAULT '',"
+    " score REAL,"
+    " category TEXT,"
+    " reasoning TEXT,"
+    " error TEXT NOT NULL DEFAULT ''"
+    ")",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_ready ON analysis_jobs (status, next_attempt_at)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_updated ON analysis_jobs (status, updated_at)",
+)
+
+_JOB_COLUMNS = (
+    "job_id",
+    "key_id",
+    "player_id",
+    "image_sha256",
+    "mime_type",
+    "status",
+    "attempts",
+    "created_at",
+    "updated_at",
+    "model",
+    "score",
+    "category",
+    "reasoning",
+    "error",
+)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a submission would exceed the configured queued image bytes."""
+
+
+class JobDeferred(RuntimeError):
+    """Raised by a handler to put a job back without using up an attempt (e.g. over budget)."""
+
+    def __init__(self, reason: str, retry_after_s: float):
+        super().__init__(reason)
+        self.retry_after_s = retry_after_s
+
+
+@dataclass(frozen=True, slots=True)
+class ClaimedJob:
+    job_id: str
+    key_id: str
+    player_id: str
+    image_sha256: str
+    mime_type: str
+    image: bytes
+    attempts: int
+
+
+# Runs one claimed job; returns (score, category, reasoning, model), or raises to fail the attempt.
+JobHandler = Callable[[ClaimedJob], Awaitable[tuple[float, str, str, str]]]
+
+
+class AnalysisJobQueue:
+    """SQLite-backed job queue with a leased, capacity-aware worker pool."""
+
+    def __init__(
+        self,
+        path: str,
+        workers: int,
+        max_attempts: int,
+        retry_base_s: float,
+        lease_s: float,
+        poll_interval_s: float,
+        max_queued_bytes: int,
+        done_retention_s: float,
+        dead_retention_s: float,
+    ):
+        self.path = path
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_s = max(0.1, float(retry_base_s))
+        self.lease_s = max(5.0, float(lease_s))
+        self.poll_interval_s = max(0.05, float(poll_interval_s))
+        self.max_queued_bytes = max(1, int(max_queued_bytes))
+        self.done_retention_s = max(60.0, float(done_retention_s))
+        self.dead_retention_s = max(60.0, float(dead_retention_s))
+        self.limiter = get_upstream_limiter()
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._counters = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "completed": 0,
+            "failed_attempts": 0,
+            "dead_lettered": 0,
+            "purged": 0,
+            "deferred_busy": 0,
+            "deferred_by_handler": 0,
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def start(self, handler: JobHandler) -> None:
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._tasks = [
+                asyncio.create_task(self._worker_loop(handler), name=f"analysis-job-worker-{index}")
+                for index in range(self.workers)
+            ]
+
+    async def stop(self) -> None:
+        """Stop the workers; a job cut off mid-call is picked up again once its lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def submit(
+        self,
+        key_id: str,
+        player_id: str,
+        image_sha256: str,
+        mime_type: str,
+        image_bytes: bytes,
+    ) -> tuple[dict[str, Any], bool]:
+        """Queue an analysis, or return the existing job for the same photo; the flag is True if new."""
+        job, created = await get_executors().run_thread(
+            self._insert_job, key_id, player_id, image_sha256, mime_type, image_bytes
+        )
+        self._counters["submitted" if created else "deduplicated"] += 1
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        return job, created
+
+    async def get(self, job_id: str, key_id: str) -> Optional[dict[str, Any]]:
+        return await get_executors().run_thread(self._query_job, job_id, key_id)
+
+    async def stats(self) -> dict[str, Any]:
+        depth = await get_executors().run_thread(self._query_depth)
+        return {
+            **self._counters,
+            "workers": self.workers,
+            "max_attempts": self.max_attempts,
+            "max_queued_bytes": self.max_queued_bytes,
+            "jobs": depth,
+        }
+
+    async def _worker_loop(self, handler: JobHandler) -> None:
+        executors = get_executors()
+        while True:
+            # Interactive calls come first: only start deferred work when a slot is free.
+            if not self.limiter.has_capacity:
+                self._counters["deferred_busy"] += 1
+                await asyncio.sleep(self.poll_interval_s)
+                continue
+
+            try:
+                job = await executors.run_thread(self._claim_job)
+                if job is None:
+                    if time.time() - self._last_purge >= 60:
+                        self._last_purge = time.time()
+                        await executors.run_thread(self._purge_expired)
+                    await self._idle()
+                    continue
+                if job.attempts > self.max_attempts:
+                    # Its last lease expired, so the worker running it died mid-call.
+                    await executors.run_thread(self._fail_job, job.job_id, "lease expired on last attempt", True, 0.0)
+                    self._counters["dead_lettered"] += 1
+                    continue
+                await self._run(handler, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Analysis job worker error")
+                await asyncio.sleep(self.poll_interval_s)
+
+    async def _idle(self) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_s)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, handler: JobHandler, job: ClaimedJob) -> None:
+        try:
+            score, category, reasoning, model = await handler(job)
+        except asyncio.CancelledError:
+            raise
+        except JobDeferred as exc:
+            await get_executors().run_thread(self._defer_job, job.job_id, str(exc), time.time() + exc.retry_after_s)
+            self._counters["deferred_by_handler"] += 1
+            return
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"[:500]
+            dead = job.attempts >= self.max_attempts
+            # Exponential backoff between attempts: base, 2x base, 4x base, ...
+            retry_at = time.time() + self.retry_base_s * (2 ** (job.attempts - 1))
+            await get_executors().run_thread(self._fail_job, job.job_id, error, dead, retry_at)
+            self._counters["dead_lettered" if dead else "failed_attempts"] += 1
+            logger.warning(
+                "Analysis job %s attempt %s/%s failed (%s)%s",
+                job.job_id,
+                job.attempts,
+                self.max_attempts,
+                error,
+                "; moved to dead letter" if dead else "",
+            )
+            return
+
+        await get_executors().run_thread(self._complete_job, job.job_id, score, category, reasoning, model)
+        self._counters["completed"] += 1
+
+    def _insert_job(
+        self,
+        key_id: str,
+        player_id: str,
+        image_sha256: str,
+        mime_type: str,
+        image_bytes: bytes,
+    ) -> tuple[dict[str, Any], bool]:
+        idempotency_key = f"{key_id}:{player_id}:{image_sha256}"
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM analysis_jobs WHERE idempotency_key = ?",
+                (idempotency_key,),
+            ).fetchone()
+            if row is not None and row[5] != JobStatus.DEAD.value:
+                return dict(zip(_JOB_COLUMNS, row)), False
+
+            # Images are held until their job finishes, so the cap is on bytes, not jobs.
+            queued_bytes = self._queued_bytes(conn)
+            if queued_bytes + len(image_bytes) > self.max_queued_bytes:
+                raise JobQueueFull(f"Analysis job queue is full ({queued_bytes} bytes of images queued)")
+
+            if row is not None:
+                # A dead-lettered photo submitted again gets a fresh set of attempts.
+                conn.execute("DELETE FROM analysis_jobs WHERE idempotency_key = ?", (idempotency_key,))
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO analysis_jobs (job_id, idempotency_key, key_id, player_id, image_sha256, mime_type,"
+                " image, status, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    idempotency_key,
+                    key_id,
+                    player_id,
+                    image_sha256,
+                    mime_type,
+                    image_bytes,
+                    JobStatus.QUEUED.value,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+        job = dict.fromkeys(_JOB_COLUMNS)
+        job.update(
+            job_id=job_id,
+            key_id=key_id,
+            player_id=player_id,
+            image_sha256=image_sha256,
+            mime_type=mime_type,
+            status=JobStatus.QUEUED.value,
+            attempts=0,
+            created_at=now,
+            updated_at=now,
+            model="",
+            error="",
+        )
+        return job, True
+
+    def _claim_job(self) -> Optional[ClaimedJob]:
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # One statement, so two workers can never claim the same job. Running jobs
+            # whose lease ran out belong to a worker that died and are taken over.
+            row = conn.execute(
+                "UPDATE analysis_jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ?"
+                " WHERE job_id = ("
+                "  SELECT job_id FROM analysis_jobs"
+                "  WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?)"
+                "  ORDER BY next_attempt_at LIMIT 1"
+                " ) RETURNING job_id, key_id, player_id, image_sha256, mime_type, image, attempts",
+                (
+                    JobStatus.RUNNING.value,
+                    now + self.lease_s,
+                    now,
+                    JobStatus.QUEUED.value,
+                    now,
+                    JobStatus.RUNNING.value,
+                    now,
+                ),
+            ).fetchone()
+        if row is None:
+            return None
+        return ClaimedJob(*row[:5], image=bytes(row[5] or b""), attempts=row[6])
+
+    def _complete_job(self, job_id: str, score: float, category: str, reasoning: str, model: str) -> None:
+        conn = self._connection()
+        with conn:
+            # The image is only needed until the job is done.
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, image = NULL, score = ?, category = ?, reasoning = ?,"
+                " model = ?, error = '', updated_at = ? WHERE job_id = ?",
+                (JobStatus.DONE.value, score, category, reasoning, model, time.time(), job_id),
+            )
+
+    def _fail_job(self, job_id: str, error: str, dead: bool, retry_at: float) -> None:
+        conn = self._connection()
+        with conn:
+            if dead:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = ?, image = NULL, error = ?, updated_at = ? WHERE job_id = ?",
+                    (JobStatus.DEAD.value, error, time.time(), job_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = ?, error = ?, next_attempt_at = ?, updated_at = ?"
+                    " WHERE job_id = ?",
+                    (JobStatus.QUEUED.value, error, retry_at, time.time(), job_id),
+                )
+
+    def _defer_job(self, job_id: str, reason: str, retry_at: float) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, attempts = attempts - 1, error = ?, next_attempt_at = ?,"
+                " updated_at = ? WHERE job_id = ?",
+                (JobStatus.QUEUED.value, reason, retry_at, time.time(), job_id),
+            )
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM analysis_jobs WHERE (status = ? AND updated_at < ?) OR (status = ? AND updated_at < ?)",
+                (JobStatus.DONE.value, now - self.done_retention_s, JobStatus.DEAD.value, now - self.dead_retention_s),
+            )
+        if cursor.rowcount:
+            self._counters["purged"] += cursor.rowcount
+            logger.info("Purged %s expired analysis jobs", cursor.rowcount)
+
+    def _query_job(self, job_id: str, key_id: str) -> Optional[dict[str, Any]]:
+        row = self._connection().execute(
+            f"SELECT {', '.join(_JOB_COLUMNS)} FROM analysis_jobs WHERE job_id = ? AND key_id = ?",
+            (job_id, key_id),
+        ).fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row is not None else None
+
+    def _query_depth(self) -> dict[str, int]:
+        conn = self._connection()
+        rows = conn.execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status").fetchall()
+        return {status.value: 0 for status in JobStatus} | dict(rows) | {"queued_bytes": self._queued_bytes(conn)}
+
+    @staticmethod
+    def _queued_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(image)), 0) FROM analysis_jobs WHERE status IN (?, ?)",
+            (JobStatus.QUEUED.value, JobStatus.RUNNING.value),
+        ).fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+
+_job_queue: Optional[AnalysisJobQueue] = None
+
+
+def get_job_queue() -> Optional[AnalysisJobQueue]:
+    """Get or create the analysis job queue; None when deferred jobs are disabled."""
+    global _job_queue
+    settings = get_settings()
+    if not settings.analysis_jobs_enabled:
+        return None
+
+    if _job_queue is None:
+        _job_queue = AnalysisJobQueue(
+            path=settings.analysis_jobs_path,
+            workers=settings.analysis_jobs_workers,
+            max_attempts=settings.analysis_jobs_max_attempts,
+            retry_base_s=settings.analysis_jobs_retry_base_seconds,
+            lease_s=settings.analysis_jobs_lease_seconds,
+            poll_interval_s=settings.analysis_jobs_poll_interval_ms / 1000.0,
+            max_queued_bytes=settings.analysis_jobs_max_queued_mb * 1024 * 1024,
+            done_retention_s=settings.analysis_jobs_retention_hours * 3600,
+            dead_retention_s=settings.analysis_jobs_dead_retention_hours * 3600,
+        )
+    return _job_queue
@@ -5,24 +5,87 @@ FastAPI server that analyzes food images using Gemini Vision.
 
 import base64
 import binascii
+import hashlib
+import hmac
+import json
 import logging
+import math
+import os
 import time
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, Optional, TypeVar
 
-from fastapi import Depends, FastAPI, File, Header, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, UploadFile
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, model_validator
 
+from .admission import AdmissionRejected, get_admission_controller
+from .analysis_cascade import get_analysis_cascade
+from .cache import get_cache
 from .config import get_settings
-from .gemini_analyzer import get_analyzer
+from .executors import get_executors, shutdown_executors
+from .directive import HOLD_DIRECTIVE, SwarmDirective
+from .directive_validation import get_directive_validator
+from .gemini_analyzer import UNCACHEABLE_CATEGORIES, get_analyzer
+from .job_queue import ClaimedJob, JobDeferred, JobQueueFull, get_job_queue
+from .profiling import ProfilingConflict, get_profiler
+from .result_store import AnalysisRecord, get_result_store
+from .retry_policy import get_retry_controller
+from .server_timing import ServerTimingMiddleware, phase, record
+from .shadow import get_shadow_evaluator
+from .swarm_batcher import get_swarm_batcher
+from .swarm_router import get_swarm_router
+from .upstream_limiter import get_upstream_limiter
+from .usage_ledger import BudgetDecision, BudgetState, get_usage_ledger, track_usage
+from .wire import (
+    IMAGE_MIME_HEADER,
+    MSGPACK_MEDIA_TYPE,
+    is_msgpack,
+    is_raw_image,
+    media_type,
+    msgpack_response,
+    unpack_msgpack,
+    wants_msgpack,
+)
 
 logger = logging.getLogger(__name__)
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png"}
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Built up front so a malformed retry ladder fails startup, not the first request.
+    get_retry_controller()
+    result_store = get_result_store()
+    usage_ledger = get_usage_ledger()
+    if result_store is not None:
+        result_store.start()
+    if usage_ledger is not None:
+        usage_ledger.start()
+    job_queue = get_job_queue()
+    if job_queue is not None:
+        job_queue.start(_run_analysis_job)
+    yield
+    if job_queue is not None:
+        await job_queue.stop()
+    if result_store is not None:
+        await result_store.stop()
+    if usage_ledger is not None:
+        await usage_ledger.stop()
+    await get_cache().close()
+    shutdown_executors()
+
 
 app = FastAPI(
     title="Sacrifice Food Analysis API",
     description="Analyzes food images and returns a health score for the Axiom game.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -33,11 +96,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if get_settings().server_timing_enabled:
+    app.add_middleware(ServerTimingMiddleware)
+
 
 class AnalyzeRequest(BaseModel):
-    """Request body for image analysis via base64."""
+    """Request body for image analysis: base64 in JSON, or raw ``image`` bytes in MessagePack."""
 
-    image_base64: str
+    image_base64: Optional[str] = None
+    image: Optional[bytes] = None
+    mime_type: str = "image/jpeg"
+
+    @model_validator(mode="after")
+    def _require_image(self) -> "AnalyzeRequest":
+        if not self.image_base64 and not self.image:
+            raise ValueError("Provide image_base64 (JSON) or image (MessagePack bytes)")
+        return self
+
+
+class AnalysisPrecheckRequest(BaseModel):
+    """Hash-first lookup: the photo's SHA-256 (hex) instead of the photo itself."""
+
+    image_sha256: str
     mime_type: str = "image/jpeg"
 
 
@@ -49,6 +129,80 @@ class AnalyzeResponse(BaseModel):
     reasoning: str
 
 
+class AnalysisJobResponse(BaseModel):
+    """State of a deferred analysis job; ``result`` is set once it is done."""
+
+    job_id: str
+    status: str
+    image_sha256: str
+    attempts: int
+    created_at: float
+    updated_at: float
+    result: Optional[AnalyzeResponse] = None
+    error: str = ""
+
+    @classmethod
+    def from_job(cls, job: dict[str, Any]) -> "AnalysisJobResponse":
+        result = None
+        if job["status"] == "done":
+            result = AnalyzeResponse(score=job["score"], category=job["category"], reasoning=job["reasoning"])
+        return cls(
+            job_id=job["job_id"],
+            status=job["status"],
+            image_sha256=job["image_sha256"],
+            attempts=job["attempts"],
+            created_at=job["created_at"],
+            updated_at=job["updated_at"],
+            result=result,
+            error=job["error"] or "",
+        )
+
+
+class AnalysisHistoryItem(BaseModel):
+    """One stored food analysis."""
+
+    image_sha256: str
+    created_at: float
+    model: str
+    score: float
+    category: str
+    reasoning: str
+    latency_ms: int
+
+
+class AnalysisHistoryResponse(BaseModel):
+    """Recent analyses for a player, newest first."""
+
+    player_id: str
+    items: list[AnalysisHistoryItem]
+
+
+class DailyNutritionTotal(BaseModel):
+    """Per-day aggregate over distinct meal photos."""
+
+    day: str
+    meals: int
+    avg_score: float
+    min_score: float
+    max_score: float
+    total_score: float
+    healthy_meals: int
+    unhealthy_meals: int
+
+
+class DailyNutritionResponse(BaseModel):
+    """Daily nutrition aggregates for a player, newest day first."""
+
+    player_id: str
+    days: list[DailyNutritionTotal]
+
+
+class ProfilingToggleRequest(BaseModel):
+    """Runtime switch for the admin profiling endpoints."""
+
+    enabled: bool
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
 
@@ -60,11 +214,45 @@ class SwarmStrategizeRequest(BaseModel):
     """Request body for swarm strategist LLM calls."""
 
     system_prompt: str
-    snapshot_json: str
+    snapshot_json: Optional[str] = None
+    snapshot: Optional[dict[str, Any]] = None
     model: Optional[str] = None
     max_tokens: int = 300
     temperature: float = 0.7
 
+    @model_validator(mode="after")
+    def _require_snapshot(self) -> "SwarmStrategizeRequest":
+        if self.snapshot_json is None and self.snapshot is None:
+            raise ValueError("Provide snapshot (object) or snapshot_json (string)")
+        return self
+
+    def snapshot_text(self) -> str:
+        if self.snapshot is not None:
+            return json.dumps(self.snapshot, separators=(",", ":"))
+        return self.snapshot_json or ""
+
+
+class SwarmDirectivePayload(BaseModel):
+    """Structured directive, mirroring the JSON carried in ``raw_text``."""
+
+    order: str
+    target_zone: str = ""
+    squad_size: int = 0
+    priority: str = ""
+    from_zone: str = ""
+    to_zone: str = ""
+    count: int = 0
+    decoy_zone: str = ""
+    decoy_size: int = 0
+    real_target_zone: str = ""
+    real_size: int = 0
+    reasoning: str = ""
+
+    @classmethod
+    def from_directive(cls, directive: SwarmDirective) -> "SwarmDirectivePayload":
+        # Already normalized and validated; skip re-validation.
+        return cls.model_construct(**directive.to_dict())
+
 
 class SwarmStrategizeResponse(BaseModel):
     """Response body for swarm strategist LLM calls."""
@@ -73,14 +261,17 @@ class SwarmStrategizeResponse(BaseModel):
     model: str
     provider: str
     latency_ms: int
+    directive: Optional[SwarmDirectivePayload] = None
 
 
-def _verify_api_key_header(authorization: Optional[str]) -> None:
+def _verify_api_key_header(authorization: Optional[str]) -> str:
+    """Validate the bearer token and return a stable, non-secret id for the key."""
     settings = get_settings()
+    accepted_keys = {key.strip() for key in settings.api_key.split(",") if key.strip()}
 
     # Development mode: auth disabled when key is not configured.
-    if not settings.api_key:
-        return
+    if not accepted_keys:
+        return _key_id(authorization.split(" ", 1)[-1]) if authorization else "anonymous"
 
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -89,12 +280,84 @@ def _verify_api_key_header(authorization: Optional[str]) -> None:
     if len(parts) != 2 or parts[0].lower() != "bearer":
         raise HTTPException(status_code=401, detail="Invalid Authorization format. Use: Bearer <token>")
 
-    if parts[1] != settings.api_key:
+    if parts[1] not in accepted_keys:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
+    return _key_id(parts[1])
+
+
+def _key_id(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:12]
+
+
+async def require_api_key(authorization: Optional[str] = Header(None)) -> str:
+    with phase("auth"):
+        return _verify_api_key_header(authorization)
+
 
-async def require_api_key(authorization: Optional[str] = Header(None)) -> None:
-    _verify_api_key_header(authorization)
+async def require_admin_key(x_admin_key: Optional[str] = Header(None)) -> None:
+    admin_key = get_settings().admin_api_key
+    # Without a configured admin key the admin surface does not exist.
+    if not admin_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode("utf-8"), admin_key.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+def _require_profiling():
+    profiler = get_profiler()
+    if not profiler.enabled:
+        raise HTTPException(status_code=409, detail="Profiling is disabled; enable it with PUT /admin/profiling")
+    return profiler
+
+
+def _shed_analysis(exc: AdmissionRejected) -> HTTPException:
+    retry_after = max(1, math.ceil(exc.retry_after_s))
+    return HTTPException(
+        status_code=429,
+        detail=f"Analysis request shed ({exc.reason}). Retry later.",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _request_body_docs(model_cls: type[BaseModel], raw_image: bool = False) -> dict[str, Any]:
+    # Bodies are read and validated manually (see _read_model); keep them in the OpenAPI docs.
+    schema = model_cls.model_json_schema()
+    content: dict[str, Any] = {
+        "application/json": {"schema": schema},
+        MSGPACK_MEDIA_TYPE: {"schema": schema},
+    }
+    if raw_image:
+        content["application/octet-stream"] = {"schema": {"type": "string", "format": "binary"}}
+    return {"requestBody": {"required": True, "content": content}}
+
+
+async def _read_model(request: Request, model_cls: type[ModelT]) -> ModelT:
+    decode = _validate_msgpack if is_msgpack(request.headers.get("content-type")) else _validate_json
+    executors = get_executors()
+    try:
+        with phase("body", "read+decode"):
+            body = await request.body()
+            if executors.should_offload(len(body)):
+                return await executors.run_thread(decode, model_cls, body)
+            return decode(model_cls, body)
+    except ValidationError as exc:
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+        raise RequestValidationError(errors) from exc
+
+
+def _validate_json(model_cls: type[ModelT], body: bytes) -> ModelT:
+    return model_cls.model_validate_json(body)
+
+
+def _validate_msgpack(model_cls: type[ModelT], body: bytes) -> ModelT:
+    return model_cls.model_validate(unpack_msgpack(body))
+
+
+def _respond(request: Request, model: BaseModel, status_code: int = 200) -> Any:
+    if wants_msgpack(request.headers.get("accept")):
+        return msgpack_response(model, status_code)
+    return model
 
 
 def _parse_base64_image(payload: str) -> bytes:
@@ -104,77 +367,579 @@ def _parse_base64_image(payload: str) -> bytes:
         raise HTTPException(status_code=400, detail=f"Invalid base64 image: {exc}") from exc
 
 
+async def _decode_base64_image(payload: str) -> bytes:
+    executors = get_executors()
+    if executors.should_offload(len(payload)):
+        return await executors.run_thread(_parse_base64_image, payload)
+    return _parse_base64_image(payload)
+
+
 def _validate_upload(upload_file: UploadFile) -> None:
-    if upload_file.content_type not in {"image/jpeg", "image/jpg", "image/png"}:
+    _validate_image_type(upload_file.content_type)
+
+
+def _validate_image_type(mime_type: Optional[str]) -> None:
+    if mime_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid file type: {upload_file.content_type}. Use JPEG or PNG.",
+            detail=f"Invalid file type: {mime_type}. Use JPEG or PNG.",
         )
 
 
-async def _run_analysis(image_bytes: bytes, mime_type: str) -> AnalyzeResponse:
+def _validate_image_bytes(image_bytes: bytes) -> None:
+    if len(image_bytes) == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+
+    if len(image_bytes) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail="File too large. Maximum 10MB.")
+
+
+def _raw_image_mime(http_request: Request) -> Optional[str]:
+    """Mime type of a raw-image body (from the headers alone); None for MessagePack/JSON bodies."""
+    content_type = http_request.headers.get("content-type")
+    if not is_raw_image(content_type):
+        return None
+    declared = media_type(content_type)
+    return http_request.headers.get(IMAGE_MIME_HEADER) or (declared if declared.startswith("image/") else "image/jpeg")
+
+
+async def _read_analysis_input(http_request: Request) -> tuple[bytes, str]:
+    """Return validated (image bytes, mime type) from a raw-image, MessagePack or JSON body."""
+    mime_type = _raw_image_mime(http_request)
+    if mime_type is not None:
+        with phase("body", "read"):
+            image_bytes = await http_request.body()
+        _validate_image_type(mime_type)
+    else:
+        request = await _read_model(http_request, AnalyzeRequest)
+        mime_type = request.mime_type
+        # Checked before decoding so a disallowed type never costs a base64 pass.
+        _validate_image_type(mime_type)
+        if request.image:
+            image_bytes = request.image
+        else:
+            with phase("preprocess", "base64"):
+                image_bytes = await _decode_base64_image(request.image_base64 or "")
+
+    # Every input path gets the same size limits, MessagePack and JSON included.
+    _validate_image_bytes(image_bytes)
+    return image_bytes, mime_type
+
+
+@asynccontextmanager
+async def _admit(class_name: str, key_id: str):
+    if not get_settings().admission_enabled:
+        yield 0.0
+        return
+
+    async with get_admission_controller().admit(class_name, key_id) as wait_s:
+        record("queue", wait_s, f"admission {class_name}")
+        yield wait_s
+
+
+def _check_budget(key_id: str) -> BudgetDecision:
+    usage_ledger = get_usage_ledger()
+    if usage_ledger is None:
+        return BudgetDecision(BudgetState.OK)
+    return usage_ledger.check_budget(key_id)
+
+
+async def _cached_analysis(analyzer, mime_type: str, image_digest: str) -> Optional[dict]:
+    cached = await analyzer.cached_result(mime_type, image_digest)
+    if cached is not None:
+        return cached
+    result_store = get_result_store()
+    if result_store is None:
+        return None
+    return await result_store.latest_for_hash(image_digest)
+
+
+async def _stored_analysis(
+    image_sha256: str,
+    mime_type: str,
+    key_id: str,
+    player_id: str,
+) -> Optional[AnalyzeResponse]:
+    """Answer a submission from its hash alone when the photo has been analyzed before."""
+    if not get_settings().analysis_hash_precheck_enabled:
+        return None
+    image_digest = image_sha256.strip().lower()
+    if len(image_digest) != 64 or any(char not in "0123456789abcdef" for char in image_digest):
+        raise HTTPException(status_code=400, detail="Image SHA-256 must be 64 hex characters")
+    _validate_image_type(mime_type)
+
+    # A hash alone is not proof of the photo: only answer keys that uploaded it before,
+    # which needs the result store to check against.
+    result_store = get_result_store()
+    if result_store is None:
+        return None
+
     analyzer = get_analyzer()
-    result = await analyzer.analyze_image(image_bytes, mime_type)
+    with phase("precheck", "hash"):
+        # Only the fingerprinted cache: its key covers the current model, prompt and
+        # output mode, so older or degraded results are never served from a bare hash.
+        cached = await analyzer.cached_result(mime_type, image_digest)
+        if cached is not None and await result_store.latest_for_hash(image_digest, key_id=key_id) is None:
+            cached = None
+    if cached is None:
+        return None
+    # Counts as the player's submission, like any other cache hit.
+    _record_result(cached, image_digest, key_id, player_id, analyzer.model_name, mime_type, 0)
+    return AnalyzeResponse(score=cached["score"], category=cached["category"], reasoning=cached["reasoning"])
+
+
+async def _run_analysis(image_bytes: bytes, mime_type: str, key_id: str, player_id: str) -> AnalyzeResponse:
+    analyzer = get_analyzer()
+    with phase("preprocess", "sha256"):
+        image_digest = await analyzer.image_digest(image_bytes)
+
+    model_name = analyzer.model_name
+    budget = _check_budget(key_id)
+    if budget.state is BudgetState.HOLD:
+        # Far over budget: only answers we already have, never a new model call.
+        cached = await _cached_analysis(analyzer, mime_type, image_digest)
+        if cached is None:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Token budget exceeded for this {budget.window}. Retry later.",
+                headers={"Retry-After": str(max(1, math.ceil(budget.retry_after_s)))},
+            )
+        return AnalyzeResponse(score=cached["score"], category=cached["category"], reasoning=cached["reasoning"])
+    if budget.state is BudgetState.DEGRADE:
+        model_name = get_settings().usage_degraded_analysis_model
+
+    started_at = time.perf_counter()
+    with track_usage() as usage:
+        result = await analyzer.analyze_image(
+            image_bytes,
+            mime_type,
+            image_digest=image_digest,
+            model_name=model_name,
+            key_id=key_id,
+        )
+    latency_ms = int((time.perf_counter() - started_at) * 1000)
+
+    shadow = get_shadow_evaluator()
+    if shadow is not None and budget.state is BudgetState.OK:
+        shadow.mirror_analysis(analyzer, result, latency_ms, usage, image_bytes, mime_type, image_digest)
+
+    _record_result(result, image_digest, key_id, player_id, model_name, mime_type, latency_ms)
     return AnalyzeResponse(**result)
 
 
+def _record_result(
+    result: dict,
+    image_digest: str,
+    key_id: str,
+    player_id: str,
+    model_name: str,
+    mime_type: str,
+    latency_ms: int,
+) -> None:
+    result_store = get_result_store()
+    if result_store is not None:
+        result_store.record(
+            AnalysisRecord(
+                image_sha256=image_digest,
+                key_id=key_id,
+                player_id=player_id,
+                created_at=time.time(),
+                model=model_name,
+                mime_type=mime_type,
+                score=float(result["score"]),
+                category=str(result["category"]),
+                reasoning=str(result["reasoning"]),
+                latency_ms=latency_ms,
+            )
+        )
+
+
+async def _run_analysis_job(job: ClaimedJob) -> tuple[float, str, str, str]:
+    """Job queue handler: analyze a deferred photo under the same budget rules as /analyze."""
+    analyzer = get_analyzer()
+    model_name = analyzer.model_name
+    budget = _check_budget(job.key_id)
+    if budget.state is BudgetState.HOLD:
+        raise JobDeferred(f"Token budget exceeded for this {budget.window}", budget.retry_after_s)
+    if budget.state is BudgetState.DEGRADE:
+        model_name = get_settings().usage_degraded_analysis_model
+
+    started_at = time.perf_counter()
+    result = await analyzer.analyze_image(
+        job.image,
+        job.mime_type,
+        image_digest=job.image_sha256,
+        model_name=model_name,
+        key_id=job.key_id,
+    )
+    if result["category"] in UNCACHEABLE_CATEGORIES:
+        raise RuntimeError(result["reasoning"])
+
+    latency_ms = int((time.perf_counter() - started_at) * 1000)
+    _record_result(result, job.image_sha256, job.key_id, job.player_id, model_name, job.mime_type, latency_ms)
+    return float(result["score"]), str(result["category"]), str(result["reasoning"]), model_name
+
+
+def _player_id(player_id: Optional[str], key_id: str) -> str:
+    # Without an explicit player id, a key's results form a single history.
+    token = (player_id or "").strip()
+    return token[:128] if token else key_id
+
+
+def _require_job_queue():
+    job_queue = get_job_queue()
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="Deferred analysis jobs are disabled")
+    return job_queue
+
+
+def _require_result_store():
+    result_store = get_result_store()
+    if result_store is None:
+        raise HTTPException(status_code=404, detail="Result store is disabled")
+    return result_store
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check() -> HealthResponse:
     return HealthResponse(status="healthy", version="1.0.0")
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
+@app.get("/metrics")
+async def metrics(_key_id: str = Depends(require_api_key)) -> dict[str, Any]:
+    return {
+        "pid": os.getpid(),
+        "executors": get_executors().stats(),
+        "admission": get_admission_controller().stats(),
+        "upstream_limiter": get_upstream_limiter().stats(),
+        "retries": get_retry_controller().stats(),
+        "cache": get_cache().stats(),
+        "upstream_recording": get_analyzer().transport.stats(),
+        "swarm_router": get_swarm_router().stats(),
+        "swarm_batching": batcher.stats() if (batcher := get_swarm_batcher()) is not None else None,
+        "directive_validation": validator.stats() if (validator := get_directive_validator()) is not None else None,
+        "analysis_cascade": cascade.stats() if (cascade := get_analysis_cascade()) is not None else None,
+        "result_store": result_store.stats() if (result_store := get_result_store()) is not None else None,
+        "analysis_jobs": await job_queue.stats() if (job_queue := get_job_queue()) is not None else None,
+        "usage_ledger": usage_ledger.stats() if (usage_ledger := get_usage_ledger()) is not None else None,
+        "shadow": shadow.stats() if (shadow := get_shadow_evaluator()) is not None else None,
+    }
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin_key)])
+async def profiling_status() -> dict[str, Any]:
+    profiler = get_profiler()
+    return {"pid": os.getpid(), "enabled": profiler.enabled, "memory": profiler.memory_status()}
+
+
+@app.put("/admin/profiling", dependencies=[Depends(require_admin_key)])
+async def toggle_profiling(request: ProfilingToggleRequest) -> dict[str, Any]:
+    profiler = get_profiler()
+    await profiler.set_enabled(request.enabled)
+    return {"pid": os.getpid(), "enabled": profiler.enabled}
+
+
+@app.post("/admin/profiling/cpu", dependencies=[Depends(require_admin_key)])
+async def profile_cpu(
+    seconds: float = 10.0,
+    mode: str = "cprofile",
+    sort: str = "cumulative",
+    limit: int = 40,
+) -> dict[str, Any]:
+    if mode not in ("cprofile", "sample"):
+        raise HTTPException(status_code=400, detail="mode must be 'cprofile' or 'sample'")
+    try:
+        result = await _require_profiling().profile(seconds, mode, sort, limit)
+    except ProfilingConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return {"pid": os.getpid(), **result}
+
+
+@app.post("/admin/profiling/tracemalloc/start", dependencies=[Depends(require_admin_key)])
+async def start_tracemalloc(frames: int = 10) -> dict[str, Any]:
+    return {"pid": os.getpid(), **_require_profiling().start_tracemalloc(frames)}
+
+
+@app.post("/admin/profiling/tracemalloc/stop", dependencies=[Depends(require_admin_key)])
+async def stop_tracemalloc() -> dict[str, Any]:
+    return {"pid": os.getpid(), **get_profiler().stop_tracemalloc()}
+
+
+@app.post("/admin/profiling/snapshots", dependencies=[Depends(require_admin_key)])
+async def take_memory_snapshot(limit: int = 25) -> dict[str, Any]:
+    try:
+        result = await _require_profiling().take_snapshot(limit)
+    except ProfilingConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return {"pid": os.getpid(), **result}
+
+
+@app.get("/admin/profiling/snapshots/diff", dependencies=[Depends(require_admin_key)])
+async def diff_memory_snapshots(base: int, target: Optional[int] = None, limit: int = 25) -> dict[str, Any]:
+    try:
+        result = await _require_profiling().diff_snapshots(base, target, limit)
+    except ProfilingConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return {"pid": os.getpid(), **result}
+
+
+@app.get("/admin/profiling/loop", dependencies=[Depends(require_admin_key)])
+async def event_loop_status(probes: int = 10) -> dict[str, Any]:
+    return {"pid": os.getpid(), **(await _require_profiling().loop_status(probes))}
+
+
+@app.post(
+    "/analyze",
+    response_model=AnalyzeResponse,
+    openapi_extra=_request_body_docs(AnalyzeRequest, raw_image=True),
+)
 async def analyze_food_base64(
-    request: AnalyzeRequest,
-    _auth: None = Depends(require_api_key),
+    http_request: Request,
+    key_id: str = Depends(require_api_key),
+    x_player_id: Optional[str] = Header(None),
+    x_image_sha256: Optional[str] = Header(None),
 ) -> AnalyzeResponse:
-    image_bytes = _parse_base64_image(request.image_base64)
-    return await _run_analysis(image_bytes, request.mime_type)
+    raw_mime_type = _raw_image_mime(http_request)
+    if x_image_sha256 and raw_mime_type is not None:
+        # Checked before the body is read: a client sending "Expect: 100-continue"
+        # never uploads the photo when this hits. MessagePack/JSON bodies carry their
+        # own mime type, so they skip this and hit the cache by their real digest.
+        stored = await _stored_analysis(x_image_sha256, raw_mime_type, key_id, _player_id(x_player_id, key_id))
+        if stored is not None:
+            return _respond(http_request, stored)
+
+    try:
+        async with _admit("analysis", key_id):
+            image_bytes, mime_type = await _read_analysis_input(http_request)
+            result = await _run_analysis(image_bytes, mime_type, key_id, _player_id(x_player_id, key_id))
+            return _respond(http_request, result)
+    except AdmissionRejected as exc:
+        raise _shed_analysis(exc) from exc
 
 
 @app.post("/analyze/upload", response_model=AnalyzeResponse)
 async def analyze_food_upload(
+    http_request: Request,
     file: UploadFile = File(...),
-    _auth: None = Depends(require_api_key),
+    key_id: str = Depends(require_api_key),
+    x_player_id: Optional[str] = Header(None),
 ) -> AnalyzeResponse:
     _validate_upload(file)
 
-    image_bytes = await file.read()
-    if len(image_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    try:
+        async with _admit("analysis", key_id):
+            with phase("body", "upload"):
+                image_bytes = await file.read()
+            _validate_image_bytes(image_bytes)
+            result = await _run_analysis(image_bytes, file.content_type, key_id, _player_id(x_player_id, key_id))
+            return _respond(http_request, result)
+    except AdmissionRejected as exc:
+        raise _shed_analysis(exc) from exc
+
+
+@app.post(
+    "/analyze/precheck",
+    response_model=AnalyzeResponse,
+    responses={404: {"description": "No stored analysis for this image; upload it as usual"}},
+    openapi_extra=_request_body_docs(AnalysisPrecheckRequest),
+)
+async def analyze_food_precheck(
+    http_request: Request,
+    key_id: str = Depends(require_api_key),
+    x_player_id: Optional[str] = Header(None),
+) -> AnalyzeResponse:
+    request = await _read_model(http_request, AnalysisPrecheckRequest)
+    stored = await _stored_analysis(request.image_sha256, request.mime_type, key_id, _player_id(x_player_id, key_id))
+    if stored is None:
+        raise HTTPException(status_code=404, detail="No stored analysis for this image; upload it as usual")
+    return _respond(http_request, stored)
+
+
+@app.post(
+    "/analyze/jobs",
+    response_model=AnalysisJobResponse,
+    status_code=202,
+    openapi_extra=_request_body_docs(AnalyzeRequest, raw_image=True),
+)
+async def submit_analysis_job(
+    http_request: Request,
+    key_id: str = Depends(require_api_key),
+    x_player_id: Optional[str] = Header(None),
+) -> AnalysisJobResponse:
+    job_queue = _require_job_queue()
+    image_bytes, mime_type = await _read_analysis_input(http_request)
+    with phase("preprocess", "sha256"):
+        image_digest = await get_analyzer().image_digest(image_bytes)
+    try:
+        job, _created = await job_queue.submit(
+            key_id, _player_id(x_player_id, key_id), image_digest, mime_type, image_bytes
+        )
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "30"}) from exc
+    return _respond(http_request, AnalysisJobResponse.from_job(job), status_code=202)
+
+
+@app.get("/analyze/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def analysis_job_status(
+    http_request: Request,
+    job_id: str,
+    key_id: str = Depends(require_api_key),
+) -> AnalysisJobResponse:
+    job = await _require_job_queue().get(job_id, key_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis job on this instance")
+    return _respond(http_request, AnalysisJobResponse.from_job(job))
+
+
+@app.get("/analyze/history", response_model=AnalysisHistoryResponse)
+async def analysis_history(
+    http_request: Request,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 50,
+    key_id: str = Depends(require_api_key),
+    x_player_id: Optional[str] = Header(None),
+) -> AnalysisHistoryResponse:
+    result_store = _require_result_store()
+    player_id = _player_id(x_player_id, key_id)
+    items = await result_store.history(key_id, player_id, since, until, limit)
+    return _respond(
+        http_request,
+        AnalysisHistoryResponse(player_id=player_id, items=[AnalysisHistoryItem(**item) for item in items]),
+    )
+
+
+@app.get("/analyze/daily", response_model=DailyNutritionResponse)
+async def analysis_daily_totals(
+    http_request: Request,
+    days: int = 7,
+    tz_offset_minutes: int = 0,
+    key_id: str = Depends(require_api_key),
+    x_player_id: Optional[str] = Header(None),
+) -> DailyNutritionResponse:
+    result_store = _require_result_store()
+    player_id = _player_id(x_player_id, key_id)
+    totals = await result_store.daily_totals(key_id, player_id, days, tz_offset_minutes)
+    return _respond(
+        http_request,
+        DailyNutritionResponse(player_id=player_id, days=[DailyNutritionTotal(**total) for total in totals]),
+    )
+
+
+def _hold_response(http_request: Request, started_at: float, model: str, provider: str) -> Any:
+    return _respond(
+        http_request,
+        SwarmStrategizeResponse(
+            raw_text=HOLD_DIRECTIVE.to_json(),
+            directive=SwarmDirectivePayload.from_directive(HOLD_DIRECTIVE),
+            model=model,
+            provider=provider,
+            latency_ms=max(0, int((time.perf_counter() - started_at) * 1000)),
+        ),
+    )
+
+
+@app.get("/usage")
+async def token_usage(days: int = 7, key_id: str = Depends(require_api_key)) -> dict[str, Any]:
+    usage_ledger = get_usage_ledger()
+    if usage_ledger is None:
+        raise HTTPException(status_code=404, detail="Usage ledger is disabled")
+    return {
+        "key_id": key_id,
+        "budget": usage_ledger.budget_status(key_id),
+        "usage": await usage_ledger.usage(key_id, days),
+    }
 
-    if len(image_bytes) > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum 10MB.")
 
-    return await _run_analysis(image_bytes, file.content_type)
+@app.get("/admin/usage", dependencies=[Depends(require_admin_key)])
+async def token_usage_all_keys(days: int = 7, key_id: Optional[str] = None) -> dict[str, Any]:
+    usage_ledger = get_usage_ledger()
+    if usage_ledger is None:
+        raise HTTPException(status_code=404, detail="Usage ledger is disabled")
+    return {"usage": await usage_ledger.usage(key_id, days)}
 
 
-@app.post("/swarm/strategize", response_model=SwarmStrategizeResponse)
+@app.get("/admin/shadow", dependencies=[Depends(require_admin_key)])
+async def shadow_report() -> dict[str, Any]:
+    shadow = get_shadow_evaluator()
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="Shadow mode is disabled")
+    return {"stats": shadow.stats(), "comparison": shadow.report()}
+
+
+@app.delete("/admin/shadow", dependencies=[Depends(require_admin_key)])
+async def reset_shadow_report() -> dict[str, Any]:
+    shadow = get_shadow_evaluator()
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="Shadow mode is disabled")
+    await shadow.reset()
+    return {"comparison": shadow.report()}
+
+
+@app.post(
+    "/swarm/strategize",
+    response_model=SwarmStrategizeResponse,
+    openapi_extra=_request_body_docs(SwarmStrategizeRequest),
+)
 async def strategize_swarm(
-    request: SwarmStrategizeRequest,
-    _auth: None = Depends(require_api_key),
+    http_request: Request,
+    key_id: str = Depends(require_api_key),
 ) -> SwarmStrategizeResponse:
-    analyzer = get_analyzer()
-
     started_at = time.perf_counter()
     try:
-        result = await analyzer.strategize_swarm(
-            system_prompt=request.system_prompt,
-            snapshot_json=request.snapshot_json,
-            model_name=request.model,
-            max_tokens=request.max_tokens,
-            temperature=request.temperature,
-        )
-    except Exception as exc:
-        logger.exception("Swarm strategize endpoint failed")
-        raise HTTPException(status_code=502, detail=f"Swarm strategize failed: {exc}") from exc
+        async with _admit("swarm", key_id):
+            request = await _read_model(http_request, SwarmStrategizeRequest)
+            budget = _check_budget(key_id)
+            if budget.state is BudgetState.HOLD:
+                logger.warning("Swarm request over token budget (%s); emitting hold", budget.window)
+                return _hold_response(http_request, started_at, model="usage_budget", provider="budget_hold")
+
+            analyzer = get_analyzer()
+            with phase("preprocess", "route"):
+                route = get_swarm_router().route(
+                    request.snapshot if request.snapshot is not None else request.snapshot_json,
+                    requested_model=request.model,
+                )
+                snapshot_json = request.snapshot_text()
+            model_name = route.model
+            if budget.state is BudgetState.DEGRADE:
+                model_name = get_settings().usage_degraded_swarm_model
+
+            swarm_request = {
+                "system_prompt": request.system_prompt,
+                "snapshot_json": snapshot_json,
+                "max_tokens": request.max_tokens,
+                "temperature": request.temperature,
+            }
+            try:
+                batcher = get_swarm_batcher()
+                with track_usage() as usage:
+                    if batcher is not None:
+                        result = await batcher.strategize(analyzer, **swarm_request, model_name=model_name, key_id=key_id)
+                    else:
+                        result = await analyzer.strategize_swarm(**swarm_request, model_name=model_name, key_id=key_id)
+            except Exception as exc:
+                logger.exception("Swarm strategize endpoint failed")
+                raise HTTPException(status_code=502, detail=f"Swarm strategize failed: {exc}") from exc
+    except AdmissionRejected as exc:
+        # A late directive is worse than a hold: answer now and let the next decision tick retry.
+        logger.warning("Swarm request shed by admission control (%s); emitting hold", exc.reason)
+        return _hold_response(http_request, started_at, model="admission_control", provider="load_shed")
 
     latency_ms = int((time.perf_counter() - started_at) * 1000)
-    return SwarmStrategizeResponse(
-        raw_text=result.get("raw_text", ""),
-        model=result.get("model", request.model or get_settings().swarm_model),
-        provider=result.get("provider", "vertex_gemini"),
-        latency_ms=max(0, latency_ms),
+    shadow = get_shadow_evaluator()
+    if shadow is not None and budget.state is BudgetState.OK:
+        shadow.mirror_swarm(analyzer, result, latency_ms, usage, **swarm_request)
+    directive = result.get("directive")
+    return _respond(
+        http_request,
+        SwarmStrategizeResponse(
+            raw_text=result.get("raw_text", ""),
+            directive=SwarmDirectivePayload.from_directive(directive) if directive is not None else None,
+            model=result.get("model", model_name),
+            provider=result.get("provider", "vertex_gemini"),
+            latency_ms=max(0, latency_ms),
+        ),
     )
 
 
@@ -182,10 +947,13 @@ if __name__ == "__main__":
     import uvicorn
 
     settings = get_settings()
-    logger.info("Starting API server on %s:%s", settings.host, settings.port)
+    # Reload mode is single-process only; multiple workers require it off.
+    workers = 1 if settings.debug else max(1, settings.workers)
+    logger.info("Starting API server on %s:%s (workers=%s)", settings.host, settings.port, workers)
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
+        workers=workers,
     )
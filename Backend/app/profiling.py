@@ -0,0 +1,265 @@
+"""
+On-demand runtime diagnostics for admin endpoints.
+Nothing here runs until an admin asks for it: a cProfile session or a stack
+sampler exists only for the requested number of seconds, tracemalloc traces
+only between an explicit start and stop, and loop lag is probed per request.
+Whether the endpoints may be used at all is a runtime switch kept in shared
+state, so flipping it reaches every worker without a restart.
+"""
+
+import asyncio
+import collections
+import cProfile
+import gc
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Optional
+
+from .config import get_settings
+from .executors import get_executors
+from .shared_state import get_shared_state
+
+PSTATS_SORT_KEYS = {"cumulative", "tottime", "calls", "ncalls", "time"}
+MAX_PROFILE_SECONDS = 120.0
+MAX_SNAPSHOTS = 4
+
+
+class ProfilingConflict(RuntimeError):
+    """Raised when a request clashes with the current profiling state (busy, not tracing, ...)."""
+
+
+class RuntimeProfiler:
+    """Per-process profiling sessions, memory snapshots and event-loop probes."""
+
+    def __init__(self, default_enabled: bool):
+        self.default_enabled = default_enabled
+        self.shared_state = get_shared_state()
+        self._session_lock = asyncio.Lock()
+        self._snapshots: collections.OrderedDict[int, tuple[float, tracemalloc.Snapshot]] = collections.OrderedDict()
+        self._next_snapshot_id = 1
+
+    @property
+    def enabled(self) -> bool:
+        raw = self.shared_state.get("admin", "profiling_enabled")
+        if raw is None:
+            return self.default_enabled
+        return raw == "1"
+
+    async def set_enabled(self, enabled: bool) -> None:
+        await self.shared_state.set_async("admin", "profiling_enabled", "1" if enabled else "0")
+        if not enabled:
+            self.stop_tracemalloc()
+
+    async def profile(self, seconds: float, mode: str, sort: str, limit: int) -> dict[str, Any]:
+        """Profile the event-loop thread: ``cprofile`` returns pstats text, ``sample`` collapsed stacks."""
+        seconds = max(0.1, min(MAX_PROFILE_SECONDS, float(seconds)))
+        if self._session_lock.locked():
+            raise ProfilingConflict("A profiling session is already running in this worker")
+
+        async with self._session_lock:
+            if mode == "sample":
+                return await self._sample(seconds, limit)
+            return await self._cprofile(seconds, sort if sort in PSTATS_SORT_KEYS else "cumulative", limit)
+
+    def start_tracemalloc(self, frames: int) -> dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, min(50, int(frames))))
+        return self.memory_status()
+
+    def stop_tracemalloc(self) -> dict[str, Any]:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._snapshots.clear()
+        return self.memory_status()
+
+    async def take_snapshot(self, limit: int) -> dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            raise ProfilingConflict("tracemalloc is not tracing; start it first")
+
+        snapshot = await get_executors().run_thread(_filtered_snapshot)
+        snapshot_id = self._next_snapshot_id
+        self._next_snapshot_id += 1
+        self._snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(self._snapshots) > MAX_SNAPSHOTS:
+            self._snapshots.popitem(last=False)
+
+        top = await get_executors().run_thread(snapshot.statistics, "lineno")
+        return {
+            "snapshot_id": snapshot_id,
+            "total_kib": round(sum(stat.size for stat in top) / 1024, 1),
+            "top": [_format_stat(stat) for stat in top[: max(1, limit)]],
+            "kept_snapshots": list(self._snapshots),
+        }
+
+    async def diff_snapshots(self, base_id: int, target_id: Optional[int], limit: int) -> dict[str, Any]:
+        """Compare two kept snapshots; without a target, compare the base against a fresh one."""
+        base = self._snapshots.get(base_id)
+        if base is None:
+            raise ProfilingConflict(f"Unknown snapshot {base_id}; kept: {list(self._snapshots)}")
+
+        if target_id is None:
+            target_id = (await self.take_snapshot(limit=1))["snapshot_id"]
+        target = self._snapshots.get(target_id)
+        if target is None:
+            raise ProfilingConflict(f"Unknown snapshot {target_id}; kept: {list(self._snapshots)}")
+
+        changes = await get_executors().run_thread(target[1].compare_to, base[1], "lineno")
+        return {
+            "base_id": base_id,
+            "target_id": target_id,
+            "elapsed_s": round(target[0] - base[0], 1),
+            "net_kib": round(sum(stat.size_diff for stat in changes) / 1024, 1),
+            "top": [_format_stat_diff(stat) for stat in changes[: max(1, limit)]],
+        }
+
+    def memory_status(self) -> dict[str, Any]:
+        status: dict[str, Any] = {
+            "rss_kib": _rss_kib(),
+            "tracing": tracemalloc.is_tracing(),
+            "kept_snapshots": list(self._snapshots),
+            "gc_counts": gc.get_count(),
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            status.update(traced_kib=round(current / 1024, 1), traced_peak_kib=round(peak / 1024, 1))
+        return status
+
+    async def loop_status(self, probes: int = 10, interval_s: float = 0.01) -> dict[str, Any]:
+        """Measure event-loop lag as the oversleep of short timers, and count live tasks."""
+        lags_ms = []
+        for _ in range(max(1, min(100, probes))):
+            started_at = time.perf_counter()
+            await asyncio.sleep(interval_s)
+            lags_ms.append(max(0.0, (time.perf_counter() - started_at - interval_s) * 1000))
+
+        tasks = asyncio.all_tasks()
+        by_coroutine = collections.Counter(_task_label(task) for task in tasks)
+        return {
+            "lag_ms": {
+                "avg": round(sum(lags_ms) / len(lags_ms), 3),
+                "max": round(max(lags_ms), 3),
+            },
+            "tasks": len(tasks),
+            "tasks_by_coroutine": dict(by_coroutine.most_common(15)),
+            "threads": threading.active_count(),
+            "rss_kib": _rss_kib(),
+        }
+
+    async def _cprofile(self, seconds: float, sort: str, limit: int) -> dict[str, Any]:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as exc:
+            # Another profiler (e.g. a debugger) already owns the hook.
+            raise ProfilingConflict(str(exc)) from exc
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats(sort).print_stats(max(1, limit))
+        return {"mode": "cprofile", "seconds": seconds, "sort": sort, "pstats": output.getvalue()}
+
+    async def _sample(self, seconds: float, limit: int) -> dict[str, Any]:
+        # Sample the loop thread's stack from a helper thread; the loop itself does no extra work.
+        loop_thread_id = threading.get_ident()
+        sampler = _StackSampler(loop_thread_id, interval_s=0.005)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+
+        stacks = sampler.counts.most_common(max(1, limit))
+        return {
+            "mode": "sample",
+            "seconds": seconds,
+            "samples": sampler.samples,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks),
+        }
+
+
+class _StackSampler(threading.Thread):
+    def __init__(self, thread_id: int, interval_s: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.counts: collections.Counter[str] = collections.Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join(timeout=1.0)
+
+
+def _filtered_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+
+
+def _format_stat(stat: tracemalloc.Statistic) -> dict[str, Any]:
+    frame = stat.traceback[0]
+    return {"location": f"{frame.filename}:{frame.lineno}", "size_kib": round(stat.size / 1024, 1), "count": stat.count}
+
+
+def _format_stat_diff(stat: tracemalloc.StatisticDiff) -> dict[str, Any]:
+    frame = stat.traceback[0]
+    return {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_diff_kib": round(stat.size_diff / 1024, 1),
+        "size_kib": round(stat.size / 1024, 1),
+        "count_diff": stat.count_diff,
+    }
+
+
+def _task_label(task: asyncio.Task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or type(coro).__name__
+
+
+def _rss_kib() -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+_profiler: Optional[RuntimeProfiler] = None
+
+
+def get_profiler() -> RuntimeProfiler:
+    """Get or create the profiler for this worker process."""
+    global _profiler
+    if _profiler is None:
+        _profiler = RuntimeProfiler(default_enabled=get_settings().admin_profiling_enabled)
+    return _profiler
@@ -0,0 +1,190 @@
+"""
+Record/replay transport for Gemini generate_content calls.
+In record mode every successful response is saved to disk under a fingerprint
+of the request (model, generation config, prompt text and image hashes); in
+replay mode those saved responses are served without touching Vertex,
+optionally sleeping for the originally observed latency. Passthrough calls
+Vertex directly and is the default.
+
+Recordings are one JSON file per fingerprint, so a recording directory can be
+checked in as a fixture set and diffed like any other file.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+from google.genai import types
+from pydantic import BaseModel
+
+from .config import get_settings
+from .executors import get_executors
+
+logger = logging.getLogger(__name__)
+
+RECORDING_MODES = ("passthrough", "record", "replay")
+RECORDING_FORMAT_VERSION = 1
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when no recording matches the request."""
+
+
+def request_fingerprint(model: str, contents: list, config: Optional[types.GenerateContentConfig]) -> str:
+    """Stable hash of everything that determines a response; image bytes contribute only their hash."""
+    canonical = {
+        "model": model,
+        "contents": _canonical(contents),
+        "config": _canonical(config),
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {"sha256": hashlib.sha256(value).hexdigest(), "size": len(value)}
+    if isinstance(value, BaseModel):
+        return _canonical(value.model_dump(mode="python", exclude_none=True))
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if hasattr(value, "value") and not isinstance(value, (str, int, float, bool)):
+        # Enums serialize by value so SDK enum classes don't leak into the hash.
+        return value.value
+    return value
+
+
+class RecordingTransport:
+    """Wraps an SDK ``AsyncModels`` object and records, replays or forwards its calls."""
+
+    def __init__(
+        self,
+        models: Any,
+        mode: str,
+        directory: str,
+        simulate_latency: bool = False,
+        latency_scale: float = 1.0,
+    ):
+        mode = (mode or "passthrough").strip().lower()
+        if mode not in RECORDING_MODES:
+            raise ValueError(f"Unknown recording mode {mode!r}; expected one of {RECORDING_MODES}")
+
+        self.models = models
+        self.mode = mode
+        self.directory = directory
+        self.simulate_latency = simulate_latency
+        self.latency_scale = max(0.0, float(latency_scale))
+        self.executors = get_executors()
+        self._loaded: dict[str, dict[str, Any]] = {}
+        self._counters = {"recorded": 0, "replayed": 0, "misses": 0, "record_errors": 0}
+
+        if mode != "passthrough":
+            os.makedirs(directory, exist_ok=True)
+            logger.info("Upstream %s mode enabled (dir=%s)", mode, directory)
+
+    async def generate_content(
+        self,
+        *,
+        model: str,
+        contents: list,
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> types.GenerateContentResponse:
+        if self.mode == "passthrough":
+            return await self.models.generate_content(model=model, contents=contents, config=config)
+
+        fingerprint = request_fingerprint(model, contents, config)
+        if self.mode == "replay":
+            return await self._replay(fingerprint, model)
+
+        started_at = time.perf_counter()
+        response = await self.models.generate_content(model=model, contents=contents, config=config)
+        latency_ms = int((time.perf_counter() - started_at) * 1000)
+        await self._record(fingerprint, model, response, latency_ms)
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        return {"mode": self.mode, **self._counters}
+
+    async def _replay(self, fingerprint: str, model: str) -> types.GenerateContentResponse:
+        entry = self._loaded.get(fingerprint)
+        if entry is None:
+            entry = await self.executors.run_thread(self._read_entry, fingerprint)
+            if entry is None:
+                self._counters["misses"] += 1
+                raise ReplayMissError(f"No recording for {model} request {fingerprint[:12]} in {self.directory}")
+            self._loaded[fingerprint] = entry
+
+        if self.simulate_latency and self.latency_scale > 0:
+            await asyncio.sleep(entry.get("latency_ms", 0) / 1000.0 * self.latency_scale)
+
+        self._counters["replayed"] += 1
+        # A fresh object per call: callers may mutate the response they get back.
+        return types.GenerateContentResponse.model_validate(entry["response"])
+
+    async def _record(
+        self,
+        fingerprint: str,
+        model: str,
+        response: types.GenerateContentResponse,
+        latency_ms: int,
+    ) -> None:
+        entry = {
+            "version": RECORDING_FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "model": model,
+            "recorded_at": time.time(),
+            "latency_ms": latency_ms,
+            "response": response.model_dump(mode="json", exclude_none=True),
+        }
+        try:
+            await self.executors.run_thread(self._write_entry, fingerprint, entry)
+            self._counters["recorded"] += 1
+        except Exception:
+            # Recording is best effort; the live response is still returned.
+            self._counters["record_errors"] += 1
+            logger.exception("Failed to record upstream response %s", fingerprint[:12])
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def _read_entry(self, fingerprint: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self._path(fingerprint), encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError):
+            logger.warning("Unreadable recording %s", fingerprint[:12])
+            return None
+        return entry if isinstance(entry, dict) and "response" in entry else None
+
+    def _write_entry(self, fingerprint: str, entry: dict[str, Any]) -> None:
+        # Write-then-rename so concurrent workers never replay a half-written file.
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".recording-", suffix=".json")
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as tmp:
+                json.dump(entry, tmp, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._path(fingerprint))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def build_transport(models: Any) -> RecordingTransport:
+    """Wrap SDK models according to the configured recording mode."""
+    settings = get_settings()
+    return RecordingTransport(
+        models,
+        mode=settings.upstream_recording_mode,
+        directory=settings.upstream_recording_dir,
+        simulate_latency=settings.upstream_replay_simulate_latency,
+        latency_scale=settings.upstream_replay_latency_scale,
+    )
@@ -0,0 +1,297 @@
+"""
+Offline bulk re-scoring of a food image corpus.
+Runs every image in a directory (or a JSONL manifest) through
+FoodAnalyzer.analyze_image with bounded concurrency and a request rate cap,
+appending one JSON line per image to the output file. The output doubles as
+the checkpoint: re-running with the same output skips images already scored,
+so an interrupted run resumes where it stopped.
+
+Usage (from Backend/):
+    python -m app.rescore corpus/ --output rescore.jsonl --concurrency 8 --rate 4
+    python -m app.rescore manifest.jsonl --output new.jsonl --baseline old.jsonl
+
+Manifest lines look like {"path": "meals/001.jpg", "id": "001", "mime_type": "image/jpeg"};
+only "path" is required and relative paths resolve against the manifest's directory.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional
+
+from .admission import TokenBucket
+from .executors import get_executors, shutdown_executors
+from .gemini_analyzer import ANALYSIS_PROMPT_DIGEST, UNCACHEABLE_CATEGORIES, get_analyzer
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+HISTOGRAM_BUCKETS = 10
+
+
+@dataclass(frozen=True, slots=True)
+class CorpusItem:
+    item_id: str
+    path: str
+    mime_type: str
+
+
+def iter_corpus(source: str) -> Iterator[CorpusItem]:
+    """Yield corpus items from a directory tree or a JSONL manifest."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                mime_type = IMAGE_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+                if mime_type is None:
+                    continue
+                path = os.path.join(root, name)
+                yield CorpusItem(os.path.relpath(path, source), path, mime_type)
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as manifest:
+        for line_number, line in enumerate(manifest, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                path = str(entry["path"])
+            except (json.JSONDecodeError, KeyError, TypeError):
+                logger.warning("Skipping malformed manifest line %s", line_number)
+                continue
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            mime_type = entry.get("mime_type") or IMAGE_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+            yield CorpusItem(str(entry.get("id") or entry["path"]), path, mime_type)
+
+
+def load_results(path: str) -> dict[str, dict[str, Any]]:
+    """Read a previous output file, keyed by item id (later lines win)."""
+    results: dict[str, dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return results
+
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line.
+                continue
+            if isinstance(row, dict) and "id" in row:
+                results[str(row["id"])] = row
+    return results
+
+
+class Rescorer:
+    """Scores corpus items concurrently under a concurrency bound and a rate cap."""
+
+    def __init__(
+        self,
+        output_path: str,
+        concurrency: int,
+        rate_per_s: float,
+        use_cache: bool,
+        model_name: Optional[str] = None,
+    ):
+        self.output_path = output_path
+        self.concurrency = max(1, int(concurrency))
+        self.bucket: Optional[TokenBucket] = None
+        if rate_per_s > 0:
+            self.bucket = TokenBucket(rate_per_s, burst=max(1.0, min(float(self.concurrency), rate_per_s)))
+        self.use_cache = use_cache
+        # An explicit model is scored as itself, never through the analysis cascade.
+        self.model_name = model_name
+        self.analyzer = get_analyzer()
+        self.executors = get_executors()
+        self.rows: list[dict[str, Any]] = []
+
+    async def run(self, items: Iterable[CorpusItem]) -> float:
+        """Score every item and return the elapsed wall time in seconds."""
+        iterator = iter(items)
+        started_at = time.perf_counter()
+        with open(self.output_path, "a", encoding="utf-8") as output:
+            workers = [asyncio.create_task(self._worker(iterator, output)) for _ in range(self.concurrency)]
+            await asyncio.gather(*workers)
+        return time.perf_counter() - started_at
+
+    async def _worker(self, iterator: Iterator[CorpusItem], output) -> None:
+        # Workers share one iterator; the event loop is single-threaded, so each item is taken once.
+        for item in iterator:
+            await self._throttle()
+            row = await self._score(item)
+            output.write(json.dumps(row, separators=(",", ":")) + "\n")
+            output.flush()
+            self.rows.append(row)
+            if len(self.rows) % 50 == 0:
+                logger.info("Scored %s images", len(self.rows))
+
+    async def _throttle(self) -> None:
+        if self.bucket is None:
+            return
+        while True:
+            admitted, wait_s = self.bucket.try_take()
+            if admitted:
+                return
+            await asyncio.sleep(wait_s)
+
+    async def _score(self, item: CorpusItem) -> dict[str, Any]:
+        row: dict[str, Any] = {
+            "id": item.item_id,
+            "path": item.path,
+            "model": self.model_name or self.analyzer.model_name,
+            "prompt_digest": ANALYSIS_PROMPT_DIGEST,
+        }
+        try:
+            image_bytes = await self.executors.run_thread(_read_bytes, item.path)
+        except OSError as exc:
+            return {**row, "score": None, "category": "error", "reasoning": f"Unreadable image: {exc}", "latency_ms": 0}
+
+        image_digest = await self.analyzer.image_digest(image_bytes)
+        started_at = time.perf_counter()
+        result = await self.analyzer.analyze_image(
+            image_bytes,
+            item.mime_type,
+            image_digest=image_digest,
+            use_cache=self.use_cache,
+            model_name=self.model_name,
+            cascade=self.model_name is None,
+        )
+        return {
+            **row,
+            "model": result.get("model") or row["model"],
+            "image_sha256": image_digest,
+            "score": result["score"],
+            "category": result["category"],
+            "reasoning": result["reasoning"],
+            "latency_ms": int((time.perf_counter() - started_at) * 1000),
+            "scored_at": time.time(),
+        }
+
+
+def summarize(rows: list[dict[str, Any]], elapsed_s: float, baseline: Optional[dict[str, dict[str, Any]]]) -> str:
+    lines = []
+    scored = [row for row in rows if row.get("category") not in UNCACHEABLE_CATEGORIES]
+    errors = len(rows) - len(scored)
+    throughput = len(rows) / elapsed_s if elapsed_s > 0 else 0.0
+    lines.append(
+        f"images={len(rows)} scored={len(scored)} errors={errors} "
+        f"elapsed={elapsed_s:.1f}s throughput={throughput:.2f}/s"
+    )
+
+    latencies = sorted(row["latency_ms"] for row in rows if row.get("latency_ms"))
+    if latencies:
+        lines.append(
+            f"latency_ms p50={_percentile(latencies, 0.50)} p95={_percentile(latencies, 0.95)} max={latencies[-1]}"
+        )
+
+    scores = [float(row["score"]) for row in scored]
+    if scores:
+        stdev = statistics.pstdev(scores) if len(scores) > 1 else 0.0
+        lines.append(
+            f"score mean={statistics.fmean(scores):.3f} median={statistics.median(scores):.3f} "
+            f"stdev={stdev:.3f} min={min(scores):.2f} max={max(scores):.2f}"
+        )
+        lines.append("score histogram:")
+        buckets = Counter(min(HISTOGRAM_BUCKETS - 1, int(score * HISTOGRAM_BUCKETS)) for score in scores)
+        widest = max(buckets.values())
+        for bucket in range(HISTOGRAM_BUCKETS):
+            count = buckets.get(bucket, 0)
+            bar = "#" * round(40 * count / widest) if widest else ""
+            low = bucket / HISTOGRAM_BUCKETS
+            lines.append(f"  {low:.1f}-{low + 1 / HISTOGRAM_BUCKETS:.1f} {count:6d} {bar}")
+
+    categories = Counter(str(row.get("category")) for row in rows)
+    lines.append("categories: " + ", ".join(f"{name}={count}" for name, count in categories.most_common()))
+
+    if baseline:
+        lines.extend(_drift_lines(scored, baseline))
+    return "\n".join(lines)
+
+
+def _drift_lines(scored: list[dict[str, Any]], baseline: dict[str, dict[str, Any]]) -> list[str]:
+    deltas = []
+    category_changes = 0
+    for row in scored:
+        previous = baseline.get(str(row["id"]))
+        if not previous or previous.get("score") is None or previous.get("category") in UNCACHEABLE_CATEGORIES:
+            continue
+        deltas.append(float(row["score"]) - float(previous["score"]))
+        category_changes += row["category"] != previous.get("category")
+
+    if not deltas:
+        return ["drift: no overlapping items with the baseline"]
+
+    absolute = [abs(delta) for delta in deltas]
+    return [
+        f"drift vs baseline (n={len(deltas)}): mean_delta={statistics.fmean(deltas):+.3f} "
+        f"mean_abs_delta={statistics.fmean(absolute):.3f} max_abs_delta={max(absolute):.3f} "
+        f"category_changes={category_changes} ({category_changes / len(deltas):.1%})"
+    ]
+
+
+def _percentile(sorted_values: list[int], fraction: float) -> int:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    done = load_results(args.output)
+    if not args.retry_errors:
+        skip = set(done)
+    else:
+        skip = {item_id for item_id, row in done.items() if row.get("category") not in UNCACHEABLE_CATEGORIES}
+
+    pending = (item for item in iter_corpus(args.source) if item.item_id not in skip)
+    if args.limit:
+        pending = (item for _, item in zip(range(args.limit), pending))
+    if skip:
+        logger.info("Resuming: %s images already in %s", len(skip), args.output)
+
+    rescorer = Rescorer(args.output, args.concurrency, args.rate, use_cache=not args.no_cache, model_name=args.model or None)
+
+    try:
+        elapsed_s = await rescorer.run(pending)
+    finally:
+        shutdown_executors()
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    print(summarize(rescorer.rows, elapsed_s, baseline))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.rescore",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("source", help="image directory or JSONL manifest")
+    parser.add_argument("--output", required=True, help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=4.0, help="max analyses started per second; 0 disables")
+    parser.add_argument("--model", default="", help="override GEMINI_MODEL for this run")
+    parser.add_argument("--baseline", default="", help="previous results file to report score drift against")
+    parser.add_argument("--limit", type=int, default=0, help="score at most N pending images")
+    parser.add_argument("--no-cache", action="store_true", help="always call the model, ignoring cached results")
+    parser.add_argument("--retry-errors", action="store_true", help="re-score items whose previous result failed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Persistent store for food analysis results.
+Every analysis is recorded (image hash, player/key id, timestamp, model,
+score, category, reasoning, latency) so the game can query recent meals and
+daily nutrition aggregates without re-uploading photos.
+
+Writes never block a request: results are queued in memory and written in
+batches by a background task; reads run on the executor thread pool. SQLite
+in WAL mode is the default backend, so all workers on an instance can share
+one file.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .config import get_settings
+from .executors import get_executors
+
+logger = logging.getLogger(__name__)
+
+FAILED_CATEGORIES = ("error", "parse_error")
+NON_MEAL_CATEGORIES = FAILED_CATEGORIES + ("invalid",)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS analysis_results ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " image_sha256 TEXT NOT NULL,"
+    " key_id TEXT NOT NULL,"
+    " player_id TEXT NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " model TEXT NOT NULL,"
+    " mime_type TEXT NOT NULL,"
+    " score REAL NOT NULL,"
+    " category TEXT NOT NULL,"
+    " reasoning TEXT NOT NULL,"
+    " latency_ms INTEGER NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_results_hash ON analysis_results (image_sha256, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_results_player_time"
+    " ON analysis_results (key_id, player_id, created_at)",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class AnalysisRecord:
+    image_sha256: str
+    key_id: str
+    player_id: str
+    created_at: float
+    model: str
+    mime_type: str
+    score: float
+    category: str
+    reasoning: str
+    latency_ms: int
+
+
+class AnalysisResultStore:
+    """SQLite-backed result store with an asynchronous batched writer."""
+
+    def __init__(self, path: str, batch_size: int, flush_interval_s: float, queue_size: int):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.01, float(flush_interval_s))
+        self.queue_size = max(1, int(queue_size))
+        # Created in start() so the queue belongs to the serving event loop.
+        # None on the queue is the stop sentinel.
+        self._queue: Optional[asyncio.Queue[Optional[AnalysisRecord]]] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._local = threading.local()
+        self._counters = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0, "write_errors": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def start(self) -> None:
+        if self._writer_task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._writer_task = asyncio.create_task(self._writer_loop(), name="analysis-result-writer")
+
+    async def stop(self) -> None:
+        """Stop the writer after draining everything already queued."""
+        if self._writer_task is None:
+            return
+
+        # The sentinel queues behind every pending record, so the writer flushes them all before exiting.
+        await self._queue.put(None)
+        await self._writer_task
+        self._writer_task = None
+        # Records that arrived after the sentinel; later ones count as dropped, like before start().
+        leftovers = [record for record in self._drain(self._queue.qsize()) if record is not None]
+        self._queue = None
+        await self._flush(leftovers)
+
+    def record(self, record: AnalysisRecord) -> None:
+        """Queue a result for writing; never blocks, drops (and counts) on overflow or outside start()/stop()."""
+        if self._queue is None:
+            self._counters["dropped"] += 1
+            return
+        try:
+            self._queue.put_nowait(record)
+            self._counters["recorded"] += 1
+        except asyncio.QueueFull:
+            self._counters["dropped"] += 1
+            logger.warning("Analysis result queue full; dropping record for %s", record.image_sha256[:12])
+
+    async def history(
+        self,
+        key_id: str,
+        player_id: str,
+        since: Optional[float],
+        until: Optional[float],
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        return await get_executors().run_thread(self._query_history, key_id, player_id, since, until, limit)
+
+    async def daily_totals(
+        self,
+        key_id: str,
+        player_id: str,
+        days: int,
+        tz_offset_minutes: int,
+    ) -> list[dict[str, Any]]:
+        return await get_executors().run_thread(self._query_daily, key_id, player_id, days, tz_offset_minutes)
+
+    async def latest_for_hash(
+        self,
+        image_sha256: str,
+        model: Optional[str] = None,
+        key_id: Optional[str] = None,
+    ) -> Optional[dict[str, Any]]:
+        return await get_executors().run_thread(self._query_latest_for_hash, image_sha256, model, key_id)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._counters, "queue_depth": self._queue.qsize() if self._queue is not None else 0}
+
+    async def _writer_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval_s
+            try:
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if record is None:
+                        stopping = True
+                        break
+                    batch.append(record)
+            finally:
+                # Also runs if the task is cancelled mid-collection, so the batch in hand is written.
+                await self._flush(batch)
+
+    def _drain(self, limit: int) -> list[Optional[AnalysisRecord]]:
+        batch: list[Optional[AnalysisRecord]] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _flush(self, batch: list[AnalysisRecord]) -> None:
+        if not batch:
+            return
+        try:
+            await get_executors().run_thread(self._write_batch, batch)
+            self._counters["written"] += len(batch)
+            self._counters["batches"] += 1
+        except Exception:
+            self._counters["write_errors"] += 1
+            logger.exception("Failed to write %s analysis results", len(batch))
+
+    def _write_batch(self, batch: list[AnalysisRecord]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO analysis_results (image_sha256, key_id, player_id, created_at, model, mime_type,"
+                " score, category, reasoning, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        record.image_sha256,
+                        record.key_id,
+                        record.player_id,
+                        record.created_at,
+                        record.model,
+                        record.mime_type,
+                        record.score,
+                        record.category,
+                        record.reasoning,
+                        record.latency_ms,
+                    )
+                    for record in batch
+                ],
+            )
+
+    def _query_history(
+        self,
+        key_id: str,
+        player_id: str,
+        since: Optional[float],
+        until: Optional[float],
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT image_sha256, created_at, model, score, category, reasoning, latency_ms"
+            " FROM analysis_results"
+            " WHERE key_id = ? AND player_id = ? AND created_at >= ? AND created_at < ?"
+            " ORDER BY created_at DESC LIMIT ?",
+            (key_id, player_id, since or 0.0, until or time.time() + 86400, max(1, min(500, int(limit)))),
+        ).fetchall()
+        return [
+            {
+                "image_sha256": row[0],
+                "created_at": row[1],
+                "model": row[2],
+                "score": row[3],
+                "category": row[4],
+                "reasoning": row[5],
+                "latency_ms": row[6],
+            }
+            for row in rows
+        ]
+
+    def _query_daily(self, key_id: str, player_id: str, days: int, tz_offset_minutes: int) -> list[dict[str, Any]]:
+        # The window is whole local days: today plus the days-1 before it, from local midnight.
+        offset_s = int(tz_offset_minutes) * 60
+        local_now = time.time() + offset_s
+        since = local_now - local_now % 86400 - (max(1, min(366, int(days))) - 1) * 86400 - offset_s
+        offset = f"{int(tz_offset_minutes):+d} minutes"
+        placeholders = ", ".join("?" for _ in NON_MEAL_CATEGORIES)
+        # A photo re-submitted on the same day counts as one meal (its latest score wins).
+        rows = self._connection().execute(
+            "SELECT day, COUNT(*), AVG(score), MIN(score), MAX(score), SUM(score),"
+            " SUM(CASE WHEN category IN ('excellent', 'good') THEN 1 ELSE 0 END),"
+            " SUM(CASE WHEN category IN ('poor', 'unhealthy') THEN 1 ELSE 0 END)"
+            " FROM ("
+            "  SELECT date(created_at, 'unixepoch', ?) AS day, image_sha256,"
+            "   score, category, MAX(created_at)"
+            "  FROM analysis_results"
+            f"  WHERE key_id = ? AND player_id = ? AND created_at >= ? AND category NOT IN ({placeholders})"
+            "  GROUP BY day, image_sha256"
+            " ) GROUP BY day ORDER BY day DESC",
+            (offset, key_id, player_id, since, *NON_MEAL_CATEGORIES),
+        ).fetchall()
+        return [
+            {
+                "day": row[0],
+                "meals": row[1],
+                "avg_score": round(row[2], 4),
+                "min_score": row[3],
+                "max_score": row[4],
+                "total_score": round(row[5], 4),
+                "healthy_meals": row[6],
+                "unhealthy_meals": row[7],
+            }
+            for row in rows
+        ]
+
+    def _query_latest_for_hash(
+        self,
+        image_sha256: str,
+        model: Optional[str],
+        key_id: Optional[str],
+    ) -> Optional[dict[str, Any]]:
+        query = "SELECT score, category, reasoning, model, created_at FROM analysis_results WHERE image_sha256 = ?"
+        params: list[Any] = [image_sha256]
+        if model:
+            query += " AND model = ?"
+            params.append(model)
+        if key_id:
+            query += " AND key_id = ?"
+            params.append(key_id)
+        placeholders = ", ".join("?" for _ in FAILED_CATEGORIES)
+        query += f" AND category NOT IN ({placeholders}) ORDER BY created_at DESC LIMIT 1"
+        params.extend(FAILED_CATEGORIES)
+
+        row = self._connection().execute(query, params).fetchone()
+        if row is None:
+            return None
+        return {"score": row[0], "category": row[1], "reasoning": row[2], "model": row[3], "created_at": row[4]}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+
+_result_store: Optional[AnalysisResultStore] = None
+
+
+def get_result_store() -> Optional[AnalysisResultStore]:
+    """Get or create the result store; None when disabled by configuration."""
+    global _result_store
+    settings = get_settings()
+    if not settings.result_store_enabled:
+        return None
+
+    if _result_store is None:
+        _result_store = AnalysisResultStore(
+            path=settings.result_store_path,
+            batch_size=settings.result_store_batch_size,
+            flush_interval_s=settings.result_store_flush_interval_ms / 1000.0,
+            queue_size=settings.result_store_queue_size,
+        )
+    return _result_store
@@ -0,0 +1,266 @@
+"""
+Declarative retry policies for upstream model calls.
+A policy is an ordered ladder of (model, temperature) rungs, an attempt cap,
+exponential backoff with full jitter, and rules for which errors are worth
+another attempt. Errors are classified as:
+
+  transient    timeouts, dropped connections, 5xx: back off, then retry
+  unavailable  circuit breaker open or call budget spent: move to the next
+               rung straight away (it may be a different model)
+  quota        429 / RESOURCE_EXHAUSTED: stop, unless the policy says otherwise;
+               retrying into a quota storm only deepens it
+  fatal        4xx, bad requests, replay misses: the same model would fail the
+               same way, so skip the rungs that use it; a rung with a
+               different model (e.g. the fallback) still runs
+
+Retries are also capped globally: across all workers, the retries in the
+current window may not exceed a fraction of the requests in it (plus a small
+floor), so an outage cannot be amplified into a retry storm.
+"""
+
+import asyncio
+import logging
+import math
+import random
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Optional
+
+from google.genai import errors as genai_errors
+
+from .config import get_settings
+from .server_timing import phase
+from .shared_state import get_shared_state, window_key
+from .upstream_limiter import is_quota_error
+
+logger = logging.getLogger(__name__)
+
+BUDGET_WINDOW_S = 60
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """Raised when the shared circuit breaker or call budget blocks a Vertex call."""
+
+
+class ErrorClass(str, Enum):
+    TRANSIENT = "transient"
+    UNAVAILABLE = "unavailable"
+    QUOTA = "quota"
+    FATAL = "fatal"
+
+
+def classify_error(exc: BaseException) -> ErrorClass:
+    if is_quota_error(exc):
+        return ErrorClass.QUOTA
+    if isinstance(exc, UpstreamUnavailableError):
+        return ErrorClass.UNAVAILABLE
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError, genai_errors.ServerError)):
+        return ErrorClass.TRANSIENT
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int) and (code >= 500 or code in (408, 409)):
+        return ErrorClass.TRANSIENT
+    return ErrorClass.FATAL
+
+
+@dataclass(frozen=True, slots=True)
+class RetryRung:
+    """One step of a ladder; an empty model or None temperature keeps the request's own."""
+
+    model: str = ""
+    temperature: Optional[float] = None
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    name: str
+    ladder: tuple[RetryRung, ...]
+    max_retries: int
+    base_delay_s: float
+    max_delay_s: float
+    retry_on_quota: bool = False
+
+    @classmethod
+    def from_spec(cls, name: str, ladder_spec: str, max_retries: int, **options: Any) -> "RetryPolicy":
+        """Build a policy from a ladder like ``"gemini-2.0-flash@0,gemini-2.0-flash-lite"``."""
+        return cls(name=name, ladder=parse_ladder(ladder_spec), max_retries=max(0, int(max_retries)), **options)
+
+    def attempts(self, model: str, temperature: float, max_retries: Optional[int] = None) -> list[dict[str, Any]]:
+        """The request's own call followed by one entry per retry; the last rung repeats."""
+        retries = self.max_retries if max_retries is None else max(0, min(self.max_retries, int(max_retries)))
+        attempts = [{"name": "primary", "model": model, "temperature": temperature}]
+        ladder = self.ladder or (RetryRung(),)
+        for index in range(retries):
+            rung = ladder[min(index, len(ladder) - 1)]
+            attempts.append(
+                {
+                    "name": f"retry{index + 1}" if retries > 1 else "retry",
+                    "model": rung.model or model,
+                    "temperature": temperature if rung.temperature is None else rung.temperature,
+                }
+            )
+        return attempts
+
+    def backoff_s(self, retry_number: int) -> float:
+        """Full-jitter exponential backoff for the given retry (1-based)."""
+        ceiling = min(self.max_delay_s, self.base_delay_s * (2 ** max(0, retry_number - 1)))
+        return random.uniform(0.0, ceiling) if ceiling > 0 else 0.0
+
+
+class RetryPlan:
+    """The attempts of one request under a policy, and the decision before each retry."""
+
+    def __init__(self, controller: "RetryController", policy: RetryPolicy, attempts: list[dict[str, Any]]):
+        self.controller = controller
+        self.policy = policy
+        self.attempts = attempts
+        self.retries = 0
+
+    async def before_retry(self, attempt_index: int, exc: Optional[BaseException] = None) -> bool:
+        """Decide whether attempt ``attempt_index`` (1-based) gets a successor, backing off if so.
+
+        ``exc`` is the error the attempt raised; None means it returned an unusable answer.
+        """
+        error_class = classify_error(exc) if exc is not None else None
+        if error_class is not None:
+            self.controller.count(self.policy.name, f"error_{error_class.value}")
+
+        if error_class is ErrorClass.FATAL:
+            # Drop the remaining rungs on the failing model; callers iterate this list in place.
+            failed_model = self.attempts[attempt_index - 1]["model"]
+            kept = [attempt for attempt in self.attempts[attempt_index:] if attempt["model"] != failed_model]
+            if len(kept) < len(self.attempts) - attempt_index:
+                self.controller.count(self.policy.name, "skipped_fatal_model")
+            self.attempts[attempt_index:] = kept
+
+        if attempt_index >= len(self.attempts):
+            if error_class is ErrorClass.FATAL:
+                self.controller.count(self.policy.name, "stopped_fatal")
+            return False
+        if error_class is ErrorClass.QUOTA and not self.policy.retry_on_quota:
+            self.controller.count(self.policy.name, "stopped_quota")
+            return False
+        if not await self.controller.acquire_retry(self.policy.name):
+            logger.warning("Retry budget exhausted for %s; not retrying attempt %s", self.policy.name, attempt_index)
+            return False
+
+        self.retries += 1
+        if error_class in (ErrorClass.TRANSIENT, ErrorClass.QUOTA):
+            delay_s = self.policy.backoff_s(self.retries)
+            self.controller.add_backoff(self.policy.name, delay_s)
+            with phase("retry_backoff", self.policy.name):
+                await asyncio.sleep(delay_s)
+        return True
+
+
+class RetryController:
+    """Hands out retry plans and enforces the shared retry budget."""
+
+    def __init__(self, policies: dict[str, RetryPolicy], budget_ratio: float, budget_min_per_minute: int):
+        self.policies = policies
+        self.budget_ratio = max(0.0, float(budget_ratio))
+        self.budget_min_per_minute = max(0, int(budget_min_per_minute))
+        self.shared_state = get_shared_state()
+        self._counters: dict[str, dict[str, float]] = {name: {} for name in policies}
+
+    async def plan(
+        self,
+        policy_name: str,
+        model: str,
+        temperature: float,
+        max_retries: Optional[int] = None,
+    ) -> RetryPlan:
+        policy = self.policies[policy_name]
+        await self.shared_state.incr_async("retry", _requests_key(policy_name), ttl_seconds=2 * BUDGET_WINDOW_S)
+        self.count(policy_name, "requests")
+        return RetryPlan(self, policy, policy.attempts(model, temperature, max_retries))
+
+    async def acquire_retry(self, policy_name: str) -> bool:
+        requests = float(self.shared_state.get("retry", _requests_key(policy_name)) or 0)
+        allowed = self.budget_min_per_minute + self.budget_ratio * requests
+        used = await self.shared_state.incr_async("retry", _retries_key(policy_name), ttl_seconds=2 * BUDGET_WINDOW_S)
+        if used > allowed:
+            await self.shared_state.incr_async("retry", _retries_key(policy_name), -1.0)
+            self.count(policy_name, "budget_denied")
+            return False
+        self.count(policy_name, "retries")
+        return True
+
+    def count(self, policy_name: str, name: str, amount: float = 1) -> None:
+        counters = self._counters[policy_name]
+        counters[name] = counters.get(name, 0) + amount
+
+    def add_backoff(self, policy_name: str, delay_s: float) -> None:
+        self.count(policy_name, "backoffs")
+        self.count(policy_name, "backoff_ms", delay_s * 1000)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "budget_ratio": self.budget_ratio,
+            "budget_min_per_minute": self.budget_min_per_minute,
+            "policies": {
+                name: {
+                    "ladder": [f"{rung.model or '<request>'}@{rung.temperature}" for rung in policy.ladder],
+                    "max_retries": policy.max_retries,
+                    **{key: round(value, 1) for key, value in self._counters[name].items()},
+                }
+                for name, policy in self.policies.items()
+            },
+        }
+
+
+def parse_ladder(spec: str) -> tuple[RetryRung, ...]:
+    """Parse ``"model@temperature,..."``; raises ValueError on a malformed temperature."""
+    rungs = []
+    for token in spec.split(","):
+        model, _, temperature = token.strip().partition("@")
+        if not model.strip() and not temperature.strip():
+            continue
+        rungs.append(RetryRung(model=model.strip(), temperature=_parse_temperature(temperature, token)))
+    return tuple(rungs)
+
+
+def _parse_temperature(value: str, token: str) -> Optional[float]:
+    if not value.strip():
+        return None
+    try:
+        temperature = float(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid temperature in retry ladder rung {token.strip()!r}") from exc
+    if not math.isfinite(temperature):
+        raise ValueError(f"Invalid temperature in retry ladder rung {token.strip()!r}")
+    return max(0.0, min(2.0, temperature))
+
+
+def _requests_key(policy_name: str) -> str:
+    return window_key(f"{policy_name}:requests", BUDGET_WINDOW_S)
+
+
+def _retries_key(policy_name: str) -> str:
+    return window_key(f"{policy_name}:retries", BUDGET_WINDOW_S)
+
+
+_controller: Optional[RetryController] = None
+
+
+def get_retry_controller() -> RetryController:
+    """Get or create the retry controller with the configured swarm and analysis policies."""
+    global _controller
+    if _controller is None:
+        settings = get_settings()
+        backoff = {
+            "base_delay_s": max(0, settings.retry_base_delay_ms) / 1000.0,
+            "max_delay_s": max(0, settings.retry_max_delay_ms) / 1000.0,
+            "retry_on_quota": settings.retry_on_quota,
+        }
+        swarm_ladder = settings.swarm_retry_ladder or f"{settings.swarm_retry_model or 'gemini-2.0-flash'}@0"
+        _controller = RetryController(
+            policies={
+                "swarm": RetryPolicy.from_spec("swarm", swarm_ladder, settings.swarm_retry_count, **backoff),
+                "analyze": RetryPolicy.from_spec(
+                    "analyze", settings.analysis_retry_ladder, settings.analysis_retry_count, **backoff
+                ),
+            },
+            budget_ratio=settings.retry_budget_ratio,
+            budget_min_per_minute=settings.retry_budget_min_per_minute,
+        )
+    return _controller
@@ -0,0 +1,118 @@
+"""
+Server-Timing instrumentation.
+A middleware opens a per-request timing record in a context variable; code on
+the request path wraps its phases in ``phase(...)`` or reports externally
+measured waits with ``record(...)``, and the collected durations are sent back
+as a standard ``Server-Timing`` header. With the middleware not installed the
+context variable stays unset and every call reduces to one lookup returning a
+shared no-op timer.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+SERVER_TIMING_HEADER = b"server-timing"
+
+
+class PhaseTimings:
+    """Ordered phase durations for one request; repeated names get a numeric suffix."""
+
+    __slots__ = ("started_at", "entries", "_seen")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.entries: list[tuple[str, float, str]] = []
+        self._seen: dict[str, int] = {}
+
+    def add(self, name: str, duration_s: float, description: str = "") -> None:
+        count = self._seen.get(name, 0) + 1
+        self._seen[name] = count
+        if count > 1:
+            name = f"{name}_{count}"
+        self.entries.append((name, max(0.0, duration_s) * 1000, description))
+
+    def header_value(self) -> str:
+        parts = [_format_entry(name, duration_ms, description) for name, duration_ms, description in self.entries]
+        parts.append(_format_entry("total", (time.perf_counter() - self.started_at) * 1000, ""))
+        return ", ".join(parts)
+
+
+class _PhaseTimer:
+    __slots__ = ("timings", "name", "description", "started_at")
+
+    def __init__(self, timings: PhaseTimings, name: str, description: str):
+        self.timings = timings
+        self.name = name
+        self.description = description
+
+    def __enter__(self) -> "_PhaseTimer":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.timings.add(self.name, time.perf_counter() - self.started_at, self.description)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        return None
+
+
+_NOOP_TIMER = _NoopTimer()
+_current: ContextVar[Optional[PhaseTimings]] = ContextVar("server_timing", default=None)
+
+
+def phase(name: str, description: str = ""):
+    """Time the enclosed block as ``name`` when the request is being instrumented."""
+    timings = _current.get()
+    if timings is None:
+        return _NOOP_TIMER
+    return _PhaseTimer(timings, name, description)
+
+
+def record(name: str, duration_s: float, description: str = "") -> None:
+    """Report a duration measured elsewhere (e.g. a queue wait)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, duration_s, description)
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware, so the header is added without buffering the response."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = PhaseTimings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((SERVER_TIMING_HEADER, timings.header_value().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+
+def _format_entry(name: str, duration_ms: float, description: str) -> str:
+    if not description:
+        return f"{name};dur={duration_ms:.2f}"
+    # desc is a quoted-string in a latin-1 header; drop anything that could break it.
+    safe = description.replace("\\", "").replace('"', "'").encode("latin-1", "replace").decode("latin-1")
+    return f'{name};desc="{safe}";dur={duration_ms:.2f}'
@@ -0,0 +1,271 @@
+"""
+Shadow evaluation of candidate models on live traffic.
+A configurable sample of requests is mirrored, after the primary response is
+ready, to a candidate swarm or food-analysis model. Mirrors run as background
+tasks under their own concurrency cap and are skipped (never queued) when that
+cap or the upstream limiter is saturated, so live traffic never waits on them.
+
+Each primary/candidate pair contributes latency, token usage, normalize status
+and agreement to aggregate counters kept in shared state, so the comparison
+covers every worker and can be queried before promoting a candidate.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Optional
+
+from .config import get_settings
+from .directive import HOLD_DIRECTIVE, SwarmDirective
+from .gemini_analyzer import FORCED_HOLD_STATUS, UNCACHEABLE_CATEGORIES
+from .shared_state import get_shared_state
+from .upstream_limiter import get_upstream_limiter
+from .usage_ledger import UsageTally, track_usage
+
+logger = logging.getLogger(__name__)
+
+SHADOW_KEY_ID = "shadow"
+ZONE_FIELDS = ("target_zone", "from_zone", "to_zone", "decoy_zone", "real_target_zone")
+
+
+class ShadowEvaluator:
+    """Mirrors sampled requests to candidate models and aggregates pairwise comparisons."""
+
+    def __init__(self, swarm_model: str, analysis_model: str, sample_rate: float, max_concurrency: int):
+        self.swarm_model = swarm_model.strip()
+        self.analysis_model = analysis_model.strip()
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.shared_state = get_shared_state()
+        self.limiter = get_upstream_limiter()
+        self._tasks: set[asyncio.Task] = set()
+        self._counters = {"mirrored": 0, "skipped_busy": 0, "failed": 0}
+
+    def mirror_swarm(
+        self,
+        analyzer: Any,
+        primary: dict[str, Any],
+        primary_latency_ms: int,
+        primary_usage: UsageTally,
+        **request: Any,
+    ) -> None:
+        """Maybe mirror a swarm request; ``request`` holds the strategize_swarm arguments."""
+        if not self.swarm_model or not self._should_mirror():
+            return
+        self._spawn(self._run_swarm(analyzer, primary, primary_latency_ms, primary_usage, request))
+
+    def mirror_analysis(
+        self,
+        analyzer: Any,
+        primary: dict[str, Any],
+        primary_latency_ms: int,
+        primary_usage: UsageTally,
+        image_bytes: bytes,
+        mime_type: str,
+        image_digest: str,
+    ) -> None:
+        if not self.analysis_model or not self._should_mirror():
+            return
+        self._spawn(
+            self._run_analysis(
+                analyzer,
+                primary,
+                primary_latency_ms,
+                primary_usage,
+                image_bytes,
+                mime_type,
+                image_digest,
+            )
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._counters,
+            "in_flight": len(self._tasks),
+            "sample_rate": self.sample_rate,
+            "swarm_model": self.swarm_model,
+            "analysis_model": self.analysis_model,
+        }
+
+    def report(self) -> dict[str, Any]:
+        """Aggregate comparison per kind and candidate model, across all workers."""
+        report: dict[str, Any] = {}
+        for kind, model in (("swarm", self.swarm_model), ("analysis", self.analysis_model)):
+            if not model:
+                continue
+            totals = _load_totals(self.shared_state.get("shadow", f"{kind}:{model}"))
+            report[kind] = {"candidate_model": model, **_summarize(kind, totals)}
+        return report
+
+    async def reset(self) -> None:
+        for kind, model in (("swarm", self.swarm_model), ("analysis", self.analysis_model)):
+            if model:
+                await self.shared_state.delete_async("shadow", f"{kind}:{model}")
+
+    def _should_mirror(self) -> bool:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        # Mirrors only use spare capacity: skip when our cap or the upstream limiter is full.
+        if len(self._tasks) >= self.max_concurrency or not self.limiter.has_capacity:
+            self._counters["skipped_busy"] += 1
+            return False
+        return True
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro, name="shadow-mirror")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._counters["mirrored"] += 1
+
+    async def _run_swarm(
+        self,
+        analyzer: Any,
+        primary: dict[str, Any],
+        primary_latency_ms: int,
+        primary_usage: UsageTally,
+        request: dict[str, Any],
+    ) -> None:
+        try:
+            with track_usage() as usage:
+                started_at = time.perf_counter()
+                candidate = await analyzer.strategize_swarm(
+                    **request,
+                    model_name=self.swarm_model,
+                    retries=0,
+                    key_id=SHADOW_KEY_ID,
+                )
+                latency_ms = int((time.perf_counter() - started_at) * 1000)
+        except Exception:
+            self._counters["failed"] += 1
+            logger.exception("Shadow swarm call failed (model=%s)", self.swarm_model)
+            return
+
+        primary_directive: SwarmDirective = primary.get("directive") or HOLD_DIRECTIVE
+        candidate_directive: SwarmDirective = candidate.get("directive") or HOLD_DIRECTIVE
+        pair = {
+            "pairs": 1,
+            "primary_latency_ms": primary_latency_ms,
+            "candidate_latency_ms": latency_ms,
+            "primary_tokens": primary_usage.total_tokens,
+            "candidate_tokens": usage.total_tokens,
+            "candidate_thoughts_tokens": usage.thoughts_tokens,
+            "candidate_valid": int(candidate.get("normalize_status") != FORCED_HOLD_STATUS),
+            "order_agree": int(primary_directive.order is candidate_directive.order),
+            "zones_agree": int(_zones(primary_directive) == _zones(candidate_directive)),
+            f"status:{candidate.get('normalize_status', 'unknown')}": 1,
+        }
+        await self._accumulate("swarm", self.swarm_model, pair)
+
+    async def _run_analysis(
+        self,
+        analyzer: Any,
+        primary: dict[str, Any],
+        primary_latency_ms: int,
+        primary_usage: UsageTally,
+        image_bytes: bytes,
+        mime_type: str,
+        image_digest: str,
+    ) -> None:
+        try:
+            with track_usage() as usage:
+                started_at = time.perf_counter()
+                candidate = await analyzer.analyze_image(
+                    image_bytes,
+                    mime_type,
+                    image_digest=image_digest,
+                    use_cache=False,
+                    model_name=self.analysis_model,
+                    key_id=SHADOW_KEY_ID,
+                )
+                latency_ms = int((time.perf_counter() - started_at) * 1000)
+        except Exception:
+            self._counters["failed"] += 1
+            logger.exception("Shadow analysis call failed (model=%s)", self.analysis_model)
+            return
+
+        status = candidate["category"] if candidate["category"] in UNCACHEABLE_CATEGORIES else "ok"
+        pair = {
+            "pairs": 1,
+            "primary_latency_ms": primary_latency_ms,
+            "candidate_latency_ms": latency_ms,
+            "primary_tokens": primary_usage.total_tokens,
+            "candidate_tokens": usage.total_tokens,
+            "candidate_thoughts_tokens": usage.thoughts_tokens,
+            "candidate_valid": int(status == "ok"),
+            "category_agree": int(candidate["category"] == primary["category"]),
+            "abs_score_delta": abs(float(candidate["score"]) - float(primary["score"])),
+            f"status:{status}": 1,
+        }
+        await self._accumulate("analysis", self.analysis_model, pair)
+
+    async def _accumulate(self, kind: str, model: str, pair: dict[str, float]) -> None:
+        def _apply(raw: Optional[str]) -> Optional[str]:
+            totals = _load_totals(raw)
+            for name, value in pair.items():
+                totals[name] = totals.get(name, 0) + value
+            return json.dumps(totals, separators=(",", ":"))
+
+        await self.shared_state.update_async("shadow", f"{kind}:{model}", _apply)
+
+
+def _zones(directive: SwarmDirective) -> tuple[str, ...]:
+    return tuple(getattr(directive, name) for name in ZONE_FIELDS)
+
+
+def _load_totals(raw: Optional[str]) -> dict[str, float]:
+    if not raw:
+        return {}
+    try:
+        totals = json.loads(raw)
+    except json.JSONDecodeError:
+        return {}
+    return totals if isinstance(totals, dict) else {}
+
+
+def _summarize(kind: str, totals: dict[str, float]) -> dict[str, Any]:
+    pairs = totals.get("pairs", 0)
+    if not pairs:
+        return {"pairs": 0}
+
+    def rate(name: str) -> float:
+        return round(totals.get(name, 0) / pairs, 4)
+
+    summary: dict[str, Any] = {
+        "pairs": int(pairs),
+        "avg_primary_latency_ms": round(totals.get("primary_latency_ms", 0) / pairs, 1),
+        "avg_candidate_latency_ms": round(totals.get("candidate_latency_ms", 0) / pairs, 1),
+        "avg_primary_tokens": round(totals.get("primary_tokens", 0) / pairs, 1),
+        "avg_candidate_tokens": round(totals.get("candidate_tokens", 0) / pairs, 1),
+        "avg_candidate_thoughts_tokens": round(totals.get("candidate_thoughts_tokens", 0) / pairs, 1),
+        "candidate_valid_rate": rate("candidate_valid"),
+        "candidate_statuses": {
+            name.split(":", 1)[1]: int(value) for name, value in totals.items() if name.startswith("status:")
+        },
+    }
+    if kind == "swarm":
+        summary.update(order_agreement=rate("order_agree"), zone_agreement=rate("zones_agree"))
+    else:
+        summary.update(category_agreement=rate("category_agree"), mean_abs_score_delta=rate("abs_score_delta"))
+    return summary
+
+
+_evaluator: Optional[ShadowEvaluator] = None
+
+
+def get_shadow_evaluator() -> Optional[ShadowEvaluator]:
+    """Get or create the shadow evaluator; None when shadow mode is off."""
+    global _evaluator
+    settings = get_settings()
+    if not settings.shadow_enabled:
+        return None
+
+    if _evaluator is None:
+        _evaluator = ShadowEvaluator(
+            swarm_model=settings.shadow_swarm_model,
+            analysis_model=settings.shadow_analysis_model,
+            sample_rate=settings.shadow_sample_rate,
+            max_concurrency=settings.shadow_max_concurrency,
+        )
+    return _evaluator
@@ -0,0 +1,380 @@
+"""
+Process-shared state for multi-worker serving.
+Result caches, circuit-breaker state and budget counters live behind a small
+key/value interface so every uvicorn/gunicorn worker on an instance sees the
+same values. Single-worker deployments use an in-memory backend; multi-worker
+deployments use a local SQLite file (WAL mode, IMMEDIATE transactions for
+atomic read-modify-write).
+
+Code on the event loop writes through the ``*_async`` methods: a SQLite write
+can wait on another worker's lock (up to busy_timeout), so those run on the
+executor thread pool instead of stalling every request on the worker.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from .config import get_settings
+from .executors import get_executors
+
+logger = logging.getLogger(__name__)
+
+UpdateFn = Callable[[Optional[str]], Optional[str]]
+
+
+class _AsyncWrites:
+    """Awaitable writes for event-loop callers; blocking backends run them on the thread pool."""
+
+    blocking_writes = False
+
+    async def set_async(self, namespace: str, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        await self._write(self.set, namespace, key, value, ttl_seconds)
+
+    async def delete_async(self, namespace: str, key: str) -> None:
+        await self._write(self.delete, namespace, key)
+
+    async def incr_async(
+        self,
+        namespace: str,
+        key: str,
+        amount: float = 1.0,
+        ttl_seconds: Optional[float] = None,
+    ) -> float:
+        return await self._write(self.incr, namespace, key, amount, ttl_seconds)
+
+    async def delete_if_equal_async(self, namespace: str, key: str, value: str) -> bool:
+        return await self._write(self.delete_if_equal, namespace, key, value)
+
+    async def update_async(
+        self,
+        namespace: str,
+        key: str,
+        fn: UpdateFn,
+        ttl_seconds: Optional[float] = None,
+    ) -> Optional[str]:
+        return await self._write(self.update, namespace, key, fn, ttl_seconds)
+
+    async def _write(self, method: Callable[..., Any], *args: Any) -> Any:
+        if not self.blocking_writes:
+            return method(*args)
+        return await get_executors().run_thread(method, *args)
+
+
+class MemorySharedState(_AsyncWrites):
+    """In-process backend used when only a single worker is running."""
+
+    backend_name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, str], tuple[str, Optional[float]]] = {}
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._get_locked(namespace, key)
+
+    def set(self, namespace: str, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[(namespace, key)] = (value, _expires_at(ttl_seconds))
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._values.pop((namespace, key), None)
+
+    def delete_if_equal(self, namespace: str, key: str, value: str) -> bool:
+        """Delete ``key`` only while it still holds ``value`` (e.g. a lock token); True if deleted."""
+        with self._lock:
+            if self._get_locked(namespace, key) != value:
+                return False
+            del self._values[(namespace, key)]
+            return True
+
+    def incr(self, namespace: str, key: str, amount: float = 1.0, ttl_seconds: Optional[float] = None) -> float:
+        with self._lock:
+            current = self._get_locked(namespace, key)
+            existing = self._values.get((namespace, key))
+            value = _to_float(current) + float(amount)
+            # Keep the original expiry so fixed-window counters roll over on schedule.
+            expires_at = existing[1] if existing is not None and current is not None else _expires_at(ttl_seconds)
+            self._values[(namespace, key)] = (_format_number(value), expires_at)
+            return value
+
+    def update(self, namespace: str, key: str, fn: UpdateFn, ttl_seconds: Optional[float] = None) -> Optional[str]:
+        with self._lock:
+            new_value = fn(self._get_locked(namespace, key))
+            if new_value is None:
+                self._values.pop((namespace, key), None)
+            else:
+                self._values[(namespace, key)] = (new_value, _expires_at(ttl_seconds))
+            return new_value
+
+    def _get_locked(self, namespace: str, key: str) -> Optional[str]:
+        entry = self._values.get((namespace, key))
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._values.pop((namespace, key), None)
+            return None
+        return value
+
+
+class SQLiteSharedState(_AsyncWrites):
+    """Cross-process backend stored in a local SQLite file shared by all workers."""
+
+    backend_name = "sqlite"
+    blocking_writes = True
+    _PURGE_EVERY_WRITES = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_count = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_kv ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " PRIMARY KEY (namespace, key)"
+            ") WITHOUT ROWID"
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM shared_kv WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return value
+
+    def set(self, namespace: str, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, _expires_at(ttl_seconds)),
+            )
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM shared_kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def delete_if_equal(self, namespace: str, key: str, value: str) -> bool:
+        """Delete ``key`` only while it still holds ``value`` (e.g. a lock token); True if deleted."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM shared_kv WHERE namespace = ? AND key = ? AND value = ?"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, value, time.time()),
+            )
+            return cursor.rowcount > 0
+
+    def incr(self, namespace: str, key: str, amount: float = 1.0, ttl_seconds: Optional[float] = None) -> float:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM shared_kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+
+            now = time.time()
+            if row is None or (row[1] is not None and row[1] <= now):
+                value = float(amount)
+                expires_at = _expires_at(ttl_seconds)
+            else:
+                value = _to_float(row[0]) + float(amount)
+                expires_at = row[1]
+
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, _format_number(value), expires_at),
+            )
+            return value
+
+    def update(self, namespace: str, key: str, fn: UpdateFn, ttl_seconds: Optional[float] = None) -> Optional[str]:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM shared_kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+
+            current: Optional[str] = None
+            if row is not None and (row[1] is None or row[1] > time.time()):
+                current = row[0]
+
+            new_value = fn(current)
+            if new_value is None:
+                conn.execute("DELETE FROM shared_kv WHERE namespace = ? AND key = ?", (namespace, key))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO shared_kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, new_value, _expires_at(ttl_seconds)),
+                )
+            return new_value
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE.
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self) -> "_ImmediateTransaction":
+        self._write_count += 1
+        if self._write_count % self._PURGE_EVERY_WRITES == 0:
+            self._purge_expired()
+        return _ImmediateTransaction(self._connection())
+
+    def _purge_expired(self) -> None:
+        try:
+            self._connection().execute(
+                "DELETE FROM shared_kv WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),),
+            )
+        except sqlite3.Error:
+            logger.debug("Failed to purge expired shared state rows", exc_info=True)
+
+
+class _ImmediateTransaction:
+    """Holds the SQLite write lock for the duration of a read-modify-write."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+SharedState = MemorySharedState | SQLiteSharedState
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker whose state is shared across workers.
+
+    After ``failure_threshold`` consecutive failures the breaker opens for
+    ``reset_seconds``. Once that window elapses calls are let through again;
+    a single further failure re-opens it immediately (half-open behaviour).
+    """
+
+    def __init__(self, store: SharedState, name: str, failure_threshold: int, reset_seconds: float):
+        self.store = store
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = max(0.0, float(reset_seconds))
+
+    def allow(self) -> bool:
+        state = _load_breaker_state(self.store.get("breaker", self.name))
+        return state["opened_until"] <= time.time()
+
+    async def record_success(self) -> None:
+        # Reads are cheap; only take the write lock when there is state to clear.
+        if self.store.get("breaker", self.name) is not None:
+            await self.store.delete_async("breaker", self.name)
+
+    async def record_failure(self) -> None:
+        def _apply(raw: Optional[str]) -> Optional[str]:
+            state = _load_breaker_state(raw)
+            now = time.time()
+            state["failures"] += 1
+            half_open = 0 < state["opened_until"] <= now
+            if state["failures"] >= self.failure_threshold or half_open:
+                state["opened_until"] = now + self.reset_seconds
+            return json.dumps(state, separators=(",", ":"))
+
+        state = _load_breaker_state(await self.store.update_async("breaker", self.name, _apply))
+        if state["opened_until"] > time.time():
+            logger.warning(
+                "Circuit breaker %s open for %.1fs after %s consecutive failures",
+                self.name,
+                self.reset_seconds,
+                state["failures"],
+            )
+
+
+def window_key(key: str, window_seconds: float) -> str:
+    """Return a fixed-window bucket key (e.g. per-minute budget counters)."""
+    window = max(1, int(window_seconds))
+    return f"{key}:{int(time.time() // window)}"
+
+
+def _load_breaker_state(raw: Optional[str]) -> dict:
+    state = {"failures": 0, "opened_until": 0.0}
+    if not raw:
+        return state
+
+    try:
+        parsed = json.loads(raw)
+        state["failures"] = int(parsed.get("failures", 0))
+        state["opened_until"] = float(parsed.get("opened_until", 0.0))
+    except (TypeError, ValueError, AttributeError):
+        logger.debug("Discarding malformed breaker state: %r", raw)
+    return state
+
+
+def _expires_at(ttl_seconds: Optional[float]) -> Optional[float]:
+    if ttl_seconds is None or ttl_seconds <= 0:
+        return None
+    return time.time() + float(ttl_seconds)
+
+
+def _to_float(value: Optional[str]) -> float:
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value))
+
+
+_shared_state: Optional[SharedState] = None
+
+
+def get_shared_state() -> SharedState:
+    """Get or create the shared state backend for this worker process."""
+    global _shared_state
+    if _shared_state is None:
+        settings = get_settings()
+        backend = settings.shared_state_backend.strip().lower()
+        if backend == "auto":
+            backend = "sqlite" if settings.workers > 1 else "memory"
+
+        if backend == "sqlite":
+            _shared_state = SQLiteSharedState(settings.shared_state_path)
+        else:
+            _shared_state = MemorySharedState()
+
+        logger.info(
+            "Shared state initialized (backend=%s, workers=%s, pid=%s)",
+            _shared_state.backend_name,
+            settings.workers,
+            os.getpid(),
+        )
+    return _shared_state
@@ -0,0 +1,219 @@
+"""
+Micro-batching for concurrent swarm decisions.
+At peak many matches ask for a directive within the same few milliseconds and
+with the same system prompt. Requests that share the system prompt, model,
+sampling settings and API key are held for a short window and sent as one
+multi-snapshot call whose schema returns one directive per request id. Each
+directive is then validated like a single call's; items that come back missing
+or invalid fall back to a regular single call.
+
+A window that closes with one request just makes the single call, so the cost
+of batching at low traffic is the window itself. /metrics reports the batching
+factor (requests per upstream round trip) and the queueing delay added.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from .config import get_settings
+from .server_timing import record
+from .usage_ledger import TOKEN_FIELDS, TokenUsage, UsageTally, tally_usage, track_usage
+
+logger = logging.getLogger(__name__)
+
+BatchKey = tuple[str, str, float, int, str]
+
+
+@dataclass(slots=True)
+class _PendingSwarm:
+    request_id: str
+    snapshot_json: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    queue_wait_s: float = 0.0
+
+
+@dataclass(slots=True)
+class _OpenBatch:
+    items: list[_PendingSwarm] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class SwarmBatcher:
+    """Collects concurrent swarm requests into multi-snapshot calls."""
+
+    def __init__(self, window_ms: int, max_batch_size: int):
+        self.window_s = max(1, int(window_ms)) / 1000.0
+        self.max_batch_size = max(2, int(max_batch_size))
+        self._open: dict[BatchKey, _OpenBatch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._counters = {
+            "requests": 0,
+            "batches": 0,
+            "batched_requests": 0,
+            "single_calls": 0,
+            "fallbacks": 0,
+            "batch_errors": 0,
+        }
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+
+    async def strategize(
+        self,
+        analyzer: Any,
+        system_prompt: str,
+        snapshot_json: str,
+        model_name: str,
+        max_tokens: int,
+        temperature: float,
+        key_id: str,
+    ) -> dict:
+        """Queue one request into the open batch for its settings and wait for its directive."""
+        self._counters["requests"] += 1
+        batch_key: BatchKey = (system_prompt, model_name, float(temperature), int(max_tokens), key_id)
+        pending = _PendingSwarm(uuid.uuid4().hex[:8], snapshot_json, asyncio.get_running_loop().create_future())
+
+        batch = self._open.get(batch_key)
+        if batch is None:
+            batch = self._open[batch_key] = _OpenBatch()
+            # Flushes run in a fresh context so one waiter's usage and Server-Timing
+            # are not charged with the whole batch.
+            batch.timer = asyncio.get_running_loop().call_later(
+                self.window_s, self._start_flush, analyzer, batch_key, context=contextvars.Context()
+            )
+        batch.items.append(pending)
+        if len(batch.items) >= self.max_batch_size:
+            batch.timer.cancel()
+            asyncio.get_running_loop().call_soon(
+                self._start_flush, analyzer, batch_key, context=contextvars.Context()
+            )
+
+        result, usage = await pending.future
+        record("batch_queue", pending.queue_wait_s, f"{result.get('batch_size', 1)} per call")
+        # Attribute this request's share of the upstream tokens to the caller's tally.
+        tally_usage(usage)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        requests = self._counters["requests"]
+        round_trips = self._counters["batches"] + self._counters["single_calls"] + self._counters["fallbacks"]
+        return {
+            "window_ms": round(self.window_s * 1000),
+            "max_batch_size": self.max_batch_size,
+            **self._counters,
+            "open_batches": len(self._open),
+            "batching_factor": round(requests / round_trips, 3) if round_trips else 0.0,
+            "avg_batch_size": (
+                round(self._counters["batched_requests"] / self._counters["batches"], 2)
+                if self._counters["batches"]
+                else 0.0
+            ),
+            "avg_queue_delay_ms": round(self._wait_total_s / requests * 1000, 1) if requests else 0.0,
+            "max_queue_delay_ms": round(self._wait_max_s * 1000, 1),
+        }
+
+    def _start_flush(self, analyzer: Any, batch_key: BatchKey) -> None:
+        batch = self._open.pop(batch_key, None)
+        if batch is None:
+            # Already flushed by the size trigger.
+            return
+        task = asyncio.create_task(self._flush(analyzer, batch_key, batch.items), name="swarm-batch")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, analyzer: Any, batch_key: BatchKey, items: list[_PendingSwarm]) -> None:
+        system_prompt, model_name, temperature, max_tokens, key_id = batch_key
+        flushed_at = time.perf_counter()
+        for item in items:
+            wait_s = item.queue_wait_s = flushed_at - item.enqueued_at
+            self._wait_total_s += wait_s
+            self._wait_max_s = max(self._wait_max_s, wait_s)
+        request = {
+            "system_prompt": system_prompt,
+            "model_name": model_name,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "key_id": key_id,
+        }
+
+        if len(items) == 1:
+            self._counters["single_calls"] += 1
+            await self._single(analyzer, request, items[0])
+            return
+
+        self._counters["batches"] += 1
+        self._counters["batched_requests"] += len(items)
+        leftovers = [(item, None) for item in items]
+        try:
+            with track_usage() as usage:
+                directives = await analyzer.strategize_swarm_batch(
+                    snapshots=[(item.request_id, item.snapshot_json) for item in items], **request
+                )
+        except Exception:
+            self._counters["batch_errors"] += 1
+            logger.exception("Swarm batch of %s failed; falling back to single calls", len(items))
+        else:
+            shares = _split_usage(usage, len(items))
+            leftovers = []
+            for item, share in zip(items, shares):
+                raw_text = directives.get(item.request_id)
+                result = analyzer.swarm_batch_result(raw_text, item.snapshot_json, model_name) if raw_text else None
+                if result is None:
+                    leftovers.append((item, share))
+                elif not item.future.done():
+                    item.future.set_result(({**result, "batch_size": len(items)}, share))
+
+        self._counters["fallbacks"] += len(leftovers)
+        await asyncio.gather(*(self._single(analyzer, request, item, share) for item, share in leftovers))
+
+    async def _single(
+        self,
+        analyzer: Any,
+        request: dict[str, Any],
+        item: _PendingSwarm,
+        batch_share: Optional[TokenUsage] = None,
+    ) -> None:
+        try:
+            with track_usage() as usage:
+                if batch_share is not None:
+                    # A fallback still spent its share of the batch call; charge it with the retry.
+                    usage.add(batch_share)
+                result = await analyzer.strategize_swarm(snapshot_json=item.snapshot_json, **request)
+        except Exception as exc:
+            if not item.future.done():
+                item.future.set_exception(exc)
+            return
+        if not item.future.done():
+            item.future.set_result((result, _split_usage(usage, 1)[0]))
+
+
+def _split_usage(tally: UsageTally, parts: int) -> list[TokenUsage]:
+    """Split a batch's tokens into ``parts`` shares; the first carries the remainder so they sum exactly."""
+    splits = {name: divmod(getattr(tally, name), parts) for name in TOKEN_FIELDS}
+    return [
+        TokenUsage(**{name: share + (remainder if index == 0 else 0) for name, (share, remainder) in splits.items()})
+        for index in range(parts)
+    ]
+
+
+_batcher: Optional[SwarmBatcher] = None
+
+
+def get_swarm_batcher() -> Optional[SwarmBatcher]:
+    """Get or create the swarm batcher; None when micro-batching is off."""
+    global _batcher
+    settings = get_settings()
+    if not settings.swarm_batching_enabled:
+        return None
+
+    if _batcher is None:
+        _batcher = SwarmBatcher(
+            window_ms=settings.swarm_batch_window_ms,
+            max_batch_size=settings.swarm_batch_max_size,
+        )
+    return _batcher
@@ -0,0 +1,307 @@
+"""
+Swarm model benchmark over a stored snapshot corpus.
+Runs every BattlefieldSnapshot in the corpus through strategize_swarm for each
+combination of models, temperatures, max_tokens and schema modes, and reports
+per combination: p50/p95 latency, thought-token share, model_valid and
+forced-hold rates, MAX_TOKENS frequency and non-thinking rescue frequency.
+Time to first token is measured with an extra streamed call when --ttft is
+set against live Vertex.
+
+Each call gets a single attempt, so a case's numbers are its own model's and
+never the retry ladder's fallback model. --retries N measures the served
+behaviour instead (latency and validity then include fallback attempts; the
+first-attempt and rescue columns only mean something in that mode).
+
+Runs against live Vertex by default. With --recording-mode record it also
+saves every response, and with --recording-mode replay it runs fully offline
+from those recordings (the matrix must match what was recorded).
+
+Usage (from Backend/):
+    python -m app.swarm_bench corpus/ --system-prompt-file prompt.txt \\
+        --models gemini-3-flash,gemini-2.0-flash --temperatures 0.2,0.7 \\
+        --max-tokens 300,1024 --schema-modes schema,no_schema --repeat 3
+
+Corpus: a directory of snapshot *.json files, or a JSONL file whose lines hold
+"snapshot" (object) or "snapshot_json" (string) and optionally "system_prompt".
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_MODES = {"schema": True, "no_schema": False}
+
+
+@dataclass(frozen=True, slots=True)
+class BenchCase:
+    model: str
+    temperature: float
+    max_tokens: int
+    schema_mode: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.model} t={self.temperature:g} max={self.max_tokens} {self.schema_mode}"
+
+
+@dataclass(frozen=True, slots=True)
+class CorpusEntry:
+    name: str
+    system_prompt: str
+    snapshot_json: str
+
+
+@dataclass
+class CaseResults:
+    latencies_ms: list[float] = field(default_factory=list)
+    ttfts_ms: list[float] = field(default_factory=list)
+    thoughts_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    valid: int = 0
+    first_attempt_valid: int = 0
+    forced_holds: int = 0
+    max_tokens_calls: int = 0
+    rescues: int = 0
+    errors: int = 0
+
+    @property
+    def runs(self) -> int:
+        return len(self.latencies_ms) + self.errors
+
+
+def load_corpus(source: str, default_system_prompt: str) -> list[CorpusEntry]:
+    entries: list[CorpusEntry] = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".json"):
+                with open(os.path.join(source, name), encoding="utf-8") as handle:
+                    snapshot = json.load(handle)
+                entries.append(CorpusEntry(name, default_system_prompt, json.dumps(snapshot, separators=(",", ":"))))
+    else:
+        with open(source, encoding="utf-8") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                snapshot_json = row.get("snapshot_json")
+                if snapshot_json is None:
+                    snapshot_json = json.dumps(row.get("snapshot", {}), separators=(",", ":"))
+                system_prompt = row.get("system_prompt") or default_system_prompt
+                entries.append(CorpusEntry(str(row.get("name") or line_number), system_prompt, snapshot_json))
+
+    missing = [entry.name for entry in entries if not entry.system_prompt]
+    if missing:
+        raise SystemExit(f"No system prompt for {len(missing)} snapshots (e.g. {missing[0]}); use --system-prompt-file")
+    return entries
+
+
+def build_matrix(args: argparse.Namespace) -> Iterator[BenchCase]:
+    for model, temperature, max_tokens, schema_mode in itertools.product(
+        _split(args.models),
+        [float(value) for value in _split(args.temperatures)],
+        [int(value) for value in _split(args.max_tokens)],
+        _split(args.schema_modes),
+    ):
+        if schema_mode not in SCHEMA_MODES:
+            raise SystemExit(f"Unknown schema mode {schema_mode!r}; use {sorted(SCHEMA_MODES)}")
+        yield BenchCase(model, temperature, max_tokens, schema_mode)
+
+
+async def run_case(
+    analyzer: Any,
+    case: BenchCase,
+    corpus: list[CorpusEntry],
+    repeat: int,
+    concurrency: int,
+    measure_ttft: bool,
+    retries: int = 0,
+) -> CaseResults:
+    from .gemini_analyzer import FORCED_HOLD_STATUS
+    from .usage_ledger import track_usage
+
+    results = CaseResults()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    use_schema = SCHEMA_MODES[case.schema_mode]
+
+    async def one(entry: CorpusEntry) -> None:
+        async with semaphore:
+            try:
+                with track_usage() as usage:
+                    started_at = time.perf_counter()
+                    result = await analyzer.strategize_swarm(
+                        system_prompt=entry.system_prompt,
+                        snapshot_json=entry.snapshot_json,
+                        model_name=case.model,
+                        max_tokens=case.max_tokens,
+                        temperature=case.temperature,
+                        retries=retries,
+                        use_schema=use_schema,
+                    )
+                    results.latencies_ms.append((time.perf_counter() - started_at) * 1000)
+            except Exception:
+                results.errors += 1
+                logger.exception("Benchmark call failed (%s, %s)", case.label, entry.name)
+                return
+
+            results.thoughts_tokens += usage.thoughts_tokens
+            results.output_tokens += usage.thoughts_tokens + usage.candidates_tokens
+            results.total_tokens += usage.total_tokens
+            valid = result.get("normalize_status") != FORCED_HOLD_STATUS
+            results.valid += valid
+            results.forced_holds += not valid
+            results.first_attempt_valid += valid and result.get("attempt_count") == 1
+            results.max_tokens_calls += result.get("max_tokens_hits", 0) > 0
+            results.rescues += bool(result.get("rescued"))
+
+            if measure_ttft:
+                try:
+                    ttft_s = await analyzer.measure_swarm_ttft(
+                        case.model,
+                        entry.system_prompt,
+                        entry.snapshot_json,
+                        case.temperature,
+                        case.max_tokens,
+                        use_schema=use_schema,
+                    )
+                    results.ttfts_ms.append(ttft_s * 1000)
+                except Exception:
+                    logger.exception("TTFT probe failed (%s, %s)", case.label, entry.name)
+
+    await asyncio.gather(*(one(entry) for _ in range(max(1, repeat)) for entry in corpus))
+    return results
+
+
+def summarize(case: BenchCase, results: CaseResults) -> dict[str, Any]:
+    runs = max(1, results.runs)
+    ok = max(1, len(results.latencies_ms))
+    return {
+        "case": case.label,
+        "model": case.model,
+        "temperature": case.temperature,
+        "max_tokens": case.max_tokens,
+        "schema_mode": case.schema_mode,
+        "runs": results.runs,
+        "errors": results.errors,
+        "latency_p50_ms": _percentile(results.latencies_ms, 0.50),
+        "latency_p95_ms": _percentile(results.latencies_ms, 0.95),
+        "ttft_p50_ms": _percentile(results.ttfts_ms, 0.50) if results.ttfts_ms else None,
+        "ttft_p95_ms": _percentile(results.ttfts_ms, 0.95) if results.ttfts_ms else None,
+        "thought_share": round(results.thoughts_tokens / results.output_tokens, 4) if results.output_tokens else 0.0,
+        "avg_total_tokens": round(results.total_tokens / ok, 1),
+        "model_valid_rate": round(results.valid / runs, 4),
+        "first_attempt_valid_rate": round(results.first_attempt_valid / runs, 4),
+        "forced_hold_rate": round(results.forced_holds / runs, 4),
+        "max_tokens_rate": round(results.max_tokens_calls / runs, 4),
+        "rescue_rate": round(results.rescues / runs, 4),
+    }
+
+
+def print_table(rows: list[dict[str, Any]]) -> None:
+    header = (
+        f"{'case':<48} {'n':>4} {'p50ms':>8} {'p95ms':>8} {'ttft50':>7} {'think%':>7} "
+        f"{'valid%':>7} {'1st%':>6} {'hold%':>6} {'maxtok%':>8} {'rescue%':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        ttft = f"{row['ttft_p50_ms']:.0f}" if row["ttft_p50_ms"] is not None else "-"
+        print(
+            f"{row['case'][:48]:<48} {row['runs']:>4} {row['latency_p50_ms']:>8.0f} {row['latency_p95_ms']:>8.0f} "
+            f"{ttft:>7} {row['thought_share'] * 100:>6.1f}% {row['model_valid_rate'] * 100:>6.1f}% {row['first_attempt_valid_rate'] * 100:>5.1f}% "
+            f"{row['forced_hold_rate'] * 100:>5.1f}% {row['max_tokens_rate'] * 100:>7.1f}% {row['rescue_rate'] * 100:>7.1f}%"
+        )
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return round(values[0], 1)
+    return round(statistics.quantiles(values, n=100, method="inclusive")[int(fraction * 100) - 1], 1)
+
+
+def _split(value: str) -> list[str]:
+    return [token.strip() for token in value.split(",") if token.strip()]
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    # Imported late so --recording-mode/--recording-dir reach the settings first.
+    from .executors import shutdown_executors
+    from .gemini_analyzer import get_analyzer
+    from .usage_ledger import get_usage_ledger
+
+    default_prompt = ""
+    if args.system_prompt_file:
+        with open(args.system_prompt_file, encoding="utf-8") as handle:
+            default_prompt = handle.read()
+    corpus = load_corpus(args.corpus, default_prompt)
+    analyzer = get_analyzer()
+
+    measure_ttft = args.ttft
+    if measure_ttft and analyzer.transport.mode == "replay":
+        logger.warning("TTFT needs live streaming calls; skipping it in replay mode")
+        measure_ttft = False
+
+    rows = []
+    try:
+        for case in build_matrix(args):
+            logger.info("Running %s over %s snapshots x%s", case.label, len(corpus), args.repeat)
+            results = await run_case(
+                analyzer, case, corpus, args.repeat, args.concurrency, measure_ttft, args.retries
+            )
+            rows.append(summarize(case, results))
+    finally:
+        usage_ledger = get_usage_ledger()
+        if usage_ledger is not None:
+            await usage_ledger.flush()
+        shutdown_executors()
+
+    print_table(rows)
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as handle:
+            json.dump(rows, handle, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.swarm_bench",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("corpus", help="directory of snapshot JSON files or a JSONL corpus")
+    parser.add_argument("--system-prompt-file", default="", help="system prompt for snapshots without their own")
+    parser.add_argument("--models", default="gemini-3-flash,gemini-2.0-flash")
+    parser.add_argument("--temperatures", default="0.7")
+    parser.add_argument("--max-tokens", default="300")
+    parser.add_argument("--schema-modes", default="schema", help="comma-separated: schema, no_schema")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1, help="1 keeps latencies free of self-contention")
+    parser.add_argument("--retries", type=int, default=0, help="retry attempts per call (default: none)")
+    parser.add_argument("--ttft", action="store_true", help="also measure time to first token (live only)")
+    parser.add_argument("--recording-mode", choices=("passthrough", "record", "replay"), default="")
+    parser.add_argument("--recording-dir", default="")
+    parser.add_argument("--json-output", default="", help="write per-case results as JSON")
+    args = parser.parse_args()
+
+    if args.recording_mode:
+        os.environ["ARETE_UPSTREAM_RECORDING_MODE"] = args.recording_mode
+    if args.recording_dir:
+        os.environ["ARETE_UPSTREAM_RECORDING_DIR"] = args.recording_dir
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
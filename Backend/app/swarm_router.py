@@ -0,0 +1,188 @@
+"""
+Complexity-based model routing for swarm decisions.
+Most battlefield snapshots are quiet: the AI holds its zones, nothing is being
+captured and the right answer is obvious. Those go to a fast non-thinking
+model; the thinking-class swarm model (and its larger token floor) is kept for
+contested states. A snapshot's complexity is a weighted score in [0, 1] built
+from contested zones, capture progress, player-held zones, player health and
+reinforcement availability.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each factor; they sum to 1 so the score stays in [0, 1].
+FACTOR_WEIGHTS = {
+    "contested_zones": 0.35,
+    "capture_progress": 0.25,
+    "player_zones": 0.20,
+    "player_health": 0.10,
+    "reinforcements": 0.10,
+}
+# Two zones mid-capture is already as hard as it gets for the contested factor.
+CONTESTED_ZONES_SATURATION = 2
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotComplexity:
+    score: float
+    factors: dict[str, float]
+
+
+@dataclass(frozen=True, slots=True)
+class RouteDecision:
+    model: str
+    tier: str
+    score: float
+
+
+def score_snapshot(snapshot: Optional[dict[str, Any]], contested_progress: float) -> SnapshotComplexity:
+    """Score a BattlefieldSnapshot; anything unreadable scores as maximally complex."""
+    if not isinstance(snapshot, dict):
+        return SnapshotComplexity(score=1.0, factors={})
+
+    zones = [zone for zone in snapshot.get("zones") or [] if isinstance(zone, dict)]
+    player = snapshot.get("player") if isinstance(snapshot.get("player"), dict) else {}
+    resources = snapshot.get("ai_resources") if isinstance(snapshot.get("ai_resources"), dict) else {}
+
+    progress = [_unit(zone.get("capture_progress")) for zone in zones]
+    in_progress = [value for value in progress if contested_progress <= value < 1.0]
+    player_zones = sum(1 for zone in zones if str(zone.get("owner", "")).lower() == "player")
+
+    squads = _number(resources.get("reinforcement_squads_available"))
+    cooldown = _number(resources.get("reinforcement_cooldown_seconds"))
+    if squads > 0 and cooldown <= 0:
+        reinforcements = 1.0
+    elif squads > 0:
+        reinforcements = 0.5
+    else:
+        reinforcements = 0.0
+
+    factors = {
+        "contested_zones": min(1.0, len(in_progress) / CONTESTED_ZONES_SATURATION),
+        "capture_progress": max(in_progress, default=0.0),
+        "player_zones": player_zones / len(zones) if zones else 0.0,
+        "player_health": _unit(player.get("health_percent")),
+        "reinforcements": reinforcements,
+    }
+    score = sum(FACTOR_WEIGHTS[name] * value for name, value in factors.items())
+    return SnapshotComplexity(score=round(min(1.0, score), 4), factors=factors)
+
+
+class SwarmModelRouter:
+    """Chooses the swarm model per request and counts the resulting split."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        fast_model: str,
+        complex_model: str,
+        threshold: float,
+        contested_progress: float,
+        default_models: tuple[str, ...] = (),
+    ):
+        self.enabled = enabled and bool(fast_model.strip())
+        self.fast_model = fast_model.strip()
+        self.complex_model = complex_model.strip()
+        self.threshold = float(threshold)
+        self.contested_progress = max(0.0, float(contested_progress))
+        # Models a client sends when the player hasn't picked one; these mean "no preference".
+        self.default_models = frozenset(
+            model for model in (self.complex_model, *(name.strip() for name in default_models)) if model
+        )
+        self._counters = {"fast": 0, "complex": 0, "override": 0, "disabled": 0}
+        self._score_total = 0.0
+        self._scored = 0
+
+    def route(
+        self,
+        snapshot: Union[dict[str, Any], str, None],
+        requested_model: Optional[str] = None,
+    ) -> RouteDecision:
+        if requested_model and requested_model not in self.default_models:
+            # An explicit model from the client always wins.
+            self._counters["override"] += 1
+            return RouteDecision(model=requested_model, tier="override", score=-1.0)
+
+        if not self.enabled:
+            self._counters["disabled"] += 1
+            return RouteDecision(model=self.complex_model, tier="disabled", score=-1.0)
+
+        if isinstance(snapshot, str):
+            try:
+                snapshot = json.loads(snapshot)
+            except json.JSONDecodeError:
+                snapshot = None
+
+        complexity = score_snapshot(snapshot, self.contested_progress)
+        self._score_total += complexity.score
+        self._scored += 1
+
+        if complexity.score < self.threshold:
+            tier, model = "fast", self.fast_model
+        else:
+            tier, model = "complex", self.complex_model
+        self._counters[tier] += 1
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Swarm route tier=%s model=%s score=%.3f factors=%s",
+                tier,
+                model,
+                complexity.score,
+                complexity.factors,
+            )
+        return RouteDecision(model=model, tier=tier, score=complexity.score)
+
+    def stats(self) -> dict[str, Any]:
+        routed = self._counters["fast"] + self._counters["complex"]
+        return {
+            "enabled": self.enabled,
+            "fast_model": self.fast_model,
+            "complex_model": self.complex_model,
+            "default_models": sorted(self.default_models),
+            "threshold": self.threshold,
+            "routes": dict(self._counters),
+            "fast_share": round(self._counters["fast"] / routed, 4) if routed else 0.0,
+            "avg_score": round(self._score_total / self._scored, 4) if self._scored else 0.0,
+        }
+
+
+def _number(value: object) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _unit(value: object) -> float:
+    number = _number(value)
+    # Snapshot fractions are 0-1, but tolerate 0-100 percentages from older clients.
+    if number > 1.0:
+        number /= 100.0
+    return max(0.0, min(1.0, number))
+
+
+_router: Optional[SwarmModelRouter] = None
+
+
+def get_swarm_router() -> SwarmModelRouter:
+    """Get or create the swarm model router."""
+    global _router
+    if _router is None:
+        settings = get_settings()
+        _router = SwarmModelRouter(
+            enabled=settings.swarm_router_enabled,
+            fast_model=settings.swarm_fast_model,
+            complex_model=settings.swarm_model or settings.gemini_model,
+            threshold=settings.swarm_router_threshold,
+            contested_progress=settings.swarm_router_contested_progress,
+            default_models=tuple(settings.swarm_router_default_models.split(",")),
+        )
+    return _router
@@ -0,0 +1,237 @@
+"""
+AIMD adaptive concurrency limiter for upstream Vertex calls.
+A static concurrency cap either under-uses the Vertex quota or triggers 429
+storms. This limiter probes for the right value instead:
+- additive increase (+1 per window of ``limit`` healthy completions);
+- multiplicative decrease on 429 / RESOURCE_EXHAUSTED or a latency spike,
+  at most once per window so one congestion event isn't punished repeatedly;
+- excess calls queue per call site and are granted round-robin, so a burst of
+  food analyses can't starve swarm decisions (or vice versa).
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Matched against the error status/message only when there is no numeric code;
+# bare numbers like "429" also turn up in token counts, byte sizes and ids.
+QUOTA_ERROR_MARKERS = ("RESOURCE_EXHAUSTED",)
+
+
+class LimiterTicket:
+    """Handed to the caller while it holds a slot; records the call outcome."""
+
+    __slots__ = ("call_site", "queue_wait_s", "started_at", "overloaded")
+
+    def __init__(self, call_site: str, queue_wait_s: float):
+        self.call_site = call_site
+        self.queue_wait_s = queue_wait_s
+        self.started_at = time.perf_counter()
+        self.overloaded = False
+
+    def mark_overloaded(self) -> None:
+        self.overloaded = True
+
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease concurrency limit with fair queuing."""
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        decrease_factor: float = 0.5,
+        latency_spike_factor: float = 2.5,
+        latency_ewma_alpha: float = 0.1,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, int(initial_limit))))
+        self.decrease_factor = min(0.95, max(0.1, float(decrease_factor)))
+        self.latency_spike_factor = max(1.1, float(latency_spike_factor))
+        self.latency_ewma_alpha = min(1.0, max(0.01, float(latency_ewma_alpha)))
+
+        self._in_flight = 0
+        self._queues: dict[str, collections.deque[asyncio.Future]] = {}
+        self._rr_order: collections.deque[str] = collections.deque()
+        self._baseline_latency_s: dict[str, float] = {}
+        self._samples: dict[str, int] = {}
+        # Starts a full window in, so the first 429 burst after startup (when the
+        # initial limit is most likely wrong) can back off straight away.
+        self._completions_since_decrease = int(self.limit)
+        self._counters: dict[str, dict[str, Any]] = {}
+
+    @asynccontextmanager
+    async def slot(self, call_site: str) -> AsyncIterator[LimiterTicket]:
+        """Hold an upstream slot; call ``ticket.mark_overloaded()`` on 429-style failures."""
+        queue_wait_s = await self._acquire(call_site)
+        ticket = LimiterTicket(call_site, queue_wait_s)
+        try:
+            yield ticket
+        finally:
+            self._on_complete(ticket, time.perf_counter() - ticket.started_at)
+            self._release()
+
+    async def _acquire(self, call_site: str) -> float:
+        counters = self._counters_for(call_site)
+        counters["calls"] += 1
+
+        if self._in_flight < int(self.limit) and not self._has_waiters():
+            self._in_flight += 1
+            return 0.0
+
+        loop = asyncio.get_running_loop()
+        waiter: asyncio.Future = loop.create_future()
+        queue = self._queues.setdefault(call_site, collections.deque())
+        if call_site not in self._rr_order:
+            self._rr_order.append(call_site)
+        queue.append(waiter)
+        started_at = time.perf_counter()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+            raise
+
+        queue_wait_s = time.perf_counter() - started_at
+        counters["queued"] += 1
+        counters["queue_wait_s"] += queue_wait_s
+        return queue_wait_s
+
+    def _release(self) -> None:
+        self._in_flight = max(0, self._in_flight - 1)
+        self._grant_waiters()
+
+    def _grant_waiters(self) -> None:
+        while self._in_flight < int(self.limit):
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        # Round-robin across call sites that have live waiters.
+        for _ in range(len(self._rr_order)):
+            call_site = self._rr_order[0]
+            self._rr_order.rotate(-1)
+            queue = self._queues.get(call_site)
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def _has_waiters(self) -> bool:
+        return any(any(not waiter.done() for waiter in queue) for queue in self._queues.values())
+
+    def _on_complete(self, ticket: LimiterTicket, latency_s: float) -> None:
+        counters = self._counters_for(ticket.call_site)
+        self._completions_since_decrease += 1
+
+        if ticket.overloaded:
+            counters["overloaded"] += 1
+            self._decrease("quota")
+            return
+
+        baseline = self._baseline_latency_s.get(ticket.call_site)
+        samples = self._samples.get(ticket.call_site, 0)
+        if baseline is not None and samples >= 10 and latency_s > baseline * self.latency_spike_factor:
+            counters["latency_spikes"] += 1
+            self._decrease("latency")
+            return
+
+        # Only healthy samples feed the baseline, so it tracks the uncongested latency.
+        if baseline is None:
+            self._baseline_latency_s[ticket.call_site] = latency_s
+        else:
+            alpha = self.latency_ewma_alpha
+            self._baseline_latency_s[ticket.call_site] = (1 - alpha) * baseline + alpha * latency_s
+        self._samples[ticket.call_site] = samples + 1
+
+        if self._in_flight >= int(self.limit) - 1:
+            # Only grow while the limit is actually the constraint.
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / max(1.0, self.limit))
+            self._grant_waiters()
+
+    def _decrease(self, reason: str) -> None:
+        if self._completions_since_decrease < int(self.limit):
+            return
+
+        previous = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._completions_since_decrease = 0
+        logger.warning("Upstream limiter backing off (%s): limit %.1f -> %.1f", reason, previous, self.limit)
+
+    def _counters_for(self, call_site: str) -> dict[str, Any]:
+        counters = self._counters.get(call_site)
+        if counters is None:
+            counters = {"calls": 0, "queued": 0, "queue_wait_s": 0.0, "overloaded": 0, "latency_spikes": 0}
+            self._counters[call_site] = counters
+        return counters
+
+    @property
+    def has_capacity(self) -> bool:
+        """True when a new call would start immediately instead of queueing."""
+        return self._in_flight < int(self.limit) and not self._has_waiters()
+
+    def stats(self) -> dict[str, Any]:
+        call_sites: dict[str, Any] = {}
+        for call_site, counters in self._counters.items():
+            queue = self._queues.get(call_site, ())
+            call_sites[call_site] = {
+                "calls": counters["calls"],
+                "queue_depth": sum(1 for waiter in queue if not waiter.done()),
+                "queued": counters["queued"],
+                "avg_queue_wait_ms": round(counters["queue_wait_s"] / max(1, counters["queued"]) * 1000, 3),
+                "overloaded": counters["overloaded"],
+                "latency_spikes": counters["latency_spikes"],
+                "baseline_latency_ms": round(self._baseline_latency_s.get(call_site, 0.0) * 1000, 1),
+            }
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self._in_flight,
+            "call_sites": call_sites,
+        }
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """True for 429 / RESOURCE_EXHAUSTED style upstream errors."""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if code == 429:
+        return True
+
+    message = f"{getattr(exc, 'status', '')} {exc}".upper()
+    return any(marker in message for marker in QUOTA_ERROR_MARKERS)
+
+
+_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+
+
+def get_upstream_limiter() -> AdaptiveConcurrencyLimiter:
+    """Get or create the upstream limiter for this worker process."""
+    global _limiter
+    if _limiter is None:
+        settings = get_settings()
+        _limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=settings.upstream_initial_concurrency,
+            min_limit=settings.upstream_min_concurrency,
+            max_limit=settings.upstream_max_concurrency,
+            decrease_factor=settings.upstream_backoff_factor,
+            latency_spike_factor=settings.upstream_latency_spike_factor,
+        )
+    return _limiter
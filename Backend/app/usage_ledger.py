@@ -0,0 +1,321 @@
+"""
+Per-key token usage ledger and budgets.
+Every Vertex response's usage_metadata is attributed to the calling API key,
+endpoint and model. Totals accumulate in memory and are flushed periodically
+to a local SQLite file for usage queries. Budget windows (per minute and per
+UTC day) are counted in shared state so all workers enforce the same limits.
+
+Over budget, clients are degraded rather than rejected: first to a cheaper
+model, and past the hold multiplier to cached results or hold directives.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Iterator, Optional
+
+from .config import get_settings
+from .executors import get_executors
+from .shared_state import get_shared_state, window_key
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FIELDS = ("prompt_tokens", "candidates_tokens", "thoughts_tokens", "total_tokens")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS token_usage ("
+    " key_id TEXT NOT NULL,"
+    " endpoint TEXT NOT NULL,"
+    " model TEXT NOT NULL,"
+    " day TEXT NOT NULL,"
+    " calls INTEGER NOT NULL DEFAULT 0,"
+    " prompt_tokens INTEGER NOT NULL DEFAULT 0,"
+    " candidates_tokens INTEGER NOT NULL DEFAULT 0,"
+    " thoughts_tokens INTEGER NOT NULL DEFAULT 0,"
+    " total_tokens INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (key_id, day, endpoint, model)"
+    ")",
+)
+
+
+class BudgetState(str, Enum):
+    OK = "ok"
+    DEGRADE = "degrade"
+    HOLD = "hold"
+
+
+@dataclass(frozen=True, slots=True)
+class TokenUsage:
+    prompt_tokens: int = 0
+    candidates_tokens: int = 0
+    thoughts_tokens: int = 0
+    total_tokens: int = 0
+
+    @classmethod
+    def from_response(cls, response: Any) -> "TokenUsage":
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return cls()
+        prompt = int(getattr(usage, "prompt_token_count", None) or 0)
+        candidates = int(getattr(usage, "candidates_token_count", None) or 0)
+        thoughts = int(getattr(usage, "thoughts_token_count", None) or 0)
+        total = int(getattr(usage, "total_token_count", None) or 0) or prompt + candidates + thoughts
+        return cls(prompt, candidates, thoughts, total)
+
+
+@dataclass(frozen=True, slots=True)
+class BudgetDecision:
+    state: BudgetState
+    window: str = ""
+    retry_after_s: float = 0.0
+
+
+class UsageTally:
+    """Token totals for the calls made inside one ``track_usage()`` block."""
+
+    __slots__ = ("calls", "prompt_tokens", "candidates_tokens", "thoughts_tokens", "total_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.candidates_tokens = 0
+        self.thoughts_tokens = 0
+        self.total_tokens = 0
+
+    def add(self, usage: TokenUsage) -> None:
+        self.calls += 1
+        for name in TOKEN_FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(usage, name))
+
+
+_tally: ContextVar[Optional[UsageTally]] = ContextVar("usage_tally", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageTally]:
+    """Collect the token usage of every upstream call made in this block (and tasks it awaits)."""
+    tally = UsageTally()
+    token = _tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _tally.reset(token)
+
+
+def tally_usage(usage: TokenUsage) -> None:
+    """Add one call's usage to the enclosing ``track_usage()`` block, if any."""
+    tally = _tally.get()
+    if tally is not None:
+        tally.add(usage)
+
+
+class UsageLedger:
+    """In-memory token accounting with periodic SQLite flushes and shared budget windows."""
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval_s: float,
+        minute_budget: int,
+        daily_budget: int,
+        hold_multiplier: float,
+    ):
+        self.path = path
+        self.flush_interval_s = max(0.5, float(flush_interval_s))
+        self.minute_budget = max(0, int(minute_budget))
+        self.daily_budget = max(0, int(daily_budget))
+        self.hold_multiplier = max(1.0, float(hold_multiplier))
+        self.shared_state = get_shared_state()
+        self._pending: dict[tuple[str, str, str, str], list[int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._local = threading.local()
+        self._counters = {"recorded_calls": 0, "flushes": 0, "flush_errors": 0, "degraded": 0, "held": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop(), name="usage-ledger-flush")
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def record(self, key_id: str, endpoint: str, model: str, usage: TokenUsage) -> None:
+        """Attribute one upstream call; cheap enough to run on every response."""
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        row = self._pending.setdefault((key_id, endpoint, model, day), [0, 0, 0, 0, 0])
+        row[0] += 1
+        row[1] += usage.prompt_tokens
+        row[2] += usage.candidates_tokens
+        row[3] += usage.thoughts_tokens
+        row[4] += usage.total_tokens
+        self._counters["recorded_calls"] += 1
+
+        if usage.total_tokens and (self.minute_budget or self.daily_budget):
+            await self.shared_state.incr_async("usage", _minute_key(key_id), usage.total_tokens, ttl_seconds=120)
+            await self.shared_state.incr_async("usage", _day_key(key_id), usage.total_tokens, ttl_seconds=2 * 86400)
+
+    def check_budget(self, key_id: str) -> BudgetDecision:
+        """Decide how to serve a key given its spend in the current minute and UTC day."""
+        decision = BudgetDecision(BudgetState.OK)
+        for window, budget, key, window_s in (
+            ("minute", self.minute_budget, _minute_key(key_id), 60),
+            ("day", self.daily_budget, _day_key(key_id), 86400),
+        ):
+            if budget <= 0:
+                continue
+            used = float(self.shared_state.get("usage", key) or 0)
+            if used < budget:
+                continue
+            retry_after_s = window_s - time.time() % window_s
+            if used >= budget * self.hold_multiplier:
+                decision = BudgetDecision(BudgetState.HOLD, window, retry_after_s)
+                break
+            decision = BudgetDecision(BudgetState.DEGRADE, window, retry_after_s)
+
+        if decision.state is BudgetState.DEGRADE:
+            self._counters["degraded"] += 1
+        elif decision.state is BudgetState.HOLD:
+            self._counters["held"] += 1
+        return decision
+
+    def budget_status(self, key_id: str) -> dict[str, Any]:
+        return {
+            "minute_used": int(float(self.shared_state.get("usage", _minute_key(key_id)) or 0)),
+            "minute_budget": self.minute_budget,
+            "day_used": int(float(self.shared_state.get("usage", _day_key(key_id)) or 0)),
+            "day_budget": self.daily_budget,
+            "hold_multiplier": self.hold_multiplier,
+        }
+
+    async def usage(self, key_id: Optional[str], days: int) -> list[dict[str, Any]]:
+        """Per-day usage rows (persisted plus not yet flushed), newest first; all keys when key_id is None."""
+        days = max(1, min(366, int(days)))
+        since_day = time.strftime("%Y-%m-%d", time.gmtime(time.time() - (days - 1) * 86400))
+        rows = await get_executors().run_thread(self._query_usage, key_id, since_day)
+
+        merged = {(row["key_id"], row["endpoint"], row["model"], row["day"]): row for row in rows}
+        for (pending_key, endpoint, model, day), values in list(self._pending.items()):
+            if (key_id is not None and pending_key != key_id) or day < since_day:
+                continue
+            row = merged.get((pending_key, endpoint, model, day))
+            if row is None:
+                row = {"key_id": pending_key, "endpoint": endpoint, "model": model, "day": day, "calls": 0}
+                row.update((name, 0) for name in TOKEN_FIELDS)
+                merged[(pending_key, endpoint, model, day)] = row
+            row["calls"] += values[0]
+            for index, name in enumerate(TOKEN_FIELDS, start=1):
+                row[name] += values[index]
+
+        return sorted(merged.values(), key=lambda row: (row["day"], row["total_tokens"]), reverse=True)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await get_executors().run_thread(self._write_pending, pending)
+            self._counters["flushes"] += 1
+        except Exception:
+            self._counters["flush_errors"] += 1
+            logger.exception("Failed to flush token usage for %s keys", len(pending))
+            # Put the deltas back so the next flush retries them.
+            for key, values in pending.items():
+                row = self._pending.setdefault(key, [0, 0, 0, 0, 0])
+                for index, value in enumerate(values):
+                    row[index] += value
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._counters,
+            "pending_rows": len(self._pending),
+            "minute_budget": self.minute_budget,
+            "daily_budget": self.daily_budget,
+        }
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            await asyncio.shield(self.flush())
+
+    def _write_pending(self, pending: dict[tuple[str, str, str, str], list[int]]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO token_usage (key_id, endpoint, model, day, calls, prompt_tokens, candidates_tokens,"
+                " thoughts_tokens, total_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (key_id, day, endpoint, model) DO UPDATE SET"
+                " calls = calls + excluded.calls,"
+                " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                " candidates_tokens = candidates_tokens + excluded.candidates_tokens,"
+                " thoughts_tokens = thoughts_tokens + excluded.thoughts_tokens,"
+                " total_tokens = total_tokens + excluded.total_tokens",
+                [(*key, *values) for key, values in pending.items()],
+            )
+
+    def _query_usage(self, key_id: Optional[str], since_day: str) -> list[dict[str, Any]]:
+        query = (
+            "SELECT key_id, endpoint, model, day, calls, prompt_tokens, candidates_tokens, thoughts_tokens,"
+            " total_tokens FROM token_usage WHERE day >= ?"
+        )
+        params: list[Any] = [since_day]
+        if key_id is not None:
+            query += " AND key_id = ?"
+            params.append(key_id)
+        columns = ("key_id", "endpoint", "model", "day", "calls", *TOKEN_FIELDS)
+        return [dict(zip(columns, row)) for row in self._connection().execute(query, params).fetchall()]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+
+def _minute_key(key_id: str) -> str:
+    return window_key(f"tokens:{key_id}", 60)
+
+
+def _day_key(key_id: str) -> str:
+    return window_key(f"tokens:{key_id}", 86400)
+
+
+_ledger: Optional[UsageLedger] = None
+
+
+def get_usage_ledger() -> Optional[UsageLedger]:
+    """Get or create the usage ledger; None when disabled by configuration."""
+    global _ledger
+    settings = get_settings()
+    if not settings.usage_ledger_enabled:
+        return None
+
+    if _ledger is None:
+        _ledger = UsageLedger(
+            path=settings.usage_ledger_path,
+            flush_interval_s=settings.usage_flush_interval_seconds,
+            minute_budget=settings.usage_minute_token_budget,
+            daily_budget=settings.usage_daily_token_budget,
+            hold_multiplier=settings.usage_budget_hold_multiplier,
+        )
+    return _ledger
@@ -0,0 +1,57 @@
+"""
+Wire formats and content negotiation.
+JSON stays the default. Clients may instead send and accept MessagePack
+(``application/msgpack``), which carries image bytes and structured snapshots
+natively instead of as base64 text or escaped JSON strings. Food analysis also
+accepts a raw image body (``application/octet-stream`` or ``image/*``) with
+metadata in headers.
+"""
+
+from typing import Any, Optional
+
+import msgpack
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+RAW_IMAGE_MEDIA_TYPES = {"application/octet-stream", "image/jpeg", "image/jpg", "image/png"}
+IMAGE_MIME_HEADER = "X-Image-Mime-Type"
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """Return the bare media type of a Content-Type/Accept entry (no parameters)."""
+    if not content_type:
+        return ""
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return media_type(content_type) in MSGPACK_MEDIA_TYPES
+
+
+def is_raw_image(content_type: Optional[str]) -> bool:
+    return media_type(content_type) in RAW_IMAGE_MEDIA_TYPES
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """True when the client lists a MessagePack type in Accept (JSON otherwise)."""
+    if not accept:
+        return False
+    return any(media_type(entry) in MSGPACK_MEDIA_TYPES for entry in accept.split(","))
+
+
+def unpack_msgpack(body: bytes) -> Any:
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except (msgpack.UnpackException, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid MessagePack body: {exc}") from exc
+
+
+def msgpack_response(model: BaseModel, status_code: int = 200) -> Response:
+    return Response(
+        content=msgpack.packb(model.model_dump(mode="python"), use_bin_type=True),
+        status_code=status_code,
+        media_type=MSGPACK_MEDIA_TYPE,
+    )
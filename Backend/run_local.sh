@@ -37,11 +37,22 @@ source venv/bin/activate
 echo "📦 Installing dependencies..."
 pip install -q -r requirements.txt
 
+# Worker count: ARETE_WORKERS=N ./run_local.sh starts N worker processes that
+# share result caches, circuit-breaker and budget state through a local SQLite
+# file (ARETE_SHARED_STATE_PATH). A single worker keeps --reload for development.
+WORKERS="${ARETE_WORKERS:-1}"
+
 # Run the server
 echo ""
 echo "🚀 Starting Sacrifice Food Analysis API on http://localhost:8080"
 echo "   Using GCP project: steam-378309 (Vertex AI)"
+echo "   Workers: ${WORKERS}"
 echo "   Health check: http://localhost:8080/health"
 echo "   Analyze endpoint: POST http://localhost:8080/analyze"
 echo ""
-python -m uvicorn app.main:app --host 0.0.0.0 --port 8080 --reload
+if [ "$WORKERS" -gt 1 ]; then
+    export ARETE_WORKERS="$WORKERS"
+    python -m uvicorn app.main:app --host 0.0.0.0 --port 8080 --workers "$WORKERS"
+else
+    python -m uvicorn app.main:app --host 0.0.0.0 --port 8080 --reload
+fi
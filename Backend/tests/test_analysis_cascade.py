@@ -0,0 +1,106 @@
+"""
+Analysis cascade checks: when a fast-tier answer is accepted and when it escalates.
+
+    cd Backend && python -m pytest tests
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import types  # noqa: E402
+
+import app.gemini_analyzer as gemini_analyzer  # noqa: E402
+from app.analysis_cascade import AnalysisCascade  # noqa: E402
+from app.config import get_settings  # noqa: E402
+
+FAST_MODEL = "gemini-2.0-flash-lite"
+ANALYSIS_MODEL = get_settings().gemini_model
+
+
+def _cascade() -> AnalysisCascade:
+    return AnalysisCascade(FAST_MODEL, fast_max_tokens=128, min_confidence=0.8, boundary_margin=0.03)
+
+
+def _response(payload: dict) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text=json.dumps(payload))]),
+                finish_reason="STOP",
+            )
+        ]
+    )
+
+
+class EscalationReasonTest(unittest.TestCase):
+    def test_reasons(self):
+        cases = [
+            ({"score": 0.8, "category": "good"}, 0.95, False, None),
+            ({"score": 0.0, "category": "invalid"}, 0.9, False, None),
+            ({"score": 0.5, "category": "error"}, None, True, "failed"),
+            ({"score": 0.8, "category": "good"}, None, False, "no_confidence"),
+            ({"score": 0.8, "category": "good"}, 0.6, False, "low_confidence"),
+            ({"score": 0.8, "category": "tasty"}, 0.95, False, "unknown_category"),
+            ({"score": 0.8, "category": "poor"}, 0.95, False, "category_mismatch"),
+            ({"score": 0.71, "category": "good"}, 0.95, False, "boundary"),
+        ]
+        cascade = _cascade()
+        for result, confidence, failed, expected in cases:
+            with self.subTest(result=result, confidence=confidence):
+                self.assertEqual(cascade.escalation_reason(result, confidence, failed), expected)
+
+        stats = cascade.stats()
+        self.assertEqual((stats["accepted"], stats["escalated"]), (2, 6))
+        self.assertEqual(stats["escalation_reasons"]["boundary"], 1)
+
+
+class CascadeAnalysisTest(unittest.IsolatedAsyncioTestCase):
+    def _analyzer(self, answers: dict[str, dict]) -> tuple[gemini_analyzer.FoodAnalyzer, list[str]]:
+        calls: list[str] = []
+
+        async def generate_content(model, contents, config=None):
+            calls.append(model)
+            return _response(answers[model])
+
+        client = mock.Mock()
+        client.aio.models.generate_content = generate_content
+        with mock.patch.object(gemini_analyzer.genai, "Client", return_value=client):
+            analyzer = gemini_analyzer.FoodAnalyzer()
+        analyzer.cascade = _cascade()
+        return analyzer, calls
+
+    async def test_confident_fast_answer_is_returned(self):
+        analyzer, calls = self._analyzer(
+            {FAST_MODEL: {"score": 0.8, "category": "good", "confidence": 0.95, "reasoning": "Salad."}}
+        )
+        result = await analyzer.analyze_image(b"jpeg", use_cache=False)
+        self.assertEqual(calls, [FAST_MODEL])
+        self.assertEqual((result["model"], result["category"]), (FAST_MODEL, "good"))
+        self.assertNotIn("confidence", result)
+
+    async def test_unsure_fast_answer_escalates_to_the_analysis_model(self):
+        analyzer, calls = self._analyzer(
+            {
+                FAST_MODEL: {"score": 0.8, "category": "good", "confidence": 0.4, "reasoning": "Maybe salad."},
+                ANALYSIS_MODEL: {"score": 0.55, "category": "moderate", "reasoning": "Dressing-heavy salad."},
+            }
+        )
+        result = await analyzer.analyze_image(b"jpeg", use_cache=False)
+        self.assertEqual(calls, [FAST_MODEL, ANALYSIS_MODEL])
+        self.assertEqual((result["model"], result["category"]), (ANALYSIS_MODEL, "moderate"))
+
+    async def test_cascade_off_for_an_explicit_request(self):
+        analyzer, calls = self._analyzer(
+            {ANALYSIS_MODEL: {"score": 0.55, "category": "moderate", "reasoning": "Dressing-heavy salad."}}
+        )
+        await analyzer.analyze_image(b"jpeg", use_cache=False, cascade=False)
+        self.assertEqual(calls, [ANALYSIS_MODEL])
+
+
+if __name__ == "__main__":
+    unittest.main()
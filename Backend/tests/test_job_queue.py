@@ -0,0 +1,138 @@
+"""
+Job queue checks: leases, reclaiming jobs from dead workers, retries and dead letters.
+
+    cd Backend && python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.job_queue import AnalysisJobQueue, JobDeferred, JobQueueFull, JobStatus  # noqa: E402
+
+IMAGE = b"\xff\xd8 fake jpeg"
+LEASE_S = 30.0
+
+
+class _Clock:
+    """Stands in for the time module inside app.job_queue."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class JobQueueTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.clock = _Clock()
+        patcher = mock.patch("app.job_queue.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _queue(self, max_attempts: int = 3, max_queued_bytes: int = 1024) -> AnalysisJobQueue:
+        return AnalysisJobQueue(
+            path=os.path.join(self._tmp.name, "jobs.sqlite3"),
+            workers=1,
+            max_attempts=max_attempts,
+            retry_base_s=10.0,
+            lease_s=LEASE_S,
+            poll_interval_s=0.05,
+            max_queued_bytes=max_queued_bytes,
+            done_retention_s=3600.0,
+            dead_retention_s=3600.0,
+        )
+
+    async def _wait_for_status(self, queue: AnalysisJobQueue, job_id: str, status: JobStatus) -> dict:
+        for _ in range(100):
+            job = await queue.get(job_id, "key")
+            if job["status"] == status.value:
+                return job
+            await asyncio.sleep(0.02)
+        self.fail(f"job never reached {status.value}: {job}")
+
+    async def test_claim_holds_a_lease_until_it_expires(self):
+        queue = self._queue()
+        job, _created = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+
+        claimed = queue._claim_job()
+        self.assertEqual((claimed.job_id, claimed.attempts, claimed.image), (job["job_id"], 1, IMAGE))
+        self.assertIsNone(queue._claim_job())
+
+        self.clock.now += LEASE_S - 1
+        self.assertIsNone(queue._claim_job())
+
+        # The first worker died without finishing: the job is taken over as a new attempt.
+        self.clock.now += 2
+        reclaimed = queue._claim_job()
+        self.assertEqual((reclaimed.job_id, reclaimed.attempts), (job["job_id"], 2))
+
+    async def test_expired_lease_on_last_attempt_is_dead_lettered(self):
+        queue = self._queue(max_attempts=1)
+        job, _created = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        queue._claim_job()
+        self.clock.now += LEASE_S + 1
+
+        handler = mock.AsyncMock(return_value=(0.5, "good", "ok", "model"))
+        queue.start(handler)
+        try:
+            dead = await self._wait_for_status(queue, job["job_id"], JobStatus.DEAD)
+        finally:
+            await queue.stop()
+        handler.assert_not_called()
+        self.assertEqual(dead["error"], "lease expired on last attempt")
+
+    async def test_failed_attempts_back_off_then_dead_letter(self):
+        queue = self._queue(max_attempts=2)
+        job, _created = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        handler = mock.AsyncMock(side_effect=RuntimeError("upstream down"))
+
+        await queue._run(handler, queue._claim_job())
+        self.assertEqual((await queue.get(job["job_id"], "key"))["status"], JobStatus.QUEUED.value)
+        self.assertIsNone(queue._claim_job())
+
+        self.clock.now += 10.0
+        await queue._run(handler, queue._claim_job())
+        dead = await queue.get(job["job_id"], "key")
+        self.assertEqual((dead["status"], dead["attempts"]), (JobStatus.DEAD.value, 2))
+        self.assertEqual(dead["error"], "RuntimeError: upstream down")
+
+    async def test_deferred_job_keeps_its_attempt(self):
+        queue = self._queue(max_attempts=1)
+        job, _created = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        handler = mock.AsyncMock(side_effect=JobDeferred("over budget", retry_after_s=60.0))
+
+        await queue._run(handler, queue._claim_job())
+        self.clock.now += 60.0
+        claimed = queue._claim_job()
+        self.assertEqual((claimed.job_id, claimed.attempts), (job["job_id"], 1))
+
+    async def test_resubmission_dedupes_and_dead_jobs_start_over(self):
+        queue = self._queue(max_attempts=1)
+        job, created = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        again, created_again = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        self.assertEqual((created, created_again, again["job_id"]), (True, False, job["job_id"]))
+
+        queue._fail_job(job["job_id"], "boom", True, 0.0)
+        fresh, created = await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        self.assertTrue(created)
+        self.assertNotEqual(fresh["job_id"], job["job_id"])
+
+    async def test_queued_image_bytes_are_capped(self):
+        queue = self._queue(max_queued_bytes=len(IMAGE) * 2)
+        await queue.submit("key", "player", "a" * 64, "image/jpeg", IMAGE)
+        await queue.submit("key", "player", "b" * 64, "image/jpeg", IMAGE)
+        with self.assertRaises(JobQueueFull):
+            await queue.submit("key", "player", "c" * 64, "image/jpeg", IMAGE)
+
+
+if __name__ == "__main__":
+    unittest.main()
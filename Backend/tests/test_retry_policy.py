@@ -0,0 +1,98 @@
+"""
+Retry policy checks: fatal errors skip only the rungs on the failing model.
+
+    cd Backend && python -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import errors as genai_errors  # noqa: E402
+from google.genai import types  # noqa: E402
+
+import app.gemini_analyzer as gemini_analyzer  # noqa: E402
+from app.retry_policy import RetryController, RetryPolicy, parse_ladder  # noqa: E402
+
+HOLD_TEXT = '{"order":"hold","reasoning":"ok"}'
+
+
+def _client_error(code: int, status: str) -> genai_errors.ClientError:
+    response = mock.Mock(body_segments=[{"error": {"code": code, "message": status, "status": status}}])
+    return genai_errors.ClientError(code, response)
+
+
+def _response(text: str) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text=text)]),
+                finish_reason="STOP",
+            )
+        ]
+    )
+
+
+def _controller(ladder: str, max_retries: int) -> RetryController:
+    policy = RetryPolicy.from_spec("swarm", ladder, max_retries, base_delay_s=0.0, max_delay_s=0.0)
+    return RetryController({"swarm": policy}, budget_ratio=1.0, budget_min_per_minute=100)
+
+
+class RetryPlanTest(unittest.IsolatedAsyncioTestCase):
+    async def test_fatal_error_moves_on_to_a_different_model(self):
+        plan = await _controller("gemini-2.0-flash@0", 1).plan("swarm", "gemini-3-flash", 0.7)
+        self.assertTrue(await plan.before_retry(1, _client_error(404, "NOT_FOUND")))
+        self.assertEqual(plan.attempts[1]["model"], "gemini-2.0-flash")
+
+    async def test_fatal_error_skips_rungs_on_the_same_model(self):
+        plan = await _controller("gemini-3-flash@0,gemini-2.0-flash@0", 2).plan("swarm", "gemini-3-flash", 0.7)
+        self.assertTrue(await plan.before_retry(1, _client_error(400, "INVALID_ARGUMENT")))
+        self.assertEqual([attempt["model"] for attempt in plan.attempts], ["gemini-3-flash", "gemini-2.0-flash"])
+
+    async def test_fatal_error_stops_when_only_the_same_model_is_left(self):
+        plan = await _controller("@0", 1).plan("swarm", "gemini-3-flash", 0.7)
+        self.assertFalse(await plan.before_retry(1, _client_error(400, "INVALID_ARGUMENT")))
+
+    async def test_quota_error_still_stops(self):
+        plan = await _controller("gemini-2.0-flash@0", 1).plan("swarm", "gemini-3-flash", 0.7)
+        self.assertFalse(await plan.before_retry(1, _client_error(429, "RESOURCE_EXHAUSTED")))
+
+    def test_malformed_ladder_temperature_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_ladder("gemini-2.0-flash@warm")
+        with self.assertRaises(ValueError):
+            parse_ladder("gemini-2.0-flash@nan")
+
+
+class SwarmFallbackTest(unittest.IsolatedAsyncioTestCase):
+    async def test_client_error_on_primary_falls_back_to_retry_model(self):
+        for code, status in ((404, "NOT_FOUND"), (400, "INVALID_ARGUMENT")):
+            with self.subTest(code=code):
+                calls = []
+
+                async def generate_content(model, contents, config=None):
+                    calls.append(model)
+                    if model == "gemini-3-flash":
+                        raise _client_error(code, status)
+                    return _response(HOLD_TEXT)
+
+                client = mock.Mock()
+                client.aio.models.generate_content = generate_content
+                with mock.patch.object(gemini_analyzer.genai, "Client", return_value=client):
+                    analyzer = gemini_analyzer.FoodAnalyzer()
+                analyzer.retries = _controller("gemini-2.0-flash@0", 1)
+
+                with mock.patch("builtins.print"):
+                    result = await analyzer.strategize_swarm("system", "{}", model_name="gemini-3-flash")
+
+                self.assertEqual(calls, ["gemini-3-flash", "gemini-2.0-flash"])
+                self.assertEqual(result["model"], "gemini-2.0-flash")
+                self.assertNotEqual(result["normalize_status"], gemini_analyzer.FORCED_HOLD_STATUS)
+                self.assertEqual(result["attempt_count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
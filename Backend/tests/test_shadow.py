@@ -0,0 +1,98 @@
+"""
+Shadow evaluation checks: sampling, skipping under load and pairwise aggregation.
+
+    cd Backend && python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.shadow import ShadowEvaluator  # noqa: E402
+from app.shared_state import MemorySharedState  # noqa: E402
+from app.usage_ledger import UsageTally  # noqa: E402
+
+
+def _evaluator(sample_rate: float = 0.5, max_concurrency: int = 2) -> ShadowEvaluator:
+    evaluator = ShadowEvaluator(
+        swarm_model="",
+        analysis_model="gemini-2.0-flash-lite",
+        sample_rate=sample_rate,
+        max_concurrency=max_concurrency,
+    )
+    evaluator.shared_state = MemorySharedState()
+    evaluator.limiter = mock.Mock(has_capacity=True)
+    return evaluator
+
+
+def _usage(total_tokens: int) -> UsageTally:
+    usage = UsageTally()
+    usage.total_tokens = total_tokens
+    return usage
+
+
+class ShouldMirrorTest(unittest.TestCase):
+    def test_samples_below_the_rate(self):
+        evaluator = _evaluator(sample_rate=0.5)
+        with mock.patch("app.shadow.random.random", side_effect=[0.49, 0.5, 0.9]):
+            self.assertEqual([evaluator._should_mirror() for _ in range(3)], [True, False, False])
+        self.assertEqual(evaluator.stats()["skipped_busy"], 0)
+
+    def test_zero_rate_never_mirrors(self):
+        with mock.patch("app.shadow.random.random", return_value=0.0):
+            self.assertFalse(_evaluator(sample_rate=0.0)._should_mirror())
+
+    def test_skips_when_the_upstream_limiter_is_full(self):
+        evaluator = _evaluator(sample_rate=1.0)
+        evaluator.limiter.has_capacity = False
+        self.assertFalse(evaluator._should_mirror())
+        self.assertEqual(evaluator.stats()["skipped_busy"], 1)
+
+    def test_skips_at_its_own_concurrency_cap(self):
+        evaluator = _evaluator(sample_rate=1.0, max_concurrency=1)
+        evaluator._tasks.add(mock.Mock())
+        self.assertFalse(evaluator._should_mirror())
+        self.assertEqual(evaluator.stats()["skipped_busy"], 1)
+
+
+class MirrorAnalysisTest(unittest.IsolatedAsyncioTestCase):
+    async def test_pairs_aggregate_into_the_report(self):
+        evaluator = _evaluator(sample_rate=1.0)
+        analyzer = mock.Mock()
+        analyzer.analyze_image = mock.AsyncMock(
+            side_effect=[
+                {"score": 0.7, "category": "good", "reasoning": "ok"},
+                {"score": 0.2, "category": "poor", "reasoning": "ok"},
+            ]
+        )
+
+        for _ in range(2):
+            evaluator.mirror_analysis(
+                analyzer,
+                {"score": 0.8, "category": "good"},
+                120,
+                _usage(400),
+                b"image",
+                "image/jpeg",
+                "a" * 64,
+            )
+        await asyncio.gather(*evaluator._tasks)
+
+        report = evaluator.report()["analysis"]
+        self.assertEqual(report["candidate_model"], "gemini-2.0-flash-lite")
+        self.assertEqual(report["pairs"], 2)
+        self.assertEqual(report["category_agreement"], 0.5)
+        self.assertEqual(report["mean_abs_score_delta"], 0.35)
+        self.assertEqual(report["candidate_statuses"], {"ok": 2})
+        self.assertEqual(analyzer.analyze_image.await_args.kwargs["use_cache"], False)
+
+        await evaluator.reset()
+        self.assertEqual(evaluator.report()["analysis"]["pairs"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Swarm batcher checks: batching concurrent requests, fallbacks and token apportioning.
+
+    cd Backend && python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.swarm_batcher import SwarmBatcher, _split_usage  # noqa: E402
+from app.usage_ledger import TokenUsage, UsageTally, tally_usage, track_usage  # noqa: E402
+
+BATCH_USAGE = TokenUsage(prompt_tokens=1001, candidates_tokens=302, thoughts_tokens=0, total_tokens=1303)
+SINGLE_USAGE = TokenUsage(prompt_tokens=400, candidates_tokens=100, thoughts_tokens=0, total_tokens=500)
+
+
+class _FakeAnalyzer:
+    """Answers batch items by snapshot; snapshots in ``unusable`` come back invalid."""
+
+    def __init__(self, unusable: tuple[str, ...] = ()):
+        self.unusable = unusable
+        self.batches: list[list[str]] = []
+        self.singles: list[str] = []
+
+    async def strategize_swarm_batch(self, system_prompt, snapshots, model_name, max_tokens, temperature, key_id):
+        self.batches.append([snapshot_json for _request_id, snapshot_json in snapshots])
+        tally_usage(BATCH_USAGE)
+        return {request_id: snapshot_json for request_id, snapshot_json in snapshots}
+
+    def swarm_batch_result(self, raw_text, snapshot_json, model_name):
+        if snapshot_json in self.unusable:
+            return None
+        return {"raw_text": raw_text, "model": model_name}
+
+    async def strategize_swarm(self, system_prompt, snapshot_json, model_name, max_tokens, temperature, key_id):
+        self.singles.append(snapshot_json)
+        tally_usage(SINGLE_USAGE)
+        return {"raw_text": snapshot_json, "model": model_name}
+
+
+async def _request(batcher: SwarmBatcher, analyzer: _FakeAnalyzer, snapshot_json: str) -> tuple[dict, UsageTally]:
+    with track_usage() as usage:
+        result = await batcher.strategize(
+            analyzer,
+            system_prompt="system",
+            snapshot_json=snapshot_json,
+            model_name="gemini-3-flash",
+            max_tokens=256,
+            temperature=0.7,
+            key_id="key",
+        )
+    return result, usage
+
+
+class SplitUsageTest(unittest.TestCase):
+    def test_shares_sum_to_the_batch_total(self):
+        tally = UsageTally()
+        tally.add(BATCH_USAGE)
+        shares = _split_usage(tally, 3)
+        self.assertEqual([share.prompt_tokens for share in shares], [335, 333, 333])
+        for name in ("prompt_tokens", "candidates_tokens", "thoughts_tokens", "total_tokens"):
+            self.assertEqual(sum(getattr(share, name) for share in shares), getattr(BATCH_USAGE, name))
+
+
+class SwarmBatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_requests_share_one_call(self):
+        batcher = SwarmBatcher(window_ms=20, max_batch_size=8)
+        analyzer = _FakeAnalyzer()
+        outcomes = await asyncio.gather(*(_request(batcher, analyzer, f"snapshot-{index}") for index in range(3)))
+
+        self.assertEqual(analyzer.batches, [["snapshot-0", "snapshot-1", "snapshot-2"]])
+        self.assertEqual(
+            [result["raw_text"] for result, _usage in outcomes],
+            ["snapshot-0", "snapshot-1", "snapshot-2"],
+        )
+        self.assertTrue(all(result["batch_size"] == 3 for result, _usage in outcomes))
+        self.assertEqual(sum(usage.total_tokens for _result, usage in outcomes), BATCH_USAGE.total_tokens)
+        self.assertEqual(batcher.stats()["batching_factor"], 3.0)
+
+    async def test_unusable_item_falls_back_to_a_single_call(self):
+        batcher = SwarmBatcher(window_ms=20, max_batch_size=8)
+        analyzer = _FakeAnalyzer(unusable=("snapshot-1",))
+        outcomes = await asyncio.gather(*(_request(batcher, analyzer, f"snapshot-{index}") for index in range(2)))
+
+        self.assertEqual(analyzer.singles, ["snapshot-1"])
+        self.assertNotIn("batch_size", outcomes[1][0])
+        self.assertEqual(outcomes[1][1].total_tokens, BATCH_USAGE.total_tokens // 2 + SINGLE_USAGE.total_tokens)
+        self.assertEqual(batcher.stats()["fallbacks"], 1)
+
+    async def test_full_batch_flushes_before_the_window(self):
+        batcher = SwarmBatcher(window_ms=10_000, max_batch_size=2)
+        analyzer = _FakeAnalyzer()
+        await asyncio.wait_for(
+            asyncio.gather(*(_request(batcher, analyzer, f"snapshot-{index}") for index in range(2))),
+            timeout=1.0,
+        )
+        self.assertEqual(len(analyzer.batches), 1)
+
+    async def test_lone_request_makes_a_single_call(self):
+        batcher = SwarmBatcher(window_ms=5, max_batch_size=8)
+        analyzer = _FakeAnalyzer()
+        _result, usage = await _request(batcher, analyzer, "snapshot-0")
+        self.assertEqual((analyzer.batches, analyzer.singles), ([], ["snapshot-0"]))
+        self.assertEqual(usage.total_tokens, SINGLE_USAGE.total_tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Swarm router checks: snapshot scoring, thresholds and client model overrides.
+
+    cd Backend && python -m pytest tests
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.swarm_router import SwarmModelRouter, score_snapshot  # noqa: E402
+
+QUIET = {
+    "zones": [
+        {"id": "north", "owner": "ai", "capture_progress": 0.0},
+        {"id": "south", "owner": "ai", "capture_progress": 0.0},
+    ],
+    "player": {"health_percent": 1.0},
+    "ai_resources": {"reinforcement_squads_available": 0, "reinforcement_cooldown_seconds": 30},
+}
+CONTESTED = {
+    "zones": [
+        {"id": "north", "owner": "player", "capture_progress": 0.6},
+        {"id": "south", "owner": "ai", "capture_progress": 0.4},
+    ],
+    "player": {"health_percent": 80},
+    "ai_resources": {"reinforcement_squads_available": 2, "reinforcement_cooldown_seconds": 0},
+}
+
+
+def _router(enabled: bool = True) -> SwarmModelRouter:
+    return SwarmModelRouter(
+        enabled=enabled,
+        fast_model="gemini-2.0-flash",
+        complex_model="gemini-3-flash",
+        threshold=0.35,
+        contested_progress=0.05,
+        default_models=("gemini-3-flash", "gemini-2.5-flash"),
+    )
+
+
+class ScoreSnapshotTest(unittest.TestCase):
+    def test_quiet_snapshot_scores_only_player_health(self):
+        complexity = score_snapshot(QUIET, contested_progress=0.05)
+        self.assertAlmostEqual(complexity.score, 0.10)
+        self.assertEqual(complexity.factors["contested_zones"], 0.0)
+
+    def test_contested_snapshot_weights_every_factor(self):
+        # 0.35 * 1 + 0.25 * 0.6 + 0.20 * 0.5 + 0.10 * 0.8 + 0.10 * 1
+        complexity = score_snapshot(CONTESTED, contested_progress=0.05)
+        self.assertAlmostEqual(complexity.score, 0.78)
+
+    def test_progress_below_contested_threshold_is_ignored(self):
+        snapshot = {"zones": [{"owner": "ai", "capture_progress": 0.02}]}
+        self.assertEqual(score_snapshot(snapshot, contested_progress=0.05).score, 0.0)
+
+    def test_unreadable_snapshot_is_maximally_complex(self):
+        self.assertEqual(score_snapshot(None, contested_progress=0.05).score, 1.0)
+
+
+class RouteTest(unittest.TestCase):
+    def test_threshold_splits_fast_and_complex(self):
+        router = _router()
+        self.assertEqual(router.route(QUIET).tier, "fast")
+        self.assertEqual(router.route(json.dumps(CONTESTED)).model, "gemini-3-flash")
+        self.assertEqual(router.route("not json").tier, "complex")
+        self.assertEqual(router.stats()["routes"], {"fast": 1, "complex": 2, "override": 0, "disabled": 0})
+
+    def test_client_default_model_is_not_an_override(self):
+        router = _router()
+        for model in ("gemini-3-flash", "gemini-2.5-flash", None):
+            with self.subTest(model=model):
+                self.assertEqual(router.route(QUIET, requested_model=model).model, "gemini-2.0-flash")
+
+    def test_other_requested_model_overrides_routing(self):
+        decision = _router().route(CONTESTED, requested_model="gemini-2.0-flash-lite")
+        self.assertEqual((decision.model, decision.tier), ("gemini-2.0-flash-lite", "override"))
+
+    def test_disabled_router_uses_complex_model(self):
+        decision = _router(enabled=False).route(QUIET, requested_model="gemini-3-flash")
+        self.assertEqual((decision.model, decision.tier), ("gemini-3-flash", "disabled"))
+
+
+if __name__ == "__main__":
+    unittest.main()
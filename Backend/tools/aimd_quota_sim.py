@@ -0,0 +1,150 @@
+"""
+Local stand-in for Vertex quota, used to exercise the AIMD upstream limiter.
+
+SimulatedVertexQuota behaves like a quota-limited model endpoint:
+- at most ``capacity`` calls are served concurrently;
+- calls beyond capacity fail fast with a 429 RESOURCE_EXHAUSTED error;
+- latency rises as the endpoint approaches capacity.
+
+Two call sites ("analyze" and "swarm") drive load through the real
+AdaptiveConcurrencyLimiter, and the script prints how the limit converges,
+how many 429s leaked through, and the per-site queue times.
+
+Usage (from Backend/):
+    python tools/aimd_quota_sim.py --capacity 12 --duration 20 --analyze-rps 20 --swarm-rps 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.upstream_limiter import AdaptiveConcurrencyLimiter, is_quota_error  # noqa: E402
+
+
+class QuotaExceededError(Exception):
+    """Mimics google.genai.errors.ClientError for a 429 response."""
+
+    code = 429
+    status = "RESOURCE_EXHAUSTED"
+
+
+class SimulatedVertexQuota:
+    def __init__(self, capacity: int, base_latency_s: float, capacity_change_at: float = 0.0, new_capacity: int = 0):
+        self.capacity = capacity
+        self.base_latency_s = base_latency_s
+        self.capacity_change_at = capacity_change_at
+        self.new_capacity = new_capacity
+        self.in_flight = 0
+        self.started_at = time.perf_counter()
+        self.served = 0
+        self.rejected = 0
+
+    async def generate_content(self) -> str:
+        if self.capacity_change_at and time.perf_counter() - self.started_at >= self.capacity_change_at:
+            self.capacity = self.new_capacity
+
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            await asyncio.sleep(0.01)
+            raise QuotaExceededError("429 RESOURCE_EXHAUSTED. Quota exceeded for aiplatform requests.")
+
+        self.in_flight += 1
+        try:
+            utilization = self.in_flight / max(1, self.capacity)
+            latency = self.base_latency_s * (1.0 + 3.0 * utilization**4) * random.uniform(0.8, 1.2)
+            await asyncio.sleep(latency)
+            self.served += 1
+            return "ok"
+        finally:
+            self.in_flight -= 1
+
+
+async def _call(limiter: AdaptiveConcurrencyLimiter, upstream: SimulatedVertexQuota, call_site: str, stats: dict):
+    async with limiter.slot(call_site) as ticket:
+        try:
+            await upstream.generate_content()
+            stats[call_site]["ok"] += 1
+        except Exception as exc:
+            if is_quota_error(exc):
+                ticket.mark_overloaded()
+            stats[call_site]["429"] += 1
+    stats[call_site]["queue_wait_s"] += ticket.queue_wait_s
+
+
+async def _drive(
+    limiter: AdaptiveConcurrencyLimiter,
+    upstream: SimulatedVertexQuota,
+    call_site: str,
+    rps: float,
+    duration: float,
+    stats: dict,
+) -> None:
+    tasks = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(_call(limiter, upstream, call_site, stats)))
+        await asyncio.sleep(random.expovariate(rps))
+    await asyncio.gather(*tasks)
+
+
+async def _report(limiter: AdaptiveConcurrencyLimiter, upstream: SimulatedVertexQuota, duration: float) -> None:
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        await asyncio.sleep(1.0)
+        snapshot = limiter.stats()
+        print(
+            f"t={time.perf_counter() - started:5.1f}s limit={snapshot['limit']:5.1f} "
+            f"in_flight={snapshot['in_flight']:3d} capacity={upstream.capacity:3d} "
+            f"served={upstream.served:5d} rejected_429={upstream.rejected:4d}"
+        )
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=args.initial_limit,
+        min_limit=1,
+        max_limit=args.max_limit,
+        decrease_factor=args.backoff,
+    )
+    upstream = SimulatedVertexQuota(args.capacity, args.base_latency, args.capacity_change_at, args.new_capacity)
+    stats = {site: {"ok": 0, "429": 0, "queue_wait_s": 0.0} for site in ("analyze", "swarm")}
+
+    await asyncio.gather(
+        _drive(limiter, upstream, "analyze", args.analyze_rps, args.duration, stats),
+        _drive(limiter, upstream, "swarm", args.swarm_rps, args.duration, stats),
+        _report(limiter, upstream, args.duration),
+    )
+
+    print()
+    for site, site_stats in stats.items():
+        total = max(1, site_stats["ok"] + site_stats["429"])
+        print(
+            f"{site:>8}: ok={site_stats['ok']:5d} 429={site_stats['429']:4d} "
+            f"({site_stats['429'] / total:.1%}) avg_queue_ms={site_stats['queue_wait_s'] / total * 1000:.1f}"
+        )
+    print(f"final limit={limiter.stats()['limit']} (capacity {upstream.capacity})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=12)
+    parser.add_argument("--base-latency", type=float, default=0.4)
+    parser.add_argument("--capacity-change-at", type=float, default=0.0, help="seconds; 0 disables")
+    parser.add_argument("--new-capacity", type=int, default=6)
+    parser.add_argument("--initial-limit", type=int, default=4)
+    parser.add_argument("--max-limit", type=int, default=64)
+    parser.add_argument("--backoff", type=float, default=0.5)
+    parser.add_argument("--analyze-rps", type=float, default=20.0)
+    parser.add_argument("--swarm-rps", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
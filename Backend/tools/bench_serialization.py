@@ -0,0 +1,137 @@
+"""
+Serialization cost and payload size: current JSON formats vs MessagePack / raw bytes.
+
+Measures, per format, the client-side encode time, the server-side
+decode + validation time (using the real request models and helpers from
+app.main) and the bytes on the wire, for:
+- food analysis: JSON+base64, MessagePack with binary image, raw octet-stream;
+- swarm strategize: snapshot_json as an escaped string, structured snapshot
+  in JSON, structured snapshot in MessagePack.
+
+Usage (from Backend/):
+    python tools/bench_serialization.py --image-kb 2048 --iterations 50
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable
+
+import msgpack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import AnalyzeRequest, SwarmStrategizeRequest, _parse_base64_image  # noqa: E402
+
+SNAPSHOT = {
+    "zones": [
+        {"id": "alpha", "owner": "ai", "defenders_count": 4, "capture_progress": 0.0, "seconds_since_captured": None},
+        {"id": "bravo", "owner": "player", "defenders_count": 0, "capture_progress": 1.0, "seconds_since_captured": 42.5},
+        {"id": "charlie", "owner": "ai", "defenders_count": 2, "capture_progress": 0.35, "seconds_since_captured": None},
+    ],
+    "player": {"current_zone": "charlie", "health_percent": 0.72, "last_attack_style": "melee", "zones_captured_count": 1},
+    "ai_resources": {"total_drones_alive": 9, "reinforcement_squads_available": 2, "reinforcement_cooldown_seconds": 4.5},
+    "match_time_seconds": 183.2,
+    "recent_events": ["player_captured:bravo", "drone_destroyed:charlie", "reinforcement_arrived:alpha"],
+}
+SYSTEM_PROMPT = "You are the swarm strategist. " * 40
+
+
+def _time_it(fn: Callable[[], Any], iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def _analysis_formats(image: bytes) -> dict[str, dict[str, Callable]]:
+    def json_encode() -> bytes:
+        return json.dumps({"image_base64": base64.b64encode(image).decode("ascii"), "mime_type": "image/jpeg"}).encode()
+
+    def json_decode(body: bytes) -> bytes:
+        request = AnalyzeRequest.model_validate_json(body)
+        return _parse_base64_image(request.image_base64 or "")
+
+    def msgpack_encode() -> bytes:
+        return msgpack.packb({"image": image, "mime_type": "image/jpeg"}, use_bin_type=True)
+
+    def msgpack_decode(body: bytes) -> bytes:
+        request = AnalyzeRequest.model_validate(msgpack.unpackb(body, raw=False))
+        return request.image or b""
+
+    def raw_encode() -> bytes:
+        return image
+
+    def raw_decode(body: bytes) -> bytes:
+        return body
+
+    return {
+        "json+base64": {"encode": json_encode, "decode": json_decode},
+        "msgpack": {"encode": msgpack_encode, "decode": msgpack_decode},
+        "octet-stream": {"encode": raw_encode, "decode": raw_decode},
+    }
+
+
+def _swarm_formats() -> dict[str, dict[str, Callable]]:
+    def nested_encode() -> bytes:
+        return json.dumps({"system_prompt": SYSTEM_PROMPT, "snapshot_json": json.dumps(SNAPSHOT)}).encode()
+
+    def nested_decode(body: bytes) -> Any:
+        request = SwarmStrategizeRequest.model_validate_json(body)
+        # The nested string still has to be parsed somewhere downstream to be used structurally.
+        return json.loads(request.snapshot_text())
+
+    def structured_encode() -> bytes:
+        return json.dumps({"system_prompt": SYSTEM_PROMPT, "snapshot": SNAPSHOT}).encode()
+
+    def structured_decode(body: bytes) -> Any:
+        return SwarmStrategizeRequest.model_validate_json(body).snapshot
+
+    def msgpack_encode() -> bytes:
+        return msgpack.packb({"system_prompt": SYSTEM_PROMPT, "snapshot": SNAPSHOT}, use_bin_type=True)
+
+    def msgpack_decode(body: bytes) -> Any:
+        return SwarmStrategizeRequest.model_validate(msgpack.unpackb(body, raw=False)).snapshot
+
+    return {
+        "json(snapshot_json str)": {"encode": nested_encode, "decode": nested_decode},
+        "json(snapshot object)": {"encode": structured_encode, "decode": structured_decode},
+        "msgpack(snapshot object)": {"encode": msgpack_encode, "decode": msgpack_decode},
+    }
+
+
+def _report(title: str, formats: dict[str, dict[str, Callable]], iterations: int) -> None:
+    print(title)
+    print(f"  {'format':<26} {'bytes':>11} {'vs first':>9} {'encode_ms':>10} {'decode_ms':>10}")
+    baseline_size = None
+    for name, codec in formats.items():
+        body = codec["encode"]()
+        baseline_size = baseline_size or len(body)
+        encode_ms = _time_it(codec["encode"], iterations)
+        decode_ms = _time_it(lambda: codec["decode"](body), iterations)
+        print(
+            f"  {name:<26} {len(body):>11} {len(body) / baseline_size:>8.2f}x "
+            f"{encode_ms:>10.3f} {decode_ms:>10.3f}"
+        )
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-kb", type=int, default=2048)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    image = os.urandom(args.image_kb * 1024)
+    _report(f"Food analysis ({args.image_kb} KiB image)", _analysis_formats(image), args.iterations)
+    _report("Swarm strategize", _swarm_formats(), args.iterations * 20)
+
+
+if __name__ == "__main__":
+    main()
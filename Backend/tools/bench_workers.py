@@ -0,0 +1,245 @@
+"""
+Worker-scaling benchmark: 1 worker vs N workers at a fixed CPU allotment.
+
+Starts the API under uvicorn once per worker count, pins the server to the
+same CPU set each time (via ``taskset`` when available), drives it with a
+closed-loop keep-alive load generator and prints throughput and latency.
+
+The default target is ``POST /analyze``. Pass ``--image`` with a real food
+photo: the priming request analyzes it once, and since analysis results are
+shared across workers every following request measures the server's own CPU
+path (body read, validation, base64 decode, hashing, cache lookup). Without
+``--image`` the payload is synthetic bytes that are not a decodable photo, so
+its answers are errors, which are never cached: every request then goes
+upstream and the run measures Vertex, not the workers. Admission control is
+turned off in the benchmarked server so its shedding (429s) does not cap the
+load; ``--admission`` keeps the configured setting.
+Use ``--path /health`` for a credential-free run.
+
+Usage (from Backend/):
+    python tools/bench_workers.py --workers 1 4 --cpus 0-3 --concurrency 32 --duration 20 --image meal.jpg
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _build_body(path: str, image_kb: int, image_path: str) -> Optional[bytes]:
+    if path != "/analyze":
+        return None
+
+    mime_type = "image/jpeg"
+    if image_path:
+        with open(image_path, "rb") as handle:
+            image = handle.read()
+        if image_path.lower().endswith(".png"):
+            mime_type = "image/png"
+    else:
+        # Deterministic bytes of the requested size; not a real photo (see the module docstring).
+        image = (b"\xff\xd8\xff\xe0" + bytes(range(256)) * ((image_kb * 1024) // 256 + 1))[: image_kb * 1024]
+    payload = {"image_base64": base64.b64encode(image).decode("ascii"), "mime_type": mime_type}
+    return json.dumps(payload).encode("utf-8")
+
+
+def _build_request(host: str, port: int, path: str, body: Optional[bytes], api_key: str) -> bytes:
+    method = "POST" if body is not None else "GET"
+    lines = [
+        f"{method} {path} HTTP/1.1",
+        f"Host: {host}:{port}",
+        "Connection: keep-alive",
+    ]
+    if api_key:
+        lines.append(f"Authorization: Bearer {api_key}")
+    if body is not None:
+        lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(body)}")
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("ascii")
+    return head + (body or b"")
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+
+    status = int(status_line.split()[1])
+    content_length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value.strip())
+
+    if content_length:
+        await reader.readexactly(content_length)
+    return status
+
+
+async def _client_loop(
+    host: str,
+    port: int,
+    request_bytes: bytes,
+    deadline: float,
+    latencies: list[float],
+    errors: list[int],
+) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request_bytes)
+            await writer.drain()
+            status = await _read_response(reader)
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def _run_load(host: str, port: int, request_bytes: bytes, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors: list[int] = []
+
+    # Prime the shared cache (and the first worker's client) before measuring.
+    await _client_loop(host, port, request_bytes, time.perf_counter() + 0.01, [], [])
+
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(_client_loop(host, port, request_bytes, deadline, latencies, errors) for _ in range(concurrency)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "mean_ms": (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+    }
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _start_server(workers: int, port: int, cpus: str, state_path: str, admission: bool) -> subprocess.Popen:
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    if cpus and shutil.which("taskset"):
+        command = ["taskset", "-c", cpus] + command
+
+    env = dict(os.environ)
+    env["ARETE_WORKERS"] = str(workers)
+    env["ARETE_SHARED_STATE_PATH"] = state_path
+    if not admission:
+        env["ARETE_ADMISSION_ENABLED"] = "false"
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, start_new_session=True)
+
+
+async def _wait_until_ready(host: str, port: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    probe = _build_request(host, port, "/health", None, "")
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(probe)
+            await writer.drain()
+            status = await _read_response(reader)
+            writer.close()
+            if status == 200:
+                return
+        except (OSError, ConnectionError):
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"server on port {port} did not become ready")
+
+
+def _stop_server(process: subprocess.Popen) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 2])
+    parser.add_argument("--cpus", default="", help="CPU list for taskset, e.g. 0-3 (same for every run)")
+    parser.add_argument("--path", default="/analyze", help="/analyze or /health")
+    parser.add_argument("--image", default="", help="real JPEG/PNG to send (recommended, see above)")
+    parser.add_argument("--image-kb", type=int, default=2048, help="size of the synthetic payload without --image")
+    parser.add_argument("--admission", action="store_true", help="keep the configured admission control")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--api-key", default=os.environ.get("ARETE_API_KEY", ""))
+    args = parser.parse_args()
+
+    body = _build_body(args.path, args.image_kb, args.image)
+    request_bytes = _build_request("127.0.0.1", args.port, args.path, body, args.api_key)
+
+    results = []
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as state_dir:
+            state_path = os.path.join(state_dir, "shared.sqlite3")
+            process = _start_server(workers, args.port, args.cpus, state_path, args.admission)
+            try:
+                asyncio.run(_wait_until_ready("127.0.0.1", args.port, timeout=30.0))
+                stats = asyncio.run(
+                    _run_load("127.0.0.1", args.port, request_bytes, args.concurrency, args.duration)
+                )
+            finally:
+                _stop_server(process)
+        stats["workers"] = workers
+        results.append(stats)
+
+    print(f"path={args.path} cpus={args.cpus or 'all'} concurrency={args.concurrency} duration={args.duration}s")
+    print(f"{'workers':>7} {'requests':>9} {'errors':>7} {'rps':>9} {'p50_ms':>8} {'p95_ms':>8} {'mean_ms':>8}")
+    baseline_rps = results[0]["rps"] if results else 0.0
+    for stats in results:
+        speedup = stats["rps"] / baseline_rps if baseline_rps else 0.0
+        print(
+            f"{stats['workers']:>7} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9.1f} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['mean_ms']:>8.1f}  x{speedup:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Local stand-in for a Redis-protocol cache server, used to exercise the L2 tier.
+
+RespStandInServer speaks enough RESP for the cache: PING, AUTH, SELECT, GET,
+SET (EX/PX/NX/XX), DEL, EXISTS, DBSIZE and FLUSHALL, with key expiry, plus
+EVAL of the cache's lock-release script (no general Lua). It keeps everything
+in memory and is meant for development and CI only.
+
+Run it as a server for a local multi-instance setup:
+    python tools/resp_server.py --port 6379
+    ARETE_CACHE_L2_URL=redis://127.0.0.1:6379/0 uvicorn app.main:app --port 8080
+    ARETE_CACHE_L2_URL=redis://127.0.0.1:6379/0 uvicorn app.main:app --port 8081
+
+Or let it check the two-level cache against itself: two caches stand in for two
+instances, and the script verifies cross-instance hits, that a stampede of
+concurrent misses computes once, and that losing L2 degrades to L1-only.
+    python tools/resp_server.py --selftest
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import (  # noqa: E402
+    L2_KEY_PREFIX,
+    RELEASE_LOCK_SCRIPT,
+    LocalCacheBackend,
+    RedisCacheBackend,
+    TwoLevelCache,
+)
+from app.shared_state import MemorySharedState  # noqa: E402
+
+
+class RespStandInServer:
+    def __init__(self, host: str, port: int, password: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.commands = 0
+        self._values: dict[bytes, tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._clients: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Drop open client connections too, like a server that went away.
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        authenticated = self.password is None
+        self._clients.add(writer)
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                self.commands += 1
+                name = args[0].upper()
+                if name == b"AUTH":
+                    authenticated = args[-1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                else:
+                    writer.write(self._execute(name, args[1:]))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _execute(self, name: bytes, args: list[bytes]) -> bytes:
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"GET":
+            value = self._get(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            return self._set(args)
+        if name == b"DEL":
+            return b":%d\r\n" % sum(self._values.pop(key, None) is not None for key in args)
+        if name == b"EXISTS":
+            return b":%d\r\n" % sum(self._get(key) is not None for key in args)
+        if name == b"DBSIZE":
+            return b":%d\r\n" % sum(self._get(key) is not None for key in list(self._values))
+        if name == b"FLUSHALL":
+            self._values.clear()
+            return b"+OK\r\n"
+        if name == b"EVAL":
+            if args[0].decode() != RELEASE_LOCK_SCRIPT or args[1] != b"1":
+                return b"-ERR only the cache lock-release script is supported\r\n"
+            if self._get(args[2]) != args[3]:
+                return b":0\r\n"
+            del self._values[args[2]]
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def _set(self, args: list[bytes]) -> bytes:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        for flag, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if flag in options:
+                expires_at = time.monotonic() + float(options[options.index(flag) + 1]) * scale
+        exists = self._get(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return b"$-1\r\n"
+        self._values[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[list[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet/redis-cli --no-raw).
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readuntil(b"\r\n")
+        length = int(header[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def _new_cache(server: RespStandInServer) -> TwoLevelCache:
+    # One cache per simulated instance: its own L1, the stand-in as shared L2.
+    return TwoLevelCache(
+        l1=LocalCacheBackend(MemorySharedState()),
+        l2=RedisCacheBackend(f"redis://127.0.0.1:{server.port}/0", timeout_s=0.2, pool_size=4),
+        l1_ttl_s=60,
+        l2_retry_s=2,
+        lock_ttl_s=5,
+        lock_wait_s=3,
+        poll_interval_s=0.02,
+    )
+
+
+async def selftest() -> None:
+    server = RespStandInServer("127.0.0.1", 0)
+    await server.start()
+    instance_a, instance_b = _new_cache(server), _new_cache(server)
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.3)
+        return "value"
+
+    def check(label: str, ok: bool) -> None:
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            raise SystemExit(1)
+
+    codec = {"encode": lambda value: value, "decode": lambda raw: raw, "ttl_seconds": 60}
+
+    await instance_a.set("demo", "shared", "from-a", 60)
+    check("instance B reads instance A's entry through L2", await instance_b.get("demo", "shared") == "from-a")
+    check("and keeps an L1 copy", instance_b.stats()["l2_hits"] == 1 and await instance_b.l1.get("demo:shared") == "from-a")
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("demo", "stampede", compute, **codec) for cache in [instance_a, instance_b] * 10)
+    )
+    check(f"20 concurrent misses on 2 instances computed {calls} time(s)", calls == 1 and set(results) == {"value"})
+    check(
+        "waiters were coalesced in-process and via the L2 lock",
+        instance_a.stats()["coalesced"] + instance_b.stats()["coalesced"] == 18
+        and instance_a.stats()["lock_wait_hits"] + instance_b.stats()["lock_wait_hits"] == 1,
+    )
+
+    # Simulate the lock expiring mid-compute and another instance taking it over.
+    lock_token = await instance_a._acquire_lock("lock:demo:release")
+    await instance_b.l2.set(L2_KEY_PREFIX + "lock:demo:release", "other-holder", 60)
+    await instance_a._release_lock("lock:demo:release", lock_token)
+    check(
+        "a lock that changed hands is not released by its old holder",
+        await instance_b.l2.get(L2_KEY_PREFIX + "lock:demo:release") == "other-holder",
+    )
+
+    await server.stop()
+    started_at = time.perf_counter()
+    value = await instance_a.get_or_compute("demo", "after-outage", compute, **codec)
+    check(
+        f"L2 down: miss computed L1-only in {(time.perf_counter() - started_at) * 1000:.0f} ms",
+        value == "value" and not instance_a.l2_available,
+    )
+    check("earlier entries still hit L1", await instance_a.get("demo", "shared") == "from-a")
+    print(instance_a.stats())
+    await instance_a.close()
+    await instance_b.close()
+
+
+async def serve(host: str, port: int, password: Optional[str]) -> None:
+    server = RespStandInServer(host, port, password)
+    await server.start()
+    print(f"RESP stand-in listening on {host}:{server.port}", flush=True)
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--selftest", action="store_true", help="check the two-level cache against the stand-in")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(selftest() if args.selftest else serve(args.host, args.port, args.password))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()